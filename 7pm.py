@@ -12,28 +12,26 @@ import pandas as pd
 from datetime import datetime, timedelta
 import traceback
 from openpyxl import Workbook
-from openpyxl.utils.dataframe import dataframe_to_rows
-from openpyxl.styles import PatternFill, Font, Alignment, Border, Side
 from openpyxl.utils import get_column_letter
-from io import BytesIO
+from report_sink import ReportSink
 import pytz
+from excel_stream import StreamSheet, set_style, score_style
+from report_cube import BookingCube
+from detail_resolver import DETAIL_STATS, DetailPipeline, listing_order, stay_nights
+from oyo_client import (
+    shared_session,
+    run,
+    BookingPages,
+    fetch_booking_details,
+    fetch_total_rooms,
+    fetch_property_details,
+)
 IST = pytz.timezone("Asia/Kolkata")
 now = datetime.now(IST)
 
 MAX_FULL_RUN_RETRIES = 5
 FULL_RUN_RETRY_DELAY = 10  # seconds
 
-# ================= NEW: GLOBAL THROTTLES (NO FEATURE REMOVED) =================
-PROP_PARALLEL_LIMIT = 3      # max properties running in parallel
-DETAIL_PARALLEL_LIMIT = 10   # max detail calls in parallel per property
-
-prop_semaphore = asyncio.Semaphore(PROP_PARALLEL_LIMIT)
-
-# ================= NEW: TIMEOUTS (MORE STABLE MONTHLY) =================
-DETAIL_TIMEOUT = 25
-ROOMS_TIMEOUT = 25
-BATCH_TIMEOUT = 35
-
 # ================= TELEGRAM =================
 
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
@@ -82,7 +80,7 @@ async def send_telegram_message(text, retries=3, session=None):
     if session is None:
         for attempt in range(1, retries + 1):
             try:
-                async with aiohttp.ClientSession() as s:
+                async with shared_session() as s:
                     if await _post(s):
                         return
             except Exception as e:
@@ -90,7 +88,7 @@ async def send_telegram_message(text, retries=3, session=None):
                     print("❌ TELEGRAM FAILED AFTER RETRIES")
                     print(e)
                 await asyncio.sleep(2)
-        async with aiohttp.ClientSession() as s:
+        async with shared_session() as s:
             if not await _post(s):
                 raise RuntimeError("Telegram send failed")
         return
@@ -108,67 +106,6 @@ async def send_telegram_message(text, retries=3, session=None):
 
     raise RuntimeError("Telegram send failed")
 
-# ================= BEAUTIFY EXCEL =================
-def beautify(ws):
-    blue = PatternFill("solid", fgColor="1F4E78")
-    light1 = PatternFill("solid", fgColor="DDEBF7")
-    light2 = PatternFill("solid", fgColor="F2F2F2")
-    yellow = PatternFill("solid", fgColor="FFF4CC")
-
-    bold_white = Font(color="FFFFFF", bold=True, size=12)
-    bold_black = Font(color="000000", bold=True, size=12)
-
-    thin = Border(
-        left=Side(style='thin'),
-        right=Side(style='thin'),
-        top=Side(style='thin'),
-        bottom=Side(style='thin')
-    )
-
-    max_row = ws.max_row
-    max_col = ws.max_column
-    ws.freeze_panes = "A2"
-
-    for col in range(1, max_col + 1):
-        c = ws.cell(row=1, column=col)
-        c.fill = blue
-        c.font = bold_white
-        c.alignment = Alignment(horizontal="center", vertical="center")
-        c.border = thin
-
-    for r in range(2, max_row + 1):
-        fill = light1 if r % 2 == 0 else light2
-        for c in range(1, max_col + 1):
-            cell = ws.cell(row=r, column=c)
-            if cell.value is None:
-                continue
-
-            # ✅ DO NOT override custom styled rows (headings/tables/boxes)
-            if cell.fill is not None and cell.fill.patternType is not None:
-                # already styled (blue headings, yellow labels etc.) → keep as-is
-                cell.border = thin
-                continue
-
-            cell.fill = fill
-            cell.border = thin
-
-
-    for col in ws.columns:
-        max_length = 0
-        col_letter = get_column_letter(col[0].column)
-        for cell in col:
-            if cell.value:
-                max_length = max(max_length, len(str(cell.value)))
-        ws.column_dimensions[col_letter].width = max_length + 5
-
-    for r in range(2, max_row + 1):
-        text = str(ws.cell(row=r, column=1).value or "")
-        if text.strip() == "":
-            continue
-        if "Booking" in text or "Amount" in text or "Total" in text or "OYO" in text:
-            ws.cell(row=r, column=1).fill = yellow
-            ws.cell(row=r, column=1).font = bold_black
-
 # ================= NEW: PREMIUM PROPERTY DETAILS BOX =================
 def add_property_details_box(ws, prop):
     """
@@ -176,44 +113,18 @@ def add_property_details_box(ws, prop):
     Name, Alternate Name, Address, Google Map
     """
 
-    blue = PatternFill("solid", fgColor="1F4E78")
-    light = PatternFill("solid", fgColor="DDEBF7")
-    white = PatternFill("solid", fgColor="FFFFFF")
-
-    bold_white = Font(color="FFFFFF", bold=True, size=12)
-    bold_black = Font(color="000000", bold=True, size=11)
-    normal = Font(color="000000", size=11)
-    link_font = Font(color="0563C1", underline="single", bold=True, size=11)
-
-    thin = Border(
-        left=Side(style='thin'),
-        right=Side(style='thin'),
-        top=Side(style='thin'),
-        bottom=Side(style='thin')
-    )
-
     # fixed box width A:H (8 columns) looks premium always
     start_col = 1
     end_col = 8
 
-    def _border_range(r1, c1, r2, c2):
-        for rr in range(r1, r2 + 1):
-            for cc in range(c1, c2 + 1):
-                ws.cell(row=rr, column=cc).border = thin
-
-    def _merge(row, c1, c2, value, fill=None, font=None, center=False, wrap=False):
+    def _merge(row, c1, c2, value, style):
         ws.merge_cells(start_row=row, start_column=c1, end_row=row, end_column=c2)
         cell = ws.cell(row=row, column=c1)
         cell.value = value
-        if fill:
-            cell.fill = fill
-        if font:
-            cell.font = font
-        cell.alignment = Alignment(
-            horizontal="center" if center else "left",
-            vertical="center",
-            wrap_text=wrap
-        )
+        set_style(cell, style)
+        # rest of the merged range only carries the box border
+        for cc in range(c1 + 1, c2 + 1):
+            set_style(ws.cell(row=row, column=cc), "rpt_edge")
         return cell
 
     # build address line
@@ -239,43 +150,43 @@ def add_property_details_box(ws, prop):
     top = ws.max_row + 1
 
     # Header
-    _merge(top, start_col, end_col, "PROPERTY DETAILS", fill=blue, font=bold_white, center=True)
+    _merge(top, start_col, end_col, "PROPERTY DETAILS", "rpt_header")
     ws.row_dimensions[top].height = 22
 
     # Row 1: Name
-    _merge(top + 1, 1, 2, "Name", fill=light, font=bold_black, wrap=True)
-    _merge(top + 1, 3, end_col, prop.get("name", "") or "", fill=white, font=normal, wrap=True)
+    _merge(top + 1, 1, 2, "Name", "rpt_box_label")
+    _merge(top + 1, 3, end_col, prop.get("name", "") or "", "rpt_box_value")
     ws.row_dimensions[top + 1].height = 20
 
     # Row 2: Alternate Name
-    _merge(top + 2, 1, 2, "Alternative Name", fill=light, font=bold_black, wrap=True)
-    _merge(top + 2, 3, end_col, prop.get("alternate_name", "") or "", fill=white, font=normal, wrap=True)
+    _merge(top + 2, 1, 2, "Alternative Name", "rpt_box_label")
+    _merge(top + 2, 3, end_col, prop.get("alternate_name", "") or "", "rpt_box_value")
     ws.row_dimensions[top + 2].height = 20
 
     # Row 3: Address
-    _merge(top + 3, 1, 2, "Address", fill=light, font=bold_black, wrap=True)
-    _merge(top + 3, 3, end_col, address, fill=white, font=normal, wrap=True)
+    _merge(top + 3, 1, 2, "Address", "rpt_box_label")
+    _merge(top + 3, 3, end_col, address, "rpt_box_value")
     ws.row_dimensions[top + 3].height = 45
 
     # Row 4: Google Map (hyperlink + fixed look)
-    _merge(top + 4, 1, 2, "Google Map", fill=light, font=bold_black, wrap=True)
+    _merge(top + 4, 1, 2, "Google Map", "rpt_box_label")
 
     map_link = (prop.get("map_link") or "").strip()
     if not map_link:
         map_link = ""
 
-    link_cell = _merge(top + 4, 3, end_col, "OPEN IN GOOGLE MAPS" if map_link else "", fill=white, font=link_font, center=True)
+    link_cell = _merge(top + 4, 3, end_col, "OPEN IN GOOGLE MAPS" if map_link else "", "rpt_box_link")
     if map_link:
         link_cell.hyperlink = map_link
 
     ws.row_dimensions[top + 4].height = 22
 
-    # apply border to whole box
-    _border_range(top, start_col, top + 4, end_col)
-
 
 # ================= NEW: PREMIUM PAYMENT TABLES =================
-def add_payment_tables(ws, df, today_collect, title_prefix=""):
+PREMIUM_WIDTHS = [18, 14, 14, 14, 14, 14, 16]   # A:G, planned before the sheet streams
+
+
+def add_payment_tables(ws, cube, today_collect, title_prefix=""):
     """
     Adds 2 premium tables BEFORE property details:
     1) Booking Source x Payment Split
@@ -284,46 +195,21 @@ def add_payment_tables(ws, df, today_collect, title_prefix=""):
     today_collect = {"cash": x, "qr": x, "online": x}
     """
 
-    blue = PatternFill("solid", fgColor="1F4E78")
-    light = PatternFill("solid", fgColor="DDEBF7")
-    white = PatternFill("solid", fgColor="FFFFFF")
-    yellow = PatternFill("solid", fgColor="FFF4CC")
-
-    bold_white = Font(color="FFFFFF", bold=True, size=12)
-    bold_black = Font(color="000000", bold=True, size=11)
-    normal = Font(color="000000", size=11)
-
-    thin = Border(
-        left=Side(style='thin'),
-        right=Side(style='thin'),
-        top=Side(style='thin'),
-        bottom=Side(style='thin')
-    )
-
-    def _style_row(row, start_col, end_col, fill=None, font=None, center=True):
+    def _style_row(row, start_col, end_col, style):
         for c in range(start_col, end_col + 1):
-            cell = ws.cell(row=row, column=c)
-            if fill: cell.fill = fill
-            if font: cell.font = font
-            cell.border = thin
-            cell.alignment = Alignment(horizontal="center" if center else "left", vertical="center")
-
-    def _merge(row, c1, c2, value, fill=None, font=None, center=True):
+            set_style(ws.cell(row=row, column=c), style)
+    def _merge(row, c1, c2, value, style):
         ws.merge_cells(start_row=row, start_column=c1, end_row=row, end_column=c2)
         cell = ws.cell(row=row, column=c1)
         cell.value = value
-        if fill: cell.fill = fill
-        if font: cell.font = font
-        cell.border = thin
-        cell.alignment = Alignment(horizontal="center" if center else "left", vertical="center")
+        set_style(cell, style)
         return cell
 
     # ================= PREMIUM WIDTH SETTINGS =================
     start_col = 1
     end_col = 7  # A:G premium fixed table width
 
-    premium_widths = [18, 14, 14, 14, 14, 14, 16]
-    for i, w in enumerate(premium_widths, start=1):
+    for i, w in enumerate(PREMIUM_WIDTHS, start=1):
         col_letter = get_column_letter(i)
         current = ws.column_dimensions[col_letter].width
         ws.column_dimensions[col_letter].width = max(current or 0, w)
@@ -334,26 +220,27 @@ def add_payment_tables(ws, df, today_collect, title_prefix=""):
     # ================= TABLE 1: Booking Source vs Payment Mode =================
     top = ws.max_row + 1
     heading = f"{title_prefix}BOOKING SOURCE × PAYMENT MODE".strip()
-    _merge(top, start_col, end_col, heading, fill=blue, font=bold_white, center=True)
+    _merge(top, start_col, end_col, heading, "rpt_header")
     ws.row_dimensions[top].height = 20
 
     headers = ["Source", "Cash", "QR", "Online", "Discount", "Balance", "Total"]
     for idx, h in enumerate(headers, start=1):
         ws.cell(row=top + 1, column=idx).value = h
-    _style_row(top + 1, start_col, end_col, fill=light, font=bold_black)
+    _style_row(top + 1, start_col, end_col, "rpt_head")
 
     sources = ["OYO", "Walk-in", "MMT", "BDC", "Agoda", "CB", "TA", "OBA"]
     r = top + 2
+    by_source = cube.by_source()
 
     for src in sources:
-        part = df[df["Booking Source"] == src] if (not df.empty and "Booking Source" in df.columns) else df
+        part = by_source.loc[src]
 
-        cash = round(float(part["Cash"].sum()), 2) if (not part.empty and "Cash" in part.columns) else 0
-        qr = round(float(part["QR"].sum()), 2) if (not part.empty and "QR" in part.columns) else 0
-        online = round(float(part["Online"].sum()), 2) if (not part.empty and "Online" in part.columns) else 0
-        disc = round(float(part["Discount"].sum()), 2) if (not part.empty and "Discount" in part.columns) else 0
-        bal = round(float(part["Balance"].sum()), 2) if (not part.empty and "Balance" in part.columns) else 0
-        total = round(float(part["Amount"].sum()), 2) if (not part.empty and "Amount" in part.columns) else 0
+        cash = round(float(part.get("Cash", 0)), 2)
+        qr = round(float(part.get("QR", 0)), 2)
+        online = round(float(part.get("Online", 0)), 2)
+        disc = round(float(part.get("Discount", 0)), 2)
+        bal = round(float(part.get("Balance", 0)), 2)
+        total = round(float(part.get("Amount", 0)), 2)
 
         ws.cell(row=r, column=1).value = src
         ws.cell(row=r, column=2).value = cash
@@ -363,23 +250,17 @@ def add_payment_tables(ws, df, today_collect, title_prefix=""):
         ws.cell(row=r, column=6).value = bal
         ws.cell(row=r, column=7).value = total
 
-        for c in range(start_col, end_col + 1):
-            cell = ws.cell(row=r, column=c)
-            cell.border = thin
-            cell.font = normal
-            cell.alignment = Alignment(horizontal="center", vertical="center")
-            cell.fill = white
-
-        ws.cell(row=r, column=1).fill = yellow
-        ws.cell(row=r, column=1).font = bold_black
+        _style_row(r, start_col, end_col, "rpt_cell")
+
+        set_style(ws.cell(row=r, column=1), "rpt_key")
         r += 1
     # ================= TOTAL ROW (TABLE 1) =================
-    total_cash = round(float(df["Cash"].sum()), 2) if (not df.empty and "Cash" in df.columns) else 0
-    total_qr = round(float(df["QR"].sum()), 2) if (not df.empty and "QR" in df.columns) else 0
-    total_online = round(float(df["Online"].sum()), 2) if (not df.empty and "Online" in df.columns) else 0
-    total_disc = round(float(df["Discount"].sum()), 2) if (not df.empty and "Discount" in df.columns) else 0
-    total_bal = round(float(df["Balance"].sum()), 2) if (not df.empty and "Balance" in df.columns) else 0
-    total_amt = round(float(df["Amount"].sum()), 2) if (not df.empty and "Amount" in df.columns) else 0
+    total_cash = round(float(cube.sum("Cash")), 2)
+    total_qr = round(float(cube.sum("QR")), 2)
+    total_online = round(float(cube.sum("Online")), 2)
+    total_disc = round(float(cube.sum("Discount")), 2)
+    total_bal = round(float(cube.sum("Balance")), 2)
+    total_amt = round(float(cube.sum("Amount")), 2)
 
     ws.cell(row=r, column=1).value = "TOTAL"
     ws.cell(row=r, column=2).value = total_cash
@@ -390,16 +271,9 @@ def add_payment_tables(ws, df, today_collect, title_prefix=""):
     ws.cell(row=r, column=7).value = total_amt
 
     # premium styling for total row
-    for c in range(start_col, end_col + 1):
-        cell = ws.cell(row=r, column=c)
-        cell.border = thin
-        cell.font = bold_black
-        cell.alignment = Alignment(horizontal="center", vertical="center")
-        cell.fill = light  # light header style
-
-    ws.cell(row=r, column=1).fill = yellow
-    ws.cell(row=r, column=1).font = bold_black
+    _style_row(r, start_col, end_col, "rpt_head")
 
+    set_style(ws.cell(row=r, column=1), "rpt_key")
     r += 1
 
 
@@ -455,181 +329,11 @@ def get_booking_source(b):
     # ✅ fallback
     return "OBA"
 
-# ================= FETCH DETAILS =================
-async def fetch_booking_details(session, P, booking_no):
-    url = "https://www.oyoos.com/hms_ms/api/v1/visibility/booking_details_with_entities"
-    params = {
-        "qid": P["QID"],
-        "booking_id": booking_no,
-        "role": 0,
-        "platform": "OYOOS",
-        "country_code": 1
-    }
-    cookies = {"uif": P["UIF"], "uuid": P["UUID"]}
-    headers = {
-        "accept": "application/json",
-        "content-type": "application/json",
-        "x-qid": str(P["QID"]),
-        "x-source-client": "merchant"
-    }
-
-    for attempt in range(1, 4):
-        try:
-            async with session.get(
-                url, params=params, headers=headers, cookies=cookies, timeout=DETAIL_TIMEOUT
-            ) as r:
-                if r.status != 200:
-                    raise RuntimeError("DETAIL API FAILED")
-
-                data = await r.json()
-
-                rooms = []
-                stay = data.get("entities", {}).get("stayDetails", {})
-                for s in stay.values():
-                    rn = s.get("room_number")
-                    if rn:
-                        rooms.append(rn)
-
-                booking = next(iter(data.get("entities", {}).get("bookings", {}).values()), {})
-                payments = booking.get("payments", [])
-
-                cash = qr = online = discount = 0
-                for p in payments:
-                    mode = p.get("mode", "")
-                    amt = float(p.get("amount", 0))
-                    if mode == "oyo_wizard_discount":
-                        discount += amt
-                    elif mode == "Cash at Hotel":
-                        cash += amt
-                    elif mode == "UPI QR":
-                        qr += amt
-                    else:
-                        online += amt
-
-                balance = booking.get("payable_amount", 0)
-                return rooms, cash, qr, online, discount, balance
-
-        except Exception:
-            # NEW FEATURE: Better backoff (reduces rate limits)
-            await asyncio.sleep(2 + attempt)
-
-    raise RuntimeError("DETAIL FETCH FAILED")
-
-# ================= BATCH FETCH =================
-async def fetch_bookings_batch(session, offset, f, t, P):
-    url = "https://www.oyoos.com/hms_ms/api/v1/get_booking_with_ids"
-    params = {
-        "qid": P["QID"],
-        "checkin_from": f,
-        "checkin_till": t,
-        "batch_count": 100,
-        "batch_offset": offset,
-        "visibility_required": "true",
-        "additionalParams": "payment_hold_transaction,guest,stay_details",
-        "decimal_price": "true",
-        "ascending": "true",
-        "sort_on": "checkin_date"
-    }
-    cookies = {"uif": P["UIF"], "uuid": P["UUID"]}
-    headers = {
-        "accept": "application/json",
-        "content-type": "application/json",
-        "x-qid": str(P["QID"]),
-        "x-source-client": "merchant"
-    }
-
-    async with session.get(
-        url, params=params, cookies=cookies, headers=headers, timeout=BATCH_TIMEOUT
-    ) as r:
-        if r.status != 200:
-            raise RuntimeError("BATCH API FAILED")
-        return await r.json()
-
-
-# ================= NEW: PROPERTY DETAILS API =================
-async def fetch_property_details(session, P):
-    """
-    Fetches:
-    name, alternate_name, address fields, map_link
-    """
-    url = "https://www.oyoos.com/hms_ms/api/v1/location/property-details"
-    params = {"qid": P["QID"]}
-    cookies = {"uif": P["UIF"], "uuid": P["UUID"]}
-    headers = {
-        "accept": "application/json",
-        "x-qid": str(P["QID"]),
-        "x-source-client": "merchant"
-    }
-
-    for attempt in range(1, 4):
-        try:
-            async with session.get(url, params=params, cookies=cookies, headers=headers, timeout=20) as r:
-                if r.status != 200:
-                    raise RuntimeError(f"PROPERTY DETAILS API FAILED ({r.status})")
-                data = await r.json()
-                return {
-                    "name": str(data.get("name", "") or "").strip(),
-                    "alternate_name": str(data.get("alternate_name", "") or "").strip(),
-                    "plot_number": str(data.get("plot_number", "") or "").strip(),
-                    "street": str(data.get("street", "") or "").strip(),
-                    "pincode": str(data.get("pincode", "") or "").strip(),
-                    "city": str(data.get("city", "") or "").strip(),
-                    "country": str(data.get("country", "") or "").strip(),
-                    "map_link": str(data.get("map_link", "") or "").strip(),
-                    "latitude": data.get("latitude", None),
-                    "longitude": data.get("longitude", None),
-                }
-        except Exception:
-            await asyncio.sleep(2 + attempt)
-
-    # fallback safe empty
-    return {
-        "name": "",
-        "alternate_name": "",
-        "plot_number": "",
-        "street": "",
-        "pincode": "",
-        "city": "",
-        "country": "",
-        "map_link": "",
-        "latitude": None,
-        "longitude": None,
-    }
-
-
-# ================= FETCH TOTAL ROOMS =================
-async def fetch_total_rooms(session, P):
-    url = "https://www.oyoos.com/hms_ms/api/v1/hotels/roomsNew"
-    params = {"qid": P["QID"]}
-    cookies = {"uif": P["UIF"], "uuid": P["UUID"]}
-    headers = {
-        "accept": "application/json",
-        "x-qid": str(P["QID"]),
-        "x-source-client": "merchant"
-    }
-
-    for attempt in range(1, 4):
-        try:
-            async with session.get(
-                url, params=params, cookies=cookies, headers=headers, timeout=ROOMS_TIMEOUT
-            ) as r:
-                if r.status != 200:
-                    raise RuntimeError("ROOM API FAILED")
-
-                data = await r.json()
-                rooms = data.get("rooms", {})
-                return len(rooms)
-
-        except Exception:
-            await asyncio.sleep(2 + attempt)
-
-    return 0
-
 # ================= PROCESS PROPERTY =================
 async def process_property(P, TF, TT, HF, HT):
     print(f"PROCESSING FAST ASYNC → {P['name']}")
 
-    async with aiohttp.ClientSession() as session:
+    async with shared_session() as session:
         total_rooms = await fetch_total_rooms(session, P)
         property_details = await fetch_property_details(session, P)
 
@@ -637,49 +341,44 @@ async def process_property(P, TF, TT, HF, HT):
         if total_rooms == 0:
             raise RuntimeError("TOTAL ROOMS FETCH FAILED")
 
-        # NEW FEATURE: limit detail calls per property
-        detail_semaphore = asyncio.Semaphore(DETAIL_PARALLEL_LIMIT)
         # ================= NEW: TARGET DATE COLLECTION (TF) =================
         target_collect_date = str(TF).strip()  # ✅ today means TARGET FROM date (TF)
         target_collect = {"cash": 0.0, "qr": 0.0, "online": 0.0}
         target_seen_bookings = set()
 
-
+        # concurrency comes from the run-wide adaptive OYO limiter (rate_control)
         async def limited_detail_call(booking_no):
-            async with detail_semaphore:
-                return await fetch_booking_details(session, P, booking_no)
+            return await fetch_booking_details(session, P, booking_no)
 
         all_rows = []
+        stay_rows = []   # (page, booking, night, ci, co) → details resolved once per booking below
+        pipeline = DetailPipeline(limited_detail_call)   # detail calls start as pages arrive
         offset = 0
         upcoming_count = cancelled_count = inhouse_count = checkedout_count = 0
 
-        while True:
-            data = await fetch_bookings_batch(session, offset, HF, HT, P)
+        tf_date = datetime.strptime(TF, "%Y-%m-%d")
+        end = datetime.strptime(TT, "%Y-%m-%d")
 
-            if not data or not data.get("bookingIds"):
-                break
+        pages = BookingPages(session, P, HF, HT)   # next pages fetched ahead
 
-            bookings = data.get("entities", {}).get("bookings", {})
-
-            if not bookings:
-                raise RuntimeError("BOOKING ENTITY EMPTY")
+        try:
+            while True:
+                data = await pages.get(offset)
 
-            curr = datetime.strptime(TF, "%Y-%m-%d")
-            end = datetime.strptime(TT, "%Y-%m-%d")
+                if not data or not data.get("bookingIds"):
+                    break
 
-            while curr <= end:
-                target = curr.strftime("%Y-%m-%d")
-                target_dt = curr
+                bookings = data.get("entities", {}).get("bookings", {})
 
-                tasks, mapping = [], []
+                if not bookings:
+                    raise RuntimeError("BOOKING ENTITY EMPTY")
 
                 for b in bookings.values():
                     status = (b.get("status") or "").strip()
                     ci = datetime.strptime(b["checkin"], "%Y-%m-%d")
                     co = datetime.strptime(b["checkout"], "%Y-%m-%d")
-                    tf_date = datetime.strptime(TF, "%Y-%m-%d")
 
-                    # ---- STATUS COUNTS (UNCHANGED) ----
+                    # ---- STATUS COUNTS (ONCE PER BOOKING) ----
                     if status == "Checked In" and ci <= tf_date:
                         inhouse_count += 1
                     elif status == "Checked Out" and co.date() == now.date():
@@ -692,60 +391,59 @@ async def process_property(P, TF, TT, HF, HT):
                     if status not in ["Checked In", "Checked Out"]:
                         continue
 
-                    if not (target_dt >= ci and target_dt < co):
-                        continue
+                    for night in stay_nights(ci, co, tf_date, end):
+                        stay_rows.append((offset, b, night.strftime("%Y-%m-%d"), ci, co))
+                        await pipeline.submit(b["booking_no"])
 
-                    tasks.append(limited_detail_call(b["booking_no"]))
-                    mapping.append((b, target, ci, co))
+                if len(data["bookingIds"]) < 100:
+                    break
 
-                if tasks:
-                    results = await asyncio.gather(*tasks, return_exceptions=True)
-                else:
-                    results = []
+                offset += 100
 
-                for res, (b, target, ci, co) in zip(results, mapping):
-                    if isinstance(res, Exception):
-                        # detail fail shouldn't kill property
-                        continue
+            # ================= DETAIL RESULTS (STARTED DURING PAGINATION) =================
+            details = await pipeline.results(label=P["name"])
+        finally:
+            # a page that raised (e.g. BOOKING ENTITY EMPTY) → nothing left running
+            pipeline.close()
+            pages.cancel()
+
+        for b, target, ci, co in listing_order(stay_rows):
+            res = details[b["booking_no"]]
+            if isinstance(res, Exception):
+                # detail fail shouldn't kill property
+                continue
 
-                    rooms, cash, qr, online, discount, balance = res
-                    # ================= NEW: TARGET DATE COLLECTION (NOT DIVIDED) =================
-                    # Rule: Collect only bookings whose CHECK-IN is exactly TF
-                    # Add once per booking_id (not repeated for each stay date)
-                    if str(b.get("checkin", "")).strip() == target_collect_date and b["booking_no"] not in target_seen_bookings:
-                        target_seen_bookings.add(b["booking_no"])
-                        target_collect["cash"] += float(cash or 0)
-                        target_collect["qr"] += float(qr or 0)
-                        target_collect["online"] += float(online or 0)
-
-                    stay = max((co - ci).days, 1)
-                    paid = float(b.get("get_amount_paid") or 0)
-                    total_amt = paid + float(balance or 0)
-
-                    all_rows.append({
-                        "Date": target,
-                        "Booking Id": b["booking_no"],
-                        "Guest Name": b["guest_name"],
-                        "Status": b.get("status"),
-                        "Booking Source": get_booking_source(b),
-                        "Check In": b["checkin"],
-                        "Check Out": b["checkout"],
-                        "Rooms": b.get("no_of_rooms", 1),
-                        "Room Numbers": ", ".join(rooms),
-                        "Amount": round(total_amt / stay, 2),
-                        "Cash": round(cash / stay, 2),
-                        "QR": round(qr / stay, 2),
-                        "Online": round(online / stay, 2),
-                        "Discount": round(discount / stay, 2),
-                        "Balance": round(balance / stay, 2),
-                    })
-
-                curr += timedelta(days=1)
-
-            if len(data["bookingIds"]) < 100:
-                break
-
-            offset += 100
+            rooms, cash, qr, online, discount, balance = res
+            # ================= NEW: TARGET DATE COLLECTION (NOT DIVIDED) =================
+            # Rule: Collect only bookings whose CHECK-IN is exactly TF
+            # Add once per booking_id (not repeated for each stay date)
+            if str(b.get("checkin", "")).strip() == target_collect_date and b["booking_no"] not in target_seen_bookings:
+                target_seen_bookings.add(b["booking_no"])
+                target_collect["cash"] += float(cash or 0)
+                target_collect["qr"] += float(qr or 0)
+                target_collect["online"] += float(online or 0)
+
+            stay = max((co - ci).days, 1)
+            paid = float(b.get("get_amount_paid") or 0)
+            total_amt = paid + float(balance or 0)
+
+            all_rows.append({
+                "Date": target,
+                "Booking Id": b["booking_no"],
+                "Guest Name": b["guest_name"],
+                "Status": b.get("status"),
+                "Booking Source": get_booking_source(b),
+                "Check In": b["checkin"],
+                "Check Out": b["checkout"],
+                "Rooms": b.get("no_of_rooms", 1),
+                "Room Numbers": ", ".join(rooms),
+                "Amount": round(total_amt / stay, 2),
+                "Cash": round(cash / stay, 2),
+                "QR": round(qr / stay, 2),
+                "Online": round(online / stay, 2),
+                "Discount": round(discount / stay, 2),
+                "Balance": round(balance / stay, 2),
+            })
 
         df = pd.DataFrame(all_rows)
 
@@ -784,61 +482,6 @@ async def run_property_with_retry(P, TF, TT, HF, HT, retries=3):
             await asyncio.sleep(2 + attempt * 2)
     raise RuntimeError(f"PROPERTY FAILED → {P['name']}") from last_error
 
-# NEW FEATURE: PROPERTY PARALLEL LIMITER (reduces failures)
-async def run_property_limited(P, TF, TT, HF, HT):
-    async with prop_semaphore:
-        return await run_property_with_retry(P, TF, TT, HF, HT)
-
-# ================= COUNT / AMOUNT =================
-def count(df, src):
-    if df.empty:
-        return 0
-    return int(df[df["Booking Source"] == src]["Rooms"].sum())
-
-def amt(df, src):
-    if df.empty:
-        return 0
-    return round(df[df["Booking Source"] == src]["Amount"].sum(), 2)
-
-def count_upcoming(df, tf):
-    tf_date = datetime.strptime(tf, "%Y-%m-%d")
-    next_date = tf_date + timedelta(days=1)
-
-    c = 0
-    for _, r in df.iterrows():
-        if r.get("Status") != "Confirm Booking":
-            continue
-
-        d = datetime.strptime(r["Date"], "%Y-%m-%d")
-
-        if d == tf_date and now.hour >= 12:
-            c += 1
-        elif d == next_date and now.hour < 12:
-            c += 1
-
-    return c
-
-def count_cancelled(df, tf):
-    tf_date = datetime.strptime(tf, "%Y-%m-%d")
-    next_date = tf_date + timedelta(days=1)
-
-    c = 0
-    for _, r in df.iterrows():
-        if r.get("Status") != "Cancelled Booking":
-            continue
-
-        d = datetime.strptime(r["Date"], "%Y-%m-%d")
-
-        if d == tf_date or d == next_date:
-            c += 1
-
-    return c
-
-
-
-
-
-
 async def send_telegram_excel_buffer(buffer, filename, caption=None):
     url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendDocument"
 
@@ -854,7 +497,7 @@ async def send_telegram_excel_buffer(buffer, filename, caption=None):
         content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
     )
 
-    async with aiohttp.ClientSession() as session:
+    async with shared_session() as session:
         async with session.post(url, data=data, timeout=120) as resp:
             if resp.status != 200:
                 text = await resp.text()
@@ -913,7 +556,7 @@ async def main():
         print(f"\n🔁 PARTIAL RUN ATTEMPT {run_attempt}/{MAX_FULL_RUN_RETRIES}")
         print(f"⏳ Pending Properties: {len(pending)}")
 
-        tasks = [run_property_limited(P, TF, TT, HF, HT) for P in pending.values()]
+        tasks = [run_property_with_retry(P, TF, TT, HF, HT) for P in pending.values()]
         results = await asyncio.gather(*tasks, return_exceptions=True)
 
         new_pending = {}
@@ -953,52 +596,48 @@ async def main():
         raise RuntimeError(f"DATA INCOMPLETE: Missing properties: {missing}")
 
     print("✅ DATA VERIFIED — ALL PROPERTIES PRESENT")
+    print(DETAIL_STATS.summary())
 
-    async with aiohttp.ClientSession() as tg_session:
+    async with shared_session() as tg_session:
         # ================= PER-PROPERTY MONTHLY REPORTS =================
             # ================= EXCEL CREATION (UNCHANGED) =================
-            wb = Workbook()
-            wb.remove(wb.active)
-            all_dfs = []
+            wb = Workbook(write_only=True)
+            property_cubes = {}
 
             for name, df, total_rooms, inhouse, checkedout, upcoming, cancelled, prop_details, target_collect in valid_results:
 
 
-                all_dfs.append(df)
-                ws = wb.create_sheet(name)
-
-                for r in dataframe_to_rows(df, index=False, header=True):
-                    ws.append(r)
-
-                beautify(ws)
+                cube = property_cubes[name] = BookingCube(df)
+                ws = StreamSheet(wb, name, widths=PREMIUM_WIDTHS)
+                ws.write_frame(df)
 
                 ws.append([])
                 stats = [
-                    ["Total Bookings", int(df["Rooms"].sum())],
-                    ["Total OYO Bookings", count(df, "OYO")],
-                    ["Walk-in Bookings", count(df, "Walk-in")],
-                    ["MMT Bookings", count(df, "MMT")],
-                    ["BDC Bookings", count(df, "BDC")],
-                    ["Agoda Bookings", count(df, "Agoda")],
-                    ["CB Bookings", count(df, "CB")],
-                    ["TA Bookings", count(df, "TA")],
-                    ["OBA Bookings", count(df, "OBA")],
+                    ["Total Bookings", cube.count()],
+                    ["Total OYO Bookings", cube.count("OYO")],
+                    ["Walk-in Bookings", cube.count("Walk-in")],
+                    ["MMT Bookings", cube.count("MMT")],
+                    ["BDC Bookings", cube.count("BDC")],
+                    ["Agoda Bookings", cube.count("Agoda")],
+                    ["CB Bookings", cube.count("CB")],
+                    ["TA Bookings", cube.count("TA")],
+                    ["OBA Bookings", cube.count("OBA")],
                     [],
-                    ["Total Amount", round(df["Amount"].sum(), 2)],
-                    ["Cash Amount", round(df["Cash"].sum(), 2)],
-                    ["QR Amount", round(df["QR"].sum(), 2)],
-                    ["Online Amount", round(df["Online"].sum(), 2)],
-                    ["Discount Amount", round(df["Discount"].sum(), 2)],
-                    ["Ballance Amount", round(df["Balance"].sum(), 2)],
+                    ["Total Amount", cube.amt()],
+                    ["Cash Amount", round(cube.sum("Cash"), 2)],
+                    ["QR Amount", round(cube.sum("QR"), 2)],
+                    ["Online Amount", round(cube.sum("Online"), 2)],
+                    ["Discount Amount", round(cube.sum("Discount"), 2)],
+                    ["Ballance Amount", round(cube.sum("Balance"), 2)],
                     [],
-                    ["OYO Amount", amt(df, "OYO")],
-                    ["Walk-in Amount", amt(df, "Walk-in")],
-                    ["MMT Amount", amt(df, "MMT")],
-                    ["BDC Amount", amt(df, "BDC")],
-                    ["Agoda Amount", amt(df, "Agoda")],
-                    ["CB Amount", amt(df, "CB")],
-                    ["TA Amount", amt(df, "TA")],
-                    ["OBA Amount", amt(df, "OBA")]
+                    ["OYO Amount", cube.amt("OYO")],
+                    ["Walk-in Amount", cube.amt("Walk-in")],
+                    ["MMT Amount", cube.amt("MMT")],
+                    ["BDC Amount", cube.amt("BDC")],
+                    ["Agoda Amount", cube.amt("Agoda")],
+                    ["CB Amount", cube.amt("CB")],
+                    ["TA Amount", cube.amt("TA")],
+                    ["OBA Amount", cube.amt("OBA")]
                 ]
 
                 for s in stats:
@@ -1006,13 +645,12 @@ async def main():
 
                 ws.append([])
 
-                total_booked_rooms = int(df["Rooms"].sum())
-                total_amt = float(df["Amount"].sum())
+                total_booked_rooms = cube.count()
+                total_amt = float(cube.sum("Amount"))
                 arr = round(total_amt / total_booked_rooms, 2) if total_booked_rooms else 0
 
-                oyo_df = df[df["Booking Source"] == "OYO"]
-                oyo_rooms = int(oyo_df["Rooms"].sum())
-                oyo_amount = float(oyo_df["Amount"].sum())
+                oyo_rooms = cube.count("OYO")
+                oyo_amount = float(cube.sum("Amount", "OYO"))
                 app_arr = round(oyo_amount / oyo_rooms, 2) if oyo_rooms else 0
 
                 effective_total_rooms = total_rooms * target_days
@@ -1031,12 +669,13 @@ async def main():
 
                 ws.append([])
                 ws.append([])
-                add_payment_tables(ws, df, target_collect)
+                add_payment_tables(ws, cube, target_collect)
                 add_property_details_box(ws, prop_details)
+                ws.close()
 
             # ================= CONSOLIDATED =================
-            big = pd.concat(all_dfs)
-            ws = wb.create_sheet("CONSOLIDATED STATISTICS")
+            big_cube = BookingCube.combine(property_cubes.values())
+            ws = StreamSheet(wb, "CONSOLIDATED STATISTICS", window=None)
                         # ================= NEW: CONSOLIDATED TARGET COLLECTION =================
             consolidated_target_collect = {"cash": 0.0, "qr": 0.0, "online": 0.0}
             for res in valid_results:
@@ -1047,31 +686,31 @@ async def main():
 
 
             rows = [
-                ["Total Bookings", int(big["Rooms"].sum())],
-                ["Total OYO Bookings", count(big, "OYO")],
-                ["Walk-in Bookings", count(big, "Walk-in")],
-                ["MMT Bookings", count(big, "MMT")],
-                ["BDC Bookings", count(big, "BDC")],
-                ["Agoda Bookings", count(big, "Agoda")],
-                ["CB Bookings", count(big, "CB")],
-                ["TA Bookings", count(big, "TA")],
-                ["OBA Bookings", count(big, "OBA")],
+                ["Total Bookings", big_cube.count()],
+                ["Total OYO Bookings", big_cube.count("OYO")],
+                ["Walk-in Bookings", big_cube.count("Walk-in")],
+                ["MMT Bookings", big_cube.count("MMT")],
+                ["BDC Bookings", big_cube.count("BDC")],
+                ["Agoda Bookings", big_cube.count("Agoda")],
+                ["CB Bookings", big_cube.count("CB")],
+                ["TA Bookings", big_cube.count("TA")],
+                ["OBA Bookings", big_cube.count("OBA")],
                 [],
-                ["Total Amount", round(big["Amount"].sum(), 2)],
-                ["Cash Amount", round(big["Cash"].sum(), 2)],
-                ["QR Amount", round(big["QR"].sum(), 2)],
-                ["Online Amount", round(big["Online"].sum(), 2)],
-                ["Discount Amount", round(big["Discount"].sum(), 2)],
-                ["Ballance Amount", round(big["Balance"].sum(), 2)],
+                ["Total Amount", big_cube.amt()],
+                ["Cash Amount", round(big_cube.sum("Cash"), 2)],
+                ["QR Amount", round(big_cube.sum("QR"), 2)],
+                ["Online Amount", round(big_cube.sum("Online"), 2)],
+                ["Discount Amount", round(big_cube.sum("Discount"), 2)],
+                ["Ballance Amount", round(big_cube.sum("Balance"), 2)],
                 [],
-                ["OYO Amount", amt(big, "OYO")],
-                ["Walk-in Amount", amt(big, "Walk-in")],
-                ["MMT Amount", amt(big, "MMT")],
-                ["BDC Amount", amt(big, "BDC")],
-                ["Agoda Amount", amt(big, "Agoda")],
-                ["CB Amount", amt(big, "CB")],
-                ["TA Amount", amt(big, "TA")],
-                ["OBA Amount", amt(big, "OBA")]
+                ["OYO Amount", big_cube.amt("OYO")],
+                ["Walk-in Amount", big_cube.amt("Walk-in")],
+                ["MMT Amount", big_cube.amt("MMT")],
+                ["BDC Amount", big_cube.amt("BDC")],
+                ["Agoda Amount", big_cube.amt("Agoda")],
+                ["CB Amount", big_cube.amt("CB")],
+                ["TA Amount", big_cube.amt("TA")],
+                ["OBA Amount", big_cube.amt("OBA")]
             ]
 
             for r in rows:
@@ -1080,13 +719,12 @@ async def main():
             ws.append([])
 
             grand_total_rooms = sum(r[2] for r in valid_results) * target_days
-            total_rooms_booked = int(big["Rooms"].sum())
-            total_amt = float(big["Amount"].sum())
+            total_rooms_booked = big_cube.count()
+            total_amt = float(big_cube.sum("Amount"))
             arr = round(total_amt / total_rooms_booked, 2) if total_rooms_booked else 0
 
-            oyo_big = big[big["Booking Source"] == "OYO"]
-            oyo_rooms = int(oyo_big["Rooms"].sum())
-            oyo_amt = float(oyo_big["Amount"].sum())
+            oyo_rooms = big_cube.count("OYO")
+            oyo_amt = float(big_cube.sum("Amount", "OYO"))
             app_arr = round(oyo_amt / oyo_rooms, 2) if oyo_rooms else 0
 
             available_rooms = grand_total_rooms - total_rooms_booked
@@ -1099,24 +737,6 @@ async def main():
             ws.append(["ARR", arr])
             ws.append(["App ARR", app_arr])
             
-            blue = PatternFill("solid", fgColor="1F4E78")
-            light = PatternFill("solid", fgColor="DDEBF7")
-            green = PatternFill("solid", fgColor="C6EFCE")
-            yellow = PatternFill("solid", fgColor="FFF4CC")
-            red = PatternFill("solid", fgColor="FFC7CE")
-
-            bold_white = Font(color="FFFFFF", bold=True, size=12)
-            bold_black = Font(color="000000", bold=True, size=11)
-            normal = Font(color="000000", size=11)
-
-            thin = Border(
-                left=Side(style='thin'),
-                right=Side(style='thin'),
-                top=Side(style='thin'),
-                bottom=Side(style='thin')
-            )
-             
-
                         # ================= PROPERTY WISE AMOUNT TABLE =================
             ws.append([])
 
@@ -1124,30 +744,24 @@ async def main():
             ws.merge_cells(start_row=start_amt_row, start_column=1, end_row=start_amt_row, end_column=7)
             cell = ws.cell(row=start_amt_row, column=1)
             cell.value = "PROPERTY WISE AMOUNT"
-            cell.fill = blue
-            cell.font = bold_white
-            cell.alignment = Alignment(horizontal="center", vertical="center")
-            cell.border = thin
+            set_style(cell, "rpt_header")
 
             amt_headers = ["Property Code", "Cash", "QR", "Online", "Discount", "Balance", "Total Amount"]
             for i, h in enumerate(amt_headers, 1):
                 ws.cell(row=start_amt_row + 1, column=i).value = h
-                ws.cell(row=start_amt_row + 1, column=i).fill = light
-                ws.cell(row=start_amt_row + 1, column=i).font = bold_black
-                ws.cell(row=start_amt_row + 1, column=i).border = thin
-                ws.cell(row=start_amt_row + 1, column=i).alignment = Alignment(horizontal="center")
+                set_style(ws.cell(row=start_amt_row + 1, column=i), "rpt_table_head")
 
             rr = start_amt_row + 2
 
             tot_cash = tot_qr = tot_online = tot_disc = tot_bal = tot_amt = 0
 
-            for name, df_prop, *_ in valid_results:
-                cash = round(df_prop["Cash"].sum(), 2)
-                qr = round(df_prop["QR"].sum(), 2)
-                online = round(df_prop["Online"].sum(), 2)
-                disc = round(df_prop["Discount"].sum(), 2)
-                bal = round(df_prop["Balance"].sum(), 2)
-                amt_total = round(df_prop["Amount"].sum(), 2)
+            for name, cube in property_cubes.items():
+                cash = round(cube.sum("Cash"), 2)
+                qr = round(cube.sum("QR"), 2)
+                online = round(cube.sum("Online"), 2)
+                disc = round(cube.sum("Discount"), 2)
+                bal = round(cube.sum("Balance"), 2)
+                amt_total = round(cube.sum("Amount"), 2)
 
                 tot_cash += cash
                 tot_qr += qr
@@ -1159,8 +773,7 @@ async def main():
                 vals = [name, cash, qr, online, disc, bal, amt_total]
                 for c, v in enumerate(vals, 1):
                     ws.cell(row=rr, column=c).value = v
-                    ws.cell(row=rr, column=c).border = thin
-                    ws.cell(row=rr, column=c).alignment = Alignment(horizontal="center")
+                    set_style(ws.cell(row=rr, column=c), "rpt_table_cell")
                 rr += 1
 
             # totals row
@@ -1169,10 +782,7 @@ async def main():
 
             for c, v in enumerate(totals, 1):
                 ws.cell(row=rr, column=c).value = v
-                ws.cell(row=rr, column=c).fill = yellow
-                ws.cell(row=rr, column=c).font = bold_black
-                ws.cell(row=rr, column=c).border = thin
-                ws.cell(row=rr, column=c).alignment = Alignment(horizontal="center")
+                set_style(ws.cell(row=rr, column=c), "rpt_table_total")
 
             # ================= PROPERTY WISE BOOKINGS TABLE =================
             ws.append([])
@@ -1181,34 +791,28 @@ async def main():
             ws.merge_cells(start_row=start_book_row, start_column=1, end_row=start_book_row, end_column=10)
             cell = ws.cell(row=start_book_row, column=1)
             cell.value = "PROPERTY WISE BOOKINGS"
-            cell.fill = blue
-            cell.font = bold_white
-            cell.alignment = Alignment(horizontal="center", vertical="center")
-            cell.border = thin
+            set_style(cell, "rpt_header")
 
             book_headers = ["Property Code","OYO","Walk-in","MMT","BDC","Agoda","CB","TA","OBA","Total"]
             for i, h in enumerate(book_headers, 1):
                 ws.cell(row=start_book_row + 1, column=i).value = h
-                ws.cell(row=start_book_row + 1, column=i).fill = light
-                ws.cell(row=start_book_row + 1, column=i).font = bold_black
-                ws.cell(row=start_book_row + 1, column=i).border = thin
-                ws.cell(row=start_book_row + 1, column=i).alignment = Alignment(horizontal="center")
+                set_style(ws.cell(row=start_book_row + 1, column=i), "rpt_table_head")
 
             rr = start_book_row + 2
 
             col_totals = [0]*8
 
-            for name, df_prop, *_ in valid_results:
+            for name, cube in property_cubes.items():
                 vals = [
                     name,
-                    count(df_prop,"OYO"),
-                    count(df_prop,"Walk-in"),
-                    count(df_prop,"MMT"),
-                    count(df_prop,"BDC"),
-                    count(df_prop,"Agoda"),
-                    count(df_prop,"CB"),
-                    count(df_prop,"TA"),
-                    count(df_prop,"OBA")
+                    cube.count("OYO"),
+                    cube.count("Walk-in"),
+                    cube.count("MMT"),
+                    cube.count("BDC"),
+                    cube.count("Agoda"),
+                    cube.count("CB"),
+                    cube.count("TA"),
+                    cube.count("OBA")
                 ]
 
                 total_row = sum(vals[1:])
@@ -1219,18 +823,14 @@ async def main():
 
                 for c, v in enumerate(vals, 1):
                     ws.cell(row=rr, column=c).value = v
-                    ws.cell(row=rr, column=c).border = thin
-                    ws.cell(row=rr, column=c).alignment = Alignment(horizontal="center")
+                    set_style(ws.cell(row=rr, column=c), "rpt_table_cell")
                 rr += 1
 
             total_vals = ["TOTAL"] + col_totals + [sum(col_totals)]
 
             for c, v in enumerate(total_vals, 1):
                 ws.cell(row=rr, column=c).value = v
-                ws.cell(row=rr, column=c).fill = yellow
-                ws.cell(row=rr, column=c).font = bold_black
-                ws.cell(row=rr, column=c).border = thin
-                ws.cell(row=rr, column=c).alignment = Alignment(horizontal="center")
+                set_style(ws.cell(row=rr, column=c), "rpt_table_total")
           
 
             # ================= NEW: PROPERTY SCORE TABLE (CONSOLIDATED ONLY) =================
@@ -1244,12 +844,9 @@ async def main():
             ws.merge_cells(start_row=start_row, start_column=1, end_row=start_row, end_column=3)
             hcell = ws.cell(row=start_row, column=1)
             hcell.value = "PROPERTY SCORE"
-            hcell.fill = blue
-            hcell.font = bold_white
-            hcell.alignment = Alignment(horizontal="center", vertical="center")
-            hcell.border = thin
-            ws.cell(row=start_row, column=2).border = thin
-            ws.cell(row=start_row, column=3).border = thin
+            set_style(hcell, "rpt_header")
+            set_style(ws.cell(row=start_row, column=2), "rpt_edge")
+            set_style(ws.cell(row=start_row, column=3), "rpt_edge")
             ws.row_dimensions[start_row].height = 20
 
             # Column headers
@@ -1259,20 +856,18 @@ async def main():
 
             for c in [1, 2, 3, 4]:
                 cell = ws.cell(row=start_row + 1, column=c)
-                cell.fill = light
-                cell.font = bold_black
-                cell.border = thin
-                cell.alignment = Alignment(horizontal="center", vertical="center")
+                set_style(cell, "rpt_head")
 
             r = start_row + 2
 
             # Each property score + revenue loss
-            for name, df_prop, total_rooms_prop, *_ in valid_results:
-                booked_rooms_prop = int(df_prop["Rooms"].sum()) if not df_prop.empty else 0
+            for name, _, total_rooms_prop, *_ in valid_results:
+                cube = property_cubes[name]
+                booked_rooms_prop = cube.count()
                 total_rooms_effective = (total_rooms_prop * target_days) if total_rooms_prop else 0
                 available_rooms_prop = total_rooms_effective - booked_rooms_prop
 
-                total_amount_prop = float(df_prop["Amount"].sum()) if not df_prop.empty else 0.0
+                total_amount_prop = float(cube.sum("Amount"))
 
                 score = round((booked_rooms_prop / total_rooms_effective) * 100, 2) if total_rooms_effective else 0.0
 
@@ -1289,19 +884,10 @@ async def main():
 
 
                 # Conditional fill based on score
-                if score > 80:
-                    row_fill = green
-                elif score >= 60:
-                    row_fill = yellow
-                else:
-                    row_fill = red
+                style = score_style(score, prefix="rpt_score_")
 
                 for c in [1, 2, 3, 4]:
-                    cell = ws.cell(row=r, column=c)
-                    cell.fill = row_fill
-                    cell.font = normal
-                    cell.border = thin
-                    cell.alignment = Alignment(horizontal="center", vertical="center")
+                    set_style(ws.cell(row=r, column=c), style)
 
                 r += 1
 
@@ -1309,21 +895,15 @@ async def main():
 
             
                         # ================= NEW: CONSOLIDATED PAYMENT TABLES =================
-            add_payment_tables(ws, big, consolidated_target_collect, title_prefix="CONSOLIDATED — ")
+            add_payment_tables(ws, big_cube, consolidated_target_collect, title_prefix="CONSOLIDATED — ")
 
 
-            beautify(ws)
+            ws.close(beautify=True)
 
             # ================= SEND EXCEL TO TELEGRAM (NO LOCAL SAVE) =================
-            buffer = BytesIO()
-            wb.save(buffer)
-            buffer.seek(0)
-
-            await send_telegram_excel_buffer(
-                buffer,
-                filename=f"Bookings_{TF_FMT}.xlsx",
-                caption=f"📊 Daily Bookings Report"
-            )
+            with ReportSink(f"Bookings_{TF_FMT}.xlsx") as sink:
+                sink.write(wb)
+                await sink.send(send_telegram_excel_buffer, caption=f"📊 Daily Bookings Report")
 
 
             print("")
@@ -1349,7 +929,7 @@ async def main():
 # ================= RUN =================
 if __name__ == "__main__":
     try:
-        asyncio.run(main())
+        run(main())
     except Exception as e:
         print("SCRIPT CRASHED")
         print(e)
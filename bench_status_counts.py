@@ -0,0 +1,100 @@
+# ==============================
+# BENCHMARK: STATUS-WINDOW COUNTERS
+# OLD df.iterrows() + strptime PER ROW  vs  report_cube VECTORIZED PREDICATES
+# ==============================
+#
+#   python bench_status_counts.py            # 50k rows
+#   python bench_status_counts.py 200000
+
+import sys
+import time
+import random
+from datetime import datetime, timedelta
+
+import pandas as pd
+import pytz
+
+from report_cube import count_upcoming, count_cancelled
+
+IST = pytz.timezone("Asia/Kolkata")
+STATUSES = ["Checked In", "Checked Out", "Confirm Booking", "Cancelled Booking"]
+
+
+# ================= OLD (ROW LOOP) =================
+def old_count_upcoming(df, tf, now):
+    tf_date = datetime.strptime(tf, "%Y-%m-%d")
+    next_date = tf_date + timedelta(days=1)
+
+    c = 0
+    for _, r in df.iterrows():
+        if r.get("Status") != "Confirm Booking":
+            continue
+
+        d = datetime.strptime(r["Date"], "%Y-%m-%d")
+
+        if d == tf_date and now.hour >= 12:
+            c += 1
+        elif d == next_date and now.hour < 12:
+            c += 1
+
+    return c
+
+
+def old_count_cancelled(df, tf):
+    tf_date = datetime.strptime(tf, "%Y-%m-%d")
+    next_date = tf_date + timedelta(days=1)
+
+    c = 0
+    for _, r in df.iterrows():
+        if r.get("Status") != "Cancelled Booking":
+            continue
+
+        d = datetime.strptime(r["Date"], "%Y-%m-%d")
+
+        if d == tf_date or d == next_date:
+            c += 1
+
+    return c
+
+
+# ================= FRAME =================
+def booking_frame(rows):
+    random.seed(7)
+    start = datetime(2026, 10, 1)
+
+    return pd.DataFrame({
+        "Date": [(start + timedelta(days=random.randint(0, 30))).strftime("%Y-%m-%d") for _ in range(rows)],
+        "Booking Id": [f"BK{i:06d}" for i in range(rows)],
+        "Status": [random.choice(STATUSES) for _ in range(rows)],
+        "Rooms": [random.randint(1, 3) for _ in range(rows)],
+    })
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def main(rows):
+    df = booking_frame(rows)
+    tf = "2026-10-15"
+
+    print(f"📊 STATUS COUNTERS → {rows} rows")
+
+    for hour in (9, 18):
+        now = IST.localize(datetime(2026, 10, 15, hour))
+
+        old, t_old = timed(old_count_upcoming, df, tf, now)
+        new, t_new = timed(count_upcoming, df, tf, now)
+        assert old == new, (old, new)
+        print(f"  upcoming  @{hour:02d}h = {new:<6} iterrows {t_old:.3f}s → vectorized {t_new:.4f}s ({t_old / t_new:.0f}x)")
+
+    old, t_old = timed(old_count_cancelled, df, tf)
+    new, t_new = timed(count_cancelled, df, tf)
+    assert old == new, (old, new)
+    print(f"  cancelled     = {new:<6} iterrows {t_old:.3f}s → vectorized {t_new:.4f}s ({t_old / t_new:.0f}x)")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50000)
@@ -0,0 +1,219 @@
+# ==============================
+# LOCAL BOOKING STORE (SQLite) + INCREMENTAL SYNC
+# CLOSED CHECK-IN DAYS FROM DISK, OPEN TAIL FROM get_booking_with_ids
+# ==============================
+#
+# A check-in day is "closed" once it is older than SETTLE_DAYS and every
+# booking on it is final. Closed days are served from disk; every run only
+# pages from the first open day up to the end of the window.
+#
+#   python booking_store.py sync [DAYS]   → warm the store for all properties
+
+import os
+import sys
+import json
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytz
+
+import detail_cache
+from oyo_client import shared_session, run, fetch_bookings_window
+
+IST = pytz.timezone("Asia/Kolkata")
+
+BOOKING_STORE_PATH = os.getenv(
+    "OYO_BOOKING_STORE", os.path.join(".cache", "bookings.sqlite")
+)
+SETTLE_DAYS = int(os.getenv("OYO_BOOKING_SETTLE_DAYS", "3"))
+FORCE_CLOSE_DAYS = int(os.getenv("OYO_BOOKING_FORCE_CLOSE_DAYS", "30"))
+
+FINAL_STATUSES = ("Checked Out", "Cancelled Booking")
+
+_conn = None
+
+
+# ================= DB =================
+def _db():
+    global _conn
+
+    if _conn is None:
+        folder = os.path.dirname(BOOKING_STORE_PATH)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+
+        _conn = sqlite3.connect(BOOKING_STORE_PATH, timeout=30)
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.execute("PRAGMA synchronous=NORMAL")
+        _conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS bookings (
+                qid         TEXT NOT NULL,
+                booking_key TEXT NOT NULL,
+                checkin     TEXT NOT NULL,
+                status      TEXT NOT NULL,
+                payload     TEXT NOT NULL,
+                PRIMARY KEY (qid, booking_key)
+            );
+            CREATE INDEX IF NOT EXISTS bookings_checkin ON bookings (qid, checkin);
+
+            CREATE TABLE IF NOT EXISTS closed_days (
+                qid TEXT NOT NULL,
+                day TEXT NOT NULL,
+                PRIMARY KEY (qid, day)
+            );
+            """
+        )
+        _conn.commit()
+
+    return _conn
+
+
+def close():
+    global _conn
+
+    if _conn is not None:
+        _conn.close()
+        _conn = None
+
+
+def _as_date(d):
+    if isinstance(d, str):
+        return datetime.strptime(d, "%Y-%m-%d").date()
+    if isinstance(d, datetime):
+        return d.date()
+    return d
+
+
+# ================= FINAL RULES =================
+def is_final(b, today):
+    """True when the listing row can no longer change"""
+    status = (b.get("status") or "").strip()
+
+    if status in FINAL_STATUSES:
+        return True
+
+    try:
+        co = datetime.strptime(b["checkout"], "%Y-%m-%d").date()
+    except Exception:
+        return False
+
+    # no-show / never-cancelled confirm bookings settle after checkout
+    if status != "Checked In" and co < today - timedelta(days=SETTLE_DAYS):
+        return True
+
+    # forgotten in-house rows: stop re-reading them eventually
+    return co < today - timedelta(days=FORCE_CLOSE_DAYS)
+
+
+def first_open_day(qid, f, t):
+    """first check-in day in f..t not yet closed on disk"""
+    closed = {
+        row[0] for row in _db().execute(
+            "SELECT day FROM closed_days WHERE qid = ? AND day BETWEEN ? AND ?",
+            (qid, f.isoformat(), t.isoformat()),
+        )
+    }
+
+    day = f
+    while day <= t and day.isoformat() in closed:
+        day += timedelta(days=1)
+
+    return day
+
+
+# ================= SYNC =================
+def _replace_live(qid, start, t, live, today):
+    db = _db()
+
+    db.execute(
+        "DELETE FROM bookings WHERE qid = ? AND checkin BETWEEN ? AND ?",
+        (qid, start.isoformat(), t.isoformat()),
+    )
+    db.executemany(
+        "INSERT OR REPLACE INTO bookings (qid, booking_key, checkin, status, payload) "
+        "VALUES (?, ?, ?, ?, ?)",
+        [
+            (qid, str(key), str(b.get("checkin", "")), (b.get("status") or "").strip(), json.dumps(b))
+            for key, b in live.items()
+        ],
+    )
+
+    # close every settled day whose bookings are all final
+    open_days = set()
+    for b in live.values():
+        if not is_final(b, today):
+            open_days.add(str(b.get("checkin", "")))
+
+    last_settled = min(t, today - timedelta(days=SETTLE_DAYS + 1))
+    day = start
+    closed = []
+    while day <= last_settled:
+        if day.isoformat() not in open_days:
+            closed.append((qid, day.isoformat()))
+        day += timedelta(days=1)
+
+    db.executemany("INSERT OR IGNORE INTO closed_days (qid, day) VALUES (?, ?)", closed)
+    db.commit()
+
+
+async def sync_bookings(session, P, f, t):
+    """
+    Drop-in for paging get_booking_with_ids over check-ins f..t
+    → {booking_id: booking}
+    """
+    qid = str(P["QID"])
+    f, t = _as_date(f), _as_date(t)
+    today = datetime.now(IST).date()
+
+    start = first_open_day(qid, f, t)
+
+    live = {}
+    if start <= t:
+        live = await fetch_bookings_window(session, P, start.isoformat(), t.isoformat())
+        _replace_live(qid, start, t, live, today)
+
+    bookings = {
+        key: json.loads(payload)
+        for key, payload in _db().execute(
+            "SELECT booking_key, payload FROM bookings "
+            "WHERE qid = ? AND checkin >= ? AND checkin < ?",
+            (qid, f.isoformat(), start.isoformat()),
+        )
+    }
+    from_disk = len(bookings)
+    bookings.update(live)
+
+    # disk rows never went through fetch_bookings_batch → give the detail cache their status
+    detail_cache.note_listing(P, bookings)
+
+    print(
+        f"📦 BOOKING STORE → {P['name']} :: disk={from_disk} "
+        f"live={len(live)} (paged {start} → {t})"
+    )
+    return bookings
+
+
+# ================= SYNC COMMAND =================
+async def sync_all(days):
+    properties = json.loads(os.getenv("OYO_PROPERTIES", "{}"))
+
+    if not properties:
+        raise RuntimeError("❌ OYO_PROPERTIES secret missing or empty")
+
+    today = datetime.now(IST).date()
+    f = today - timedelta(days=days)
+
+    async with shared_session() as session:
+        for P in properties.values():
+            await sync_bookings(session, P, f, today)
+
+    close()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "sync":
+        print("usage: python booking_store.py sync [DAYS]")
+        sys.exit(1)
+
+    run(sync_all(int(sys.argv[2]) if len(sys.argv) > 2 else 120))
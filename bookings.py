@@ -14,8 +14,9 @@ from openpyxl import Workbook
 from openpyxl.styles import PatternFill, Font, Alignment, Border, Side
 from openpyxl.chart import BarChart, Reference
 from openpyxl.chart.series import DataPoint
-from io import BytesIO
+from report_sink import ReportSink
 import pytz
+from oyo_client import shared_session, run, BookingPages
 
 
 IST = pytz.timezone("Asia/Kolkata")
@@ -23,10 +24,6 @@ IST = pytz.timezone("Asia/Kolkata")
 MAX_FULL_RUN_RETRIES = 5
 FULL_RUN_RETRY_DELAY = 10
 
-PROP_PARALLEL_LIMIT = 4
-prop_semaphore = asyncio.Semaphore(PROP_PARALLEL_LIMIT)
-
-BATCH_TIMEOUT = 40
 
 
 # ================= TELEGRAM =================
@@ -57,7 +54,7 @@ async def send_telegram_excel_buffer(buffer, filename, caption=None):
         content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
     )
 
-    async with aiohttp.ClientSession() as session:
+    async with shared_session() as session:
         async with session.post(url, data=data, timeout=120) as resp:
             if resp.status != 200:
                 raise RuntimeError(await resp.text())
@@ -125,47 +122,6 @@ def get_booking_source(b):
     return "OBA"
 
 
-# ================= FETCH BOOKINGS =================
-
-async def fetch_bookings_batch(session, offset, f, t, P):
-
-    url = "https://www.oyoos.com/hms_ms/api/v1/get_booking_with_ids"
-
-    params = {
-        "qid": P["QID"],
-        "checkin_from": f,
-        "checkin_till": t,
-        "batch_count": 100,
-        "batch_offset": offset,
-        "visibility_required": "true",
-        "additionalParams": "payment_hold_transaction,guest,stay_details",
-        "decimal_price": "true",
-        "ascending": "true",
-        "sort_on": "checkin_date"
-    }
-
-    cookies = {"uif": P["UIF"], "uuid": P["UUID"]}
-
-    headers = {
-        "accept": "application/json",
-        "content-type": "application/json",
-        "x-qid": str(P["QID"]),
-        "x-source-client": "merchant"
-    }
-
-    async with session.get(
-        url, params=params, cookies=cookies,
-        headers=headers, timeout=BATCH_TIMEOUT
-    ) as r:
-
-        if r.status != 200:
-            raise RuntimeError("BATCH FAIL")
-
-        return await r.json()
-
-
-
-
 def parse_oyo_time(val):
 
     if not val:
@@ -204,13 +160,15 @@ async def process_property(P, TF, TT, HF, HT):
             "Agoda":0,"CB":0,"TA":0,"OBA":0
         }
 
-    async with aiohttp.ClientSession() as session:
+    async with shared_session() as session:
 
         offset = 0
 
+        pages = BookingPages(session, P, HF, HT)   # next pages fetched ahead
+
         while True:
 
-            data = await fetch_bookings_batch(session, offset, HF, HT, P)
+            data = await pages.get(offset)
 
             if not data or not data.get("bookingIds"):
                 break
@@ -287,10 +245,6 @@ async def run_property_with_retry(P, TF, TT, HF, HT, retries=3):
     raise RuntimeError("PROPERTY FAILED")
 
 
-async def run_property_limited(P, TF, TT, HF, HT):
-    async with prop_semaphore:
-        return await run_property_with_retry(P, TF, TT, HF, HT)
-
 
 # ================= UTIL =================
 
@@ -350,7 +304,7 @@ async def main():
         if not pending:
             break
 
-        tasks = [run_property_limited(P, TF, TT, HF, HT) for P in pending.values()]
+        tasks = [run_property_with_retry(P, TF, TT, HF, HT) for P in pending.values()]
         results = await asyncio.gather(*tasks, return_exceptions=True)
 
         new_pending = {}
@@ -552,15 +506,9 @@ async def main():
 
     # ================= SAVE =================
 
-    buffer = BytesIO()
-    wb.save(buffer)
-    buffer.seek(0)
-
-    await send_telegram_excel_buffer(
-        buffer,
-        filename=f"Bookings_Daily.xlsx",
-        caption="📊 Hourly Booking Mode Report"
-    )
+    with ReportSink(f"Bookings_Daily.xlsx") as sink:
+        sink.write(wb)
+        await sink.send(send_telegram_excel_buffer, caption="📊 Hourly Booking Mode Report")
 
 
 # ================= RUN =================
@@ -568,6 +516,6 @@ async def main():
 if __name__ == "__main__":
 
     try:
-        asyncio.run(main())
+        run(main())
     except Exception:
         traceback.print_exc()
@@ -14,8 +14,9 @@ from openpyxl import Workbook
 from openpyxl.styles import PatternFill, Font, Alignment, Border, Side
 from openpyxl.chart import BarChart, Reference
 from openpyxl.chart.series import DataPoint
-from io import BytesIO
+from report_sink import ReportSink
 import pytz
+from oyo_client import shared_session, run, BookingPages
 
 
 IST = pytz.timezone("Asia/Kolkata")
@@ -23,10 +24,6 @@ IST = pytz.timezone("Asia/Kolkata")
 MAX_FULL_RUN_RETRIES = 5
 FULL_RUN_RETRY_DELAY = 10
 
-PROP_PARALLEL_LIMIT = 4
-prop_semaphore = asyncio.Semaphore(PROP_PARALLEL_LIMIT)
-
-BATCH_TIMEOUT = 40
 
 
 # ================= TELEGRAM =================
@@ -57,7 +54,7 @@ async def send_telegram_excel_buffer(buffer, filename, caption=None):
         content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
     )
 
-    async with aiohttp.ClientSession() as session:
+    async with shared_session() as session:
         async with session.post(url, data=data, timeout=120) as resp:
             if resp.status != 200:
                 raise RuntimeError(await resp.text())
@@ -155,47 +152,6 @@ def get_booking_source(b):
     return "OBA"
 
 
-# ================= FETCH BOOKINGS =================
-
-async def fetch_bookings_batch(session, offset, f, t, P):
-
-    url = "https://www.oyoos.com/hms_ms/api/v1/get_booking_with_ids"
-
-    params = {
-        "qid": P["QID"],
-        "checkin_from": f,
-        "checkin_till": t,
-        "batch_count": 100,
-        "batch_offset": offset,
-        "visibility_required": "true",
-        "additionalParams": "payment_hold_transaction,guest,stay_details",
-        "decimal_price": "true",
-        "ascending": "true",
-        "sort_on": "checkin_date"
-    }
-
-    cookies = {"uif": P["UIF"], "uuid": P["UUID"]}
-
-    headers = {
-        "accept": "application/json",
-        "content-type": "application/json",
-        "x-qid": str(P["QID"]),
-        "x-source-client": "merchant"
-    }
-
-    async with session.get(
-        url, params=params, cookies=cookies,
-        headers=headers, timeout=BATCH_TIMEOUT
-    ) as r:
-
-        if r.status != 200:
-            raise RuntimeError("BATCH FAIL")
-
-        return await r.json()
-
-
-
-
 async def process_property(P, TF, TT, HF, HT):
 
     print(f"PROCESSING → {P['name']}")
@@ -217,7 +173,7 @@ async def process_property(P, TF, TT, HF, HT):
 
     # ================= SESSION =================
 
-    async with aiohttp.ClientSession() as session:
+    async with shared_session() as session:
 
         offset = 0
         seen_ids = set()
@@ -225,9 +181,11 @@ async def process_property(P, TF, TT, HF, HT):
         empty_retry = 0
         MAX_EMPTY_RETRY = 6
 
+        pages = BookingPages(session, P, HF, HT)   # next pages fetched ahead
+
         while True:
 
-            data = await fetch_bookings_batch(session, offset, HF, HT, P)
+            data = await pages.get(offset)
 
             if not data:
                 break
@@ -328,10 +286,6 @@ async def run_property_with_retry(P, TF, TT, HF, HT, retries=3):
     raise RuntimeError("PROPERTY FAILED")
 
 
-async def run_property_limited(P, TF, TT, HF, HT):
-    async with prop_semaphore:
-        return await run_property_with_retry(P, TF, TT, HF, HT)
-
 
 
 def autofit_columns(ws):
@@ -394,7 +348,7 @@ async def main():
         print(f"\n🔁 PARTIAL RUN ATTEMPT {run_attempt}/{MAX_FULL_RUN_RETRIES}")
         print(f"⏳ Pending Properties: {len(pending)}")
 
-        tasks = [run_property_limited(P, TF, TT, HF, HT) for P in pending.values()]
+        tasks = [run_property_with_retry(P, TF, TT, HF, HT) for P in pending.values()]
         results = await asyncio.gather(*tasks, return_exceptions=True)
 
         new_pending = {}
@@ -648,15 +602,9 @@ async def main():
 
     # ================= SAVE =================
 
-    buffer = BytesIO()
-    wb.save(buffer)
-    buffer.seek(0)
-
-    await send_telegram_excel_buffer(
-        buffer,
-        filename=f"Bookings_Monthly.xlsx",
-        caption="📊 Date-wise Booking Mode Report"
-    )
+    with ReportSink(f"Bookings_Monthly.xlsx") as sink:
+        sink.write(wb)
+        await sink.send(send_telegram_excel_buffer, caption="📊 Date-wise Booking Mode Report")
 
 
 # ================= RUN =================
@@ -664,7 +612,7 @@ async def main():
 if __name__ == "__main__":
 
     try:
-        asyncio.run(main())
+        run(main())
 
     except Exception:
 
@@ -13,8 +13,10 @@ from openpyxl import Workbook
 from openpyxl.styles import PatternFill, Font, Alignment, Border, Side
 from openpyxl.chart import BarChart, Reference
 from openpyxl.chart.series import DataPoint
-from io import BytesIO
+from report_sink import ReportSink
 import pytz
+from detail_resolver import DetailPipeline
+from oyo_client import shared_session, run, BookingPages, fetch_booking_details_raw
 
 
 IST = pytz.timezone("Asia/Kolkata")
@@ -23,13 +25,6 @@ now = datetime.now(IST)
 MAX_FULL_RUN_RETRIES = 5
 FULL_RUN_RETRY_DELAY = 10
 
-PROP_PARALLEL_LIMIT = 3
-DETAIL_PARALLEL_LIMIT = 10
-
-prop_semaphore = asyncio.Semaphore(PROP_PARALLEL_LIMIT)
-
-DETAIL_TIMEOUT = 25
-BATCH_TIMEOUT = 35
 
 
 # ================= TELEGRAM =================
@@ -65,7 +60,7 @@ async def send_telegram_excel_buffer(buffer, filename, caption=None):
         content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
     )
 
-    async with aiohttp.ClientSession() as session:
+    async with shared_session() as session:
         async with session.post(url, data=data, timeout=120) as resp:
             if resp.status != 200:
                 text = await resp.text()
@@ -100,126 +95,45 @@ def get_hour_color(hour):
 # ================= FETCH DETAILS =================
 
 async def fetch_booking_details(session, P, booking_no):
+    data = await fetch_booking_details_raw(session, P, booking_no)
 
-    url = "https://www.oyoos.com/hms_ms/api/v1/visibility/booking_details_with_entities"
-
-    params = {
-        "qid": P["QID"],
-        "booking_id": booking_no,
-        "role": 0,
-        "platform": "OYOOS",
-        "country_code": 1
-    }
-
-    cookies = {"uif": P["UIF"], "uuid": P["UUID"]}
-
-    headers = {
-        "accept": "application/json",
-        "content-type": "application/json",
-        "x-qid": str(P["QID"]),
-        "x-source-client": "merchant"
-    }
-
-    for attempt in range(1, 4):
-
-        try:
-            async with session.get(
-                url,
-                params=params,
-                headers=headers,
-                cookies=cookies,
-                timeout=DETAIL_TIMEOUT
-            ) as r:
-
-                if r.status != 200:
-                    raise RuntimeError("DETAIL API FAILED")
-
-                data = await r.json()
-
-                booking = next(
-                    iter(data.get("entities", {}).get("bookings", {}).values()),
-                    {}
-                )
-
-                payments = booking.get("payments", [])
-
-                events = []
-
-                for p in payments:
-
-                    amt = float(p.get("amount", 0) or 0)
-                    if amt <= 0:
-                        continue
-
-                    created_at = str(p.get("created_at") or "").strip()
-                    if not created_at:
-                        continue
+    booking = next(
+        iter(data.get("entities", {}).get("bookings", {}).values()),
+        {}
+    )
 
-                    try:
-                        dt = datetime.fromisoformat(created_at.replace("Z", ""))
-                        dt = dt.astimezone(IST)
-                    except Exception:
-                        continue
+    payments = booking.get("payments", [])
 
-                    mode_raw = p.get("mode", "")
+    events = []
 
-                    if mode_raw != "Cash at Hotel":
-                        continue
+    for p in payments:
 
-                    events.append({
-                        "date": dt.strftime("%Y-%m-%d"),
-                        "hour": dt.hour,
-                        "amt": amt
-                    })
+        amt = float(p.get("amount", 0) or 0)
+        if amt <= 0:
+            continue
 
-                return events
+        created_at = str(p.get("created_at") or "").strip()
+        if not created_at:
+            continue
 
+        try:
+            dt = datetime.fromisoformat(created_at.replace("Z", ""))
+            dt = dt.astimezone(IST)
         except Exception:
-            await asyncio.sleep(2 + attempt)
-
-    raise RuntimeError("DETAIL FETCH FAILED")
+            continue
 
+        mode_raw = p.get("mode", "")
 
-# ================= FETCH BOOKINGS =================
+        if mode_raw != "Cash at Hotel":
+            continue
 
-async def fetch_bookings_batch(session, offset, f, t, P):
-
-    url = "https://www.oyoos.com/hms_ms/api/v1/get_booking_with_ids"
-
-    params = {
-        "qid": P["QID"],
-        "checkin_from": f,
-        "checkin_till": t,
-        "batch_count": 100,
-        "batch_offset": offset,
-        "visibility_required": "true",
-        "additionalParams": "payment_hold_transaction,guest,stay_details",
-        "decimal_price": "true",
-        "ascending": "true",
-        "sort_on": "checkin_date"
-    }
-
-    cookies = {"uif": P["UIF"], "uuid": P["UUID"]}
-
-    headers = {
-        "accept": "application/json",
-        "content-type": "application/json",
-        "x-qid": str(P["QID"]),
-        "x-source-client": "merchant"
-    }
-
-    async with session.get(
-        url,
-        params=params,
-        cookies=cookies,
-        headers=headers,
-        timeout=BATCH_TIMEOUT
-    ) as r:
-
-        if r.status != 200:
-            raise RuntimeError("BATCH API FAILED")
+        events.append({
+            "date": dt.strftime("%Y-%m-%d"),
+            "hour": dt.hour,
+            "amt": amt
+        })
 
-        return await r.json()
+    return events
 
 
 # ================= PROCESS PROPERTY =================
@@ -231,81 +145,94 @@ async def process_property(P, TF, TT, HF, HT):
     tf_dt = datetime.strptime(TF, "%Y-%m-%d").date()
     tt_dt = datetime.strptime(TT, "%Y-%m-%d").date()
 
-    async with aiohttp.ClientSession() as session:
+    async with shared_session() as session:
 
-        detail_semaphore = asyncio.Semaphore(DETAIL_PARALLEL_LIMIT)
         detail_cache = {}
 
+        # concurrency comes from the run-wide adaptive OYO limiter (rate_control)
         async def limited_detail_call(booking_no):
 
-            async with detail_semaphore:
-
-                if booking_no in detail_cache:
-                    return detail_cache[booking_no]
+            if booking_no in detail_cache:
+                return detail_cache[booking_no]
 
-                res = await fetch_booking_details(session, P, booking_no)
-                detail_cache[booking_no] = res
+            res = await fetch_booking_details(session, P, booking_no)
+            detail_cache[booking_no] = res
 
-                return res
+            return res
 
 
         hourly_cash = {h: {"cash":0.0} for h in range(24)}
 
         offset = 0
 
-        while True:
+        pipeline = DetailPipeline(limited_detail_call)   # detail calls start as pages arrive
+        pending_pages = []   # per listing page, processed in page order after pagination
+        pages = BookingPages(session, P, HF, HT)   # next pages fetched ahead
+
+        try:
+            while True:
+
+                data = await pages.get(offset)
 
-            data = await fetch_bookings_batch(session, offset, HF, HT, P)
+                if not data or not data.get("bookingIds"):
+                    break
 
-            if not data or not data.get("bookingIds"):
-                break
+                bookings = data.get("entities", {}).get("bookings", {})
+                if not bookings:
+                    break
 
-            bookings = data.get("entities", {}).get("bookings", {})
-            if not bookings:
-                break
+                tasks = []
 
-            tasks = []
+                for b in bookings.values():
 
-            for b in bookings.values():
+                    status = (b.get("status") or "").strip()
 
-                status = (b.get("status") or "").strip()
+                    if status not in ["Checked In", "Checked Out"]:
+                        continue
 
-                if status not in ["Checked In", "Checked Out"]:
-                    continue
+                    booking_no = b.get("booking_no")
 
-                booking_no = b.get("booking_no")
+                    if not booking_no:
+                        continue
 
-                if not booking_no:
-                    continue
+                    tasks.append(await pipeline.submit(booking_no))
 
-                tasks.append(limited_detail_call(booking_no))
+                pending_pages.append(tasks)
 
-            results = await asyncio.gather(*tasks, return_exceptions=True)
+                if len(data.get("bookingIds", [])) < 100:
+                    break
 
-            for res in results:
+                offset += 100
 
-                if isinstance(res, Exception):
-                    continue
+            # ================= DETAIL RESULTS (STARTED DURING PAGINATION) =================
+            for tasks in pending_pages:
+                results = await asyncio.gather(*tasks, return_exceptions=True)
 
-                for ev in res or []:
+                for res in results:
 
-                    try:
-                        d_dt = datetime.strptime(ev["date"], "%Y-%m-%d").date()
-                    except Exception:
+                    if isinstance(res, Exception):
                         continue
 
-                    if not (tf_dt <= d_dt <= tt_dt):
-                        continue
+                    for ev in res or []:
+
+                        try:
+                            d_dt = datetime.strptime(ev["date"], "%Y-%m-%d").date()
+                        except Exception:
+                            continue
 
-                    h = ev["hour"]
-                    amt = float(ev["amt"])
+                        if not (tf_dt <= d_dt <= tt_dt):
+                            continue
 
-                    hourly_cash[h]["cash"] += amt
+                        h = ev["hour"]
+                        amt = float(ev["amt"])
 
-            if len(data.get("bookingIds", [])) < 100:
-                break
+                        hourly_cash[h]["cash"] += amt
 
-            offset += 100
+            pipeline.record(label=P["name"])
+        finally:
+            # a page that raised (e.g. BOOKING ENTITY EMPTY) → nothing left running
+            pipeline.close()
+            pages.cancel()
 
         return (P["name"], hourly_cash)
 
@@ -332,11 +259,6 @@ async def run_property_with_retry(P, TF, TT, HF, HT, retries=5):
     raise RuntimeError(f"PROPERTY FAILED → {P['name']}") from last_error
 
 
-async def run_property_limited(P, TF, TT, HF, HT):
-
-    async with prop_semaphore:
-        return await run_property_with_retry(P, TF, TT, HF, HT)
-
 
 # ================= MAIN =================
 
@@ -367,7 +289,7 @@ async def main():
         if not pending:
             break
 
-        tasks = [run_property_limited(P, TF, TT, HF, HT) for P in pending.values()]
+        tasks = [run_property_with_retry(P, TF, TT, HF, HT) for P in pending.values()]
         results = await asyncio.gather(*tasks, return_exceptions=True)
 
         new_pending = {}
@@ -597,15 +519,9 @@ async def main():
 
     # ================= SAVE =================
 
-    buffer = BytesIO()
-    wb.save(buffer)
-    buffer.seek(0)
-
-    await send_telegram_excel_buffer(
-        buffer,
-        filename=f"Cash_Daily.xlsx",
-        caption="📊 Hourly Cash Report"
-    )
+    with ReportSink(f"Cash_Daily.xlsx") as sink:
+        sink.write(wb)
+        await sink.send(send_telegram_excel_buffer, caption="📊 Hourly Cash Report")
 
     print("✅ EXCEL SENT SUCCESSFULLY")
 
@@ -615,7 +531,7 @@ async def main():
 if __name__ == "__main__":
 
     try:
-        asyncio.run(main())
+        run(main())
 
     except Exception:
 
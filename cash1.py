@@ -12,8 +12,10 @@ import traceback
 from openpyxl import Workbook
 from openpyxl.styles import PatternFill, Font, Alignment
 from openpyxl.chart import BarChart, Reference
-from io import BytesIO
+from report_sink import ReportSink
 import pytz
+from detail_resolver import DetailPipeline
+from oyo_client import shared_session, run, BookingPages, fetch_booking_details_raw
 
 IST = pytz.timezone("Asia/Kolkata")
 now = datetime.now(IST)
@@ -21,13 +23,6 @@ now = datetime.now(IST)
 MAX_FULL_RUN_RETRIES = 5
 FULL_RUN_RETRY_DELAY = 10
 
-PROP_PARALLEL_LIMIT = 3
-DETAIL_PARALLEL_LIMIT = 10
-
-prop_semaphore = asyncio.Semaphore(PROP_PARALLEL_LIMIT)
-
-DETAIL_TIMEOUT = 25
-BATCH_TIMEOUT = 35
 
 
 # ================= TELEGRAM =================
@@ -61,7 +56,7 @@ async def send_telegram_excel_buffer(buffer, filename, caption=None):
         content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
     )
 
-    async with aiohttp.ClientSession() as session:
+    async with shared_session() as session:
         async with session.post(url, data=data, timeout=120) as resp:
             if resp.status != 200:
                 text = await resp.text()
@@ -100,123 +95,43 @@ def get_hour_color(hour):
 # ================= FETCH DETAILS =================
 
 async def fetch_booking_details(session, P, booking_no):
+    data = await fetch_booking_details_raw(session, P, booking_no)
 
-    url = "https://www.oyoos.com/hms_ms/api/v1/visibility/booking_details_with_entities"
-
-    params = {
-        "qid": P["QID"],
-        "booking_id": booking_no,
-        "role": 0,
-        "platform": "OYOOS",
-        "country_code": 1
-    }
-
-    cookies = {"uif": P["UIF"], "uuid": P["UUID"]}
-
-    headers = {
-        "accept": "application/json",
-        "content-type": "application/json",
-        "x-qid": str(P["QID"]),
-        "x-source-client": "merchant"
-    }
-
-    for attempt in range(1, 4):
-        try:
-            async with session.get(
-                url,
-                params=params,
-                headers=headers,
-                cookies=cookies,
-                timeout=DETAIL_TIMEOUT
-            ) as r:
-
-                if r.status != 200:
-                    raise RuntimeError("DETAIL API FAILED")
-
-                data = await r.json()
-
-                booking = next(
-                    iter(data.get("entities", {}).get("bookings", {}).values()),
-                    {}
-                )
-
-                payments = booking.get("payments", [])
-
-                events = []
-
-                for p in payments:
-
-                    amt = float(p.get("amount", 0) or 0)
-                    if amt <= 0:
-                        continue
+    booking = next(
+        iter(data.get("entities", {}).get("bookings", {}).values()),
+        {}
+    )
 
-                    created_at = str(p.get("created_at") or "").strip()
-                    if not created_at:
-                        continue
+    payments = booking.get("payments", [])
 
-                    try:
-                        dt = datetime.fromisoformat(created_at.replace("Z", ""))
-                        dt = dt.astimezone(IST)
-                    except Exception:
-                        continue
+    events = []
 
-                    bucket = "cash" if p.get("mode") == "Cash at Hotel" else "other"
+    for p in payments:
 
-                    events.append({
-                        "date": dt.strftime("%Y-%m-%d"),
-                        "hour": dt.hour,
-                        "mode": bucket,
-                        "amt": amt
-                    })
+        amt = float(p.get("amount", 0) or 0)
+        if amt <= 0:
+            continue
 
-                return events
+        created_at = str(p.get("created_at") or "").strip()
+        if not created_at:
+            continue
 
+        try:
+            dt = datetime.fromisoformat(created_at.replace("Z", ""))
+            dt = dt.astimezone(IST)
         except Exception:
-            await asyncio.sleep(2 + attempt)
+            continue
 
-    raise RuntimeError("DETAIL FETCH FAILED")
+        bucket = "cash" if p.get("mode") == "Cash at Hotel" else "other"
 
+        events.append({
+            "date": dt.strftime("%Y-%m-%d"),
+            "hour": dt.hour,
+            "mode": bucket,
+            "amt": amt
+        })
 
-# ================= BATCH FETCH =================
-
-async def fetch_bookings_batch(session, offset, f, t, P):
-
-    url = "https://www.oyoos.com/hms_ms/api/v1/get_booking_with_ids"
-
-    params = {
-        "qid": P["QID"],
-        "checkin_from": f,
-        "checkin_till": t,
-        "batch_count": 100,
-        "batch_offset": offset,
-        "visibility_required": "true",
-        "additionalParams": "payment_hold_transaction,guest,stay_details",
-        "decimal_price": "true",
-        "ascending": "true",
-        "sort_on": "checkin_date"
-    }
-
-    cookies = {"uif": P["UIF"], "uuid": P["UUID"]}
-
-    headers = {
-        "accept": "application/json",
-        "content-type": "application/json",
-        "x-qid": str(P["QID"]),
-        "x-source-client": "merchant"
-    }
-
-    async with session.get(
-        url,
-        params=params,
-        cookies=cookies,
-        headers=headers,
-        timeout=BATCH_TIMEOUT
-    ) as r:
-
-        if r.status != 200:
-            raise RuntimeError("BATCH API FAILED")
-
-        return await r.json()
+    return events
 
 
 # ================= PROCESS PROPERTY =================
@@ -228,74 +143,88 @@ async def process_property(P, TF, TT, HF, HT):
     tf_dt = datetime.strptime(TF, "%Y-%m-%d").date()
     tt_dt = datetime.strptime(TT, "%Y-%m-%d").date()
 
-    async with aiohttp.ClientSession() as session:
+    async with shared_session() as session:
 
-        detail_semaphore = asyncio.Semaphore(DETAIL_PARALLEL_LIMIT)
         detail_cache = {}
 
+        # concurrency comes from the run-wide adaptive OYO limiter (rate_control)
         async def limited_detail_call(booking_no):
-            async with detail_semaphore:
-                if booking_no in detail_cache:
-                    return detail_cache[booking_no]
-                res = await fetch_booking_details(session, P, booking_no)
-                detail_cache[booking_no] = res
-                return res
+            if booking_no in detail_cache:
+                return detail_cache[booking_no]
+            res = await fetch_booking_details(session, P, booking_no)
+            detail_cache[booking_no] = res
+            return res
 
         hourly_cash = {h: 0.0 for h in range(24)}
 
         offset = 0
 
-        while True:
+        pipeline = DetailPipeline(limited_detail_call)   # detail calls start as pages arrive
+        pending_pages = []   # per listing page, processed in page order after pagination
+        pages = BookingPages(session, P, HF, HT)   # next pages fetched ahead
 
-            data = await fetch_bookings_batch(session, offset, HF, HT, P)
+        try:
+            while True:
 
-            if not data or not data.get("bookingIds"):
-                break
+                data = await pages.get(offset)
 
-            bookings = data.get("entities", {}).get("bookings", {})
-            if not bookings:
-                break
+                if not data or not data.get("bookingIds"):
+                    break
 
-            tasks = []
-            mapping = []
+                bookings = data.get("entities", {}).get("bookings", {})
+                if not bookings:
+                    break
 
-            for b in bookings.values():
+                tasks = []
+                mapping = []
 
-                status = (b.get("status") or "").strip()
-                if status not in ["Checked In", "Checked Out"]:
-                    continue
+                for b in bookings.values():
 
-                booking_no = b.get("booking_no")
-                if not booking_no:
-                    continue
+                    status = (b.get("status") or "").strip()
+                    if status not in ["Checked In", "Checked Out"]:
+                        continue
 
-                tasks.append(limited_detail_call(booking_no))
-                mapping.append(b)
+                    booking_no = b.get("booking_no")
+                    if not booking_no:
+                        continue
 
-            results = await asyncio.gather(*tasks, return_exceptions=True)
+                    tasks.append(await pipeline.submit(booking_no))
+                    mapping.append(b)
 
-            for res in results:
+                pending_pages.append((tasks, mapping))
 
-                if isinstance(res, Exception):
-                    continue
+                if len(data.get("bookingIds", [])) < 100:
+                    break
 
-                for ev in res or []:
+                offset += 100
 
-                    try:
-                        d_dt = datetime.strptime(ev["date"], "%Y-%m-%d").date()
-                    except Exception:
-                        continue
+            # ================= DETAIL RESULTS (STARTED DURING PAGINATION) =================
+            for tasks, mapping in pending_pages:
+                results = await asyncio.gather(*tasks, return_exceptions=True)
+
+                for res in results:
 
-                    if not (tf_dt <= d_dt <= tt_dt):
+                    if isinstance(res, Exception):
                         continue
 
-                    if ev["mode"] == "cash":
-                        hourly_cash[ev["hour"]] += float(ev["amt"])
+                    for ev in res or []:
+
+                        try:
+                            d_dt = datetime.strptime(ev["date"], "%Y-%m-%d").date()
+                        except Exception:
+                            continue
+
+                        if not (tf_dt <= d_dt <= tt_dt):
+                            continue
 
-            if len(data.get("bookingIds", [])) < 100:
-                break
+                        if ev["mode"] == "cash":
+                            hourly_cash[ev["hour"]] += float(ev["amt"])
 
-            offset += 100
+            pipeline.record(label=P["name"])
+        finally:
+            # a page that raised (e.g. BOOKING ENTITY EMPTY) → nothing left running
+            pipeline.close()
+            pages.cancel()
 
         return (P["name"], hourly_cash)
 
@@ -317,10 +246,6 @@ async def run_property_with_retry(P, TF, TT, HF, HT, retries=3):
     raise RuntimeError(f"PROPERTY FAILED → {P['name']}") from last_error
 
 
-async def run_property_limited(P, TF, TT, HF, HT):
-    async with prop_semaphore:
-        return await run_property_with_retry(P, TF, TT, HF, HT)
-
 
 # ================= MAIN =================
 
@@ -355,7 +280,7 @@ async def main():
         if not pending:
             break
 
-        tasks = [run_property_limited(P, TF, TT, HF, HT) for P in pending.values()]
+        tasks = [run_property_with_retry(P, TF, TT, HF, HT) for P in pending.values()]
         results = await asyncio.gather(*tasks, return_exceptions=True)
 
         new_pending = {}
@@ -503,15 +428,9 @@ async def main():
     create_sheet(ws, consolidated)
 
     # ================= SAVE + SEND =================
-    buffer = BytesIO()
-    wb.save(buffer)
-    buffer.seek(0)
-
-    await send_telegram_excel_buffer(
-        buffer,
-        filename=f"Cash_Collection_{display_date}.xlsx",
-        caption="📊 Hourly Cash Report"
-    )
+    with ReportSink(f"Cash_Collection_{display_date}.xlsx") as sink:
+        sink.write(wb)
+        await sink.send(send_telegram_excel_buffer, caption="📊 Hourly Cash Report")
 
     print("✅ EXCEL SENT SUCCESSFULLY")
 
@@ -520,7 +439,7 @@ async def main():
 
 if __name__ == "__main__":
     try:
-        asyncio.run(main())
+        run(main())
     except Exception as e:
         print("SCRIPT CRASHED")
         traceback.print_exc()
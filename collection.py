@@ -8,25 +8,25 @@
 import os
 import json
 import asyncio
-import aiohttp
 import pandas as pd
 from datetime import datetime, timedelta
 import traceback
 import pytz
+from detail_resolver import DetailPipeline
+from telegram_outbox import OUTBOX, TELEGRAM_STREAM
+from property_runs import stream_properties
+from oyo_client import (
+    shared_session,
+    run,
+    BookingPages,
+    fetch_booking_details_raw,
+)
 IST = pytz.timezone("Asia/Kolkata")
 now = datetime.now(IST)
 
 MAX_FULL_RUN_RETRIES = 5
 FULL_RUN_RETRY_DELAY = 10
 
-PROP_PARALLEL_LIMIT = 3
-DETAIL_PARALLEL_LIMIT = 10
-
-prop_semaphore = asyncio.Semaphore(PROP_PARALLEL_LIMIT)
-
-DETAIL_TIMEOUT = 25
-ROOMS_TIMEOUT = 25
-BATCH_TIMEOUT = 35
 
 
 
@@ -61,26 +61,11 @@ if not PROPERTIES:
 
 
 async def send_telegram_message(text, session):
-    url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
-
-    payload = {
-        "chat_id": TELEGRAM_CHAT_ID,
-        "text": text,
-        "parse_mode": "HTML"
-    }
-
-    try:
-        async with session.post(url, json=payload, timeout=30) as resp:
-            response_text = await resp.text()
-
-            if resp.status != 200:
-                print("❌ TELEGRAM ERROR:", resp.status, response_text)
-                return
-
-            print("✅ Telegram sent")
-
-    except Exception as e:
-        print("❌ TELEGRAM EXCEPTION:", e)
+    """
+    Queues text on the run's Telegram outbox → future, returns at once.
+    Failures are logged, never fatal (same as before).
+    """
+    return OUTBOX.post(TELEGRAM_CHAT_ID, text, strict=False)
 
 # ================= BOOKING SOURCE =================
 def get_booking_source(b):
@@ -110,138 +95,55 @@ def get_booking_source(b):
 
 # ================= FETCH DETAILS =================
 async def fetch_booking_details(session, P, booking_no):
-    url = "https://www.oyoos.com/hms_ms/api/v1/visibility/booking_details_with_entities"
-    params = {
-        "qid": P["QID"],
-        "booking_id": booking_no,
-        "role": 0,
-        "platform": "OYOOS",
-        "country_code": 1
-    }
-    cookies = {"uif": P["UIF"], "uuid": P["UUID"]}
-    headers = {
-        "accept": "application/json",
-        "content-type": "application/json",
-        "x-qid": str(P["QID"]),
-        "x-source-client": "merchant"
-    }
-
-    for attempt in range(1, 4):
-        try:
-            async with session.get(
-                url,
-                params=params,
-                headers=headers,
-                cookies=cookies,
-                timeout=DETAIL_TIMEOUT
-            ) as r:
-
-                if r.status != 200:
-                    raise RuntimeError("DETAIL API FAILED")
-
-                data = await r.json()
-
-                booking = next(
-                    iter(data.get("entities", {}).get("bookings", {}).values()),
-                    {}
-                )
+    data = await fetch_booking_details_raw(session, P, booking_no)
 
-                payments = booking.get("payments", [])
-                payment_events = []
+    booking = next(
+        iter(data.get("entities", {}).get("bookings", {}).values()),
+        {}
+    )
 
-                for p in payments:
+    payments = booking.get("payments", [])
+    payment_events = []
 
-                    mode = p.get("mode", "")
-                    amt = float(p.get("amount", 0) or 0)
+    for p in payments:
 
-                    # 🔥 Skip zero payments
-                    if amt <= 0:
-                        continue
+        mode = p.get("mode", "")
+        amt = float(p.get("amount", 0) or 0)
 
-                    created_at = str(p.get("created_at") or "").strip()
-                    if not created_at:
-                        continue
+        # 🔥 Skip zero payments
+        if amt <= 0:
+            continue
 
-                    try:
-                        dt = datetime.fromisoformat(created_at.replace("Z", ""))
-                        dt = dt.astimezone(IST)
-                    except Exception:
-                        continue
+        created_at = str(p.get("created_at") or "").strip()
+        if not created_at:
+            continue
 
-                    pay_date = dt.strftime("%Y-%m-%d")
+        try:
+            dt = datetime.fromisoformat(created_at.replace("Z", ""))
+            dt = dt.astimezone(IST)
+        except Exception:
+            continue
 
-                    # ================= CLASSIFICATION =================
-                    if mode == "Cash at Hotel":
-                        bucket = "cash"
-                    elif mode == "UPI QR":
-                        bucket = "qr"
-                    elif mode == "oyo_wizard_discount":
-                        bucket = "discount"
-                    else:
-                        bucket = "online"
+        pay_date = dt.strftime("%Y-%m-%d")
 
-                    payment_events.append({
-                        "date": pay_date,
-                        "mode": bucket,
-                        "amt": amt
-                    })
+        # ================= CLASSIFICATION =================
+        if mode == "Cash at Hotel":
+            bucket = "cash"
+        elif mode == "UPI QR":
+            bucket = "qr"
+        elif mode == "oyo_wizard_discount":
+            bucket = "discount"
+        else:
+            bucket = "online"
 
-                return payment_events
+        payment_events.append({
+            "date": pay_date,
+            "mode": bucket,
+            "amt": amt
+        })
 
-        except Exception:
-            await asyncio.sleep(2 + attempt)
-
-    raise RuntimeError("DETAIL FETCH FAILED")
-# ================= BATCH FETCH =================
-async def fetch_bookings_batch(session, offset, f, t, P):
-    url = "https://www.oyoos.com/hms_ms/api/v1/get_booking_with_ids"
-    params = {
-        "qid": P["QID"],
-        "checkin_from": f,
-        "checkin_till": t,
-        "batch_count": 100,
-        "batch_offset": offset,
-        "visibility_required": "true",
-        "additionalParams": "payment_hold_transaction,guest,stay_details",
-        "decimal_price": "true",
-        "ascending": "true",
-        "sort_on": "checkin_date"
-    }
-    cookies = {"uif": P["UIF"], "uuid": P["UUID"]}
-    headers = {
-        "accept": "application/json",
-        "content-type": "application/json",
-        "x-qid": str(P["QID"]),
-        "x-source-client": "merchant"
-    }
-
-    async with session.get(url, params=params, cookies=cookies, headers=headers, timeout=BATCH_TIMEOUT) as r:
-        if r.status != 200:
-            raise RuntimeError("BATCH API FAILED")
-        return await r.json()
-
-
-
-
-# ================= FETCH TOTAL ROOMS =================
-async def fetch_total_rooms(session, P):
-    url = "https://www.oyoos.com/hms_ms/api/v1/hotels/roomsNew"
-    params = {"qid": P["QID"]}
-    cookies = {"uif": P["UIF"], "uuid": P["UUID"]}
-    headers = {"accept": "application/json", "x-qid": str(P["QID"]), "x-source-client": "merchant"}
-
-    for attempt in range(1, 4):
-        try:
-            async with session.get(url, params=params, cookies=cookies, headers=headers, timeout=ROOMS_TIMEOUT) as r:
-                if r.status != 200:
-                    raise RuntimeError("ROOM API FAILED")
-                data = await r.json()
-                rooms = data.get("rooms", {})
-                return len(rooms)
-        except Exception:
-            await asyncio.sleep(2 + attempt)
+    return payment_events
 
-    return 0
 
 # ================= PROCESS PROPERTY =================
 async def process_property(P, TF, TT, HF, HT):
@@ -250,94 +152,108 @@ async def process_property(P, TF, TT, HF, HT):
     tf_dt = datetime.strptime(TF, "%Y-%m-%d").date()
     tt_dt = datetime.strptime(TT, "%Y-%m-%d").date()
 
-    async with aiohttp.ClientSession() as session:
+    async with shared_session() as session:
 
-        detail_semaphore = asyncio.Semaphore(DETAIL_PARALLEL_LIMIT)
         detail_cache = {}
 
+        # concurrency comes from the run-wide adaptive OYO limiter (rate_control)
         async def limited_detail_call(booking_no):
-            async with detail_semaphore:
-                if booking_no in detail_cache:
-                    return detail_cache[booking_no]
-                res = await fetch_booking_details(session, P, booking_no)
-                detail_cache[booking_no] = res
-                return res
+            if booking_no in detail_cache:
+                return detail_cache[booking_no]
+            res = await fetch_booking_details(session, P, booking_no)
+            detail_cache[booking_no] = res
+            return res
 
         booking_date_mode_map = {}
 
         offset = 0
-        while True:
-            data = await fetch_bookings_batch(session, offset, HF, HT, P)
-            if not data or not data.get("bookingIds"):
-                break
+        pipeline = DetailPipeline(limited_detail_call)   # detail calls start as pages arrive
+        pending_pages = []   # per listing page, processed in page order after pagination
+        pages = BookingPages(session, P, HF, HT)   # next pages fetched ahead
 
-            bookings = data.get("entities", {}).get("bookings", {})
-            if not bookings:
-                break
+        try:
+            while True:
+                data = await pages.get(offset)
+                if not data or not data.get("bookingIds"):
+                    break
 
-            tasks = []
-            mapping = []
+                bookings = data.get("entities", {}).get("bookings", {})
+                if not bookings:
+                    break
 
-            for b in bookings.values():
-                status = (b.get("status") or "").strip()
-                if status not in ["Checked In", "Checked Out"]:
-                    continue
+                tasks = []
+                mapping = []
 
-                booking_no = b.get("booking_no")
-                if not booking_no:
-                    continue
+                for b in bookings.values():
+                    status = (b.get("status") or "").strip()
+                    if status not in ["Checked In", "Checked Out"]:
+                        continue
 
-                tasks.append(limited_detail_call(booking_no))
-                mapping.append(b)
+                    booking_no = b.get("booking_no")
+                    if not booking_no:
+                        continue
 
-            results = await asyncio.gather(*tasks, return_exceptions=True)
+                    tasks.append(await pipeline.submit(booking_no))
+                    mapping.append(b)
 
-            for res, b in zip(results, mapping):
-                if isinstance(res, Exception):
-                    continue
+                pending_pages.append((tasks, mapping))
 
-                payment_events = res or []
-                booking_no = b.get("booking_no")
-                source = get_booking_source(b)
+                if len(data.get("bookingIds", [])) < 100:
+                    break
+                offset += 100
 
-                for ev in payment_events:
-                    d = ev.get("date")
-                    if not d:
-                        continue
+            # ================= DETAIL RESULTS (STARTED DURING PAGINATION) =================
+            for tasks, mapping in pending_pages:
+                results = await asyncio.gather(*tasks, return_exceptions=True)
 
-                    try:
-                        d_dt = datetime.strptime(d, "%Y-%m-%d").date()
-                    except Exception:
+                for res, b in zip(results, mapping):
+                    if isinstance(res, Exception):
                         continue
 
-                    if not (tf_dt <= d_dt <= tt_dt):
-                        continue
-
-                    if (d, booking_no) not in booking_date_mode_map:
-                        booking_date_mode_map[(d, booking_no)] = {
-                            "cash": 0.0,
-                            "qr": 0.0,
-                            "online": 0.0,
-                            "discount": 0.0,
-                            "b": b,
-                            "source": source
-                        }
-
-                    mode = ev.get("mode")
-                    amt = float(ev.get("amt", 0) or 0)
-
-                    if mode == "cash":
-                        booking_date_mode_map[(d, booking_no)]["cash"] += amt
-                    elif mode == "qr":
-                        booking_date_mode_map[(d, booking_no)]["qr"] += amt
-                    elif mode == "discount":
-                        booking_date_mode_map[(d, booking_no)]["discount"] += amt
-                    else:
-                        booking_date_mode_map[(d, booking_no)]["online"] += amt
-
-            if len(data.get("bookingIds", [])) < 100:
-                break
-            offset += 100
+                    payment_events = res or []
+                    booking_no = b.get("booking_no")
+                    source = get_booking_source(b)
+
+                    for ev in payment_events:
+                        d = ev.get("date")
+                        if not d:
+                            continue
+
+                        try:
+                            d_dt = datetime.strptime(d, "%Y-%m-%d").date()
+                        except Exception:
+                            continue
+
+                        if not (tf_dt <= d_dt <= tt_dt):
+                            continue
+
+                        if (d, booking_no) not in booking_date_mode_map:
+                            booking_date_mode_map[(d, booking_no)] = {
+                                "cash": 0.0,
+                                "qr": 0.0,
+                                "online": 0.0,
+                                "discount": 0.0,
+                                "b": b,
+                                "source": source
+                            }
+
+                        mode = ev.get("mode")
+                        amt = float(ev.get("amt", 0) or 0)
+
+                        if mode == "cash":
+                            booking_date_mode_map[(d, booking_no)]["cash"] += amt
+                        elif mode == "qr":
+                            booking_date_mode_map[(d, booking_no)]["qr"] += amt
+                        elif mode == "discount":
+                            booking_date_mode_map[(d, booking_no)]["discount"] += amt
+                        else:
+                            booking_date_mode_map[(d, booking_no)]["online"] += amt
+
+            pipeline.record(label=P["name"])
+        finally:
+            # a page that raised (e.g. BOOKING ENTITY EMPTY) → nothing left running
+            pipeline.close()
+            pages.cancel()
 
         # ================= BUILD DATAFRAME =================
         all_rows = []
@@ -392,10 +308,6 @@ async def run_property_with_retry(P, TF, TT, HF, HT, retries=3):
             await asyncio.sleep(2 + attempt * 2)
     raise RuntimeError(f"PROPERTY FAILED → {P['name']}") from last_error
 
-async def run_property_limited(P, TF, TT, HF, HT):
-    async with prop_semaphore:
-        return await run_property_with_retry(P, TF, TT, HF, HT)
-
 
 
 def build_daily_collection_message(
@@ -425,6 +337,41 @@ DAILY COLLECTION REPORT : {prop}
 
 </pre>
 """.strip()
+
+
+# ================= PER-PROPERTY TELEGRAM =================
+async def send_property_report(result, TT, tg_session):
+    """
+    daily collection message of one property → outbox
+    returns (cash, qr, online, discount, guests) for the consolidated report
+    """
+    name, df = result
+
+    total_guests = df["Booking Id"].nunique() if not df.empty else 0
+
+    cash = round(df["Cash"].sum(), 2) if not df.empty else 0
+    qr = round(df["QR"].sum(), 2) if not df.empty else 0
+    online = round(df["Online"].sum(), 2) if not df.empty else 0
+    discount = round(df["Discount"].sum(), 2) if not df.empty else 0
+
+    total_amount = cash + qr + online + discount
+
+    msg = build_daily_collection_message(
+        prop=name,
+        report_date=datetime.strptime(TT, "%Y-%m-%d").strftime("%d/%m/%Y"),
+        total_guests=total_guests,
+        total_amount=total_amount,
+        cash=cash,
+        qr=qr,
+        online=online,
+        discount=discount
+    )
+
+    await send_telegram_message(msg, tg_session)
+
+    return cash, qr, online, discount, total_guests
+
+
 # ================= MAIN =================
 async def main():
     print("========================================")
@@ -445,44 +392,39 @@ async def main():
 
     print("BUSINESS DATE :", TF)
 
-    pending = {k: v for k, v in PROPERTIES.items()}
-    success_results = {}
-
     # ================= RETRY ENGINE =================
-    for run_attempt in range(1, MAX_FULL_RUN_RETRIES + 1):
-        if not pending:
-            break
-
-        print(f"\n🔁 PARTIAL RUN {run_attempt}/{MAX_FULL_RUN_RETRIES}")
-        tasks = [run_property_limited(P, TF, TT, HF, HT) for P in pending.values()]
-        results = await asyncio.gather(*tasks, return_exceptions=True)
-
-        new_pending = {}
-        for key, (P, result) in zip(list(pending.keys()), zip(pending.values(), results)):
-            if isinstance(result, Exception):
-                print(f"❌ FAILED → {P['name']} :: {result}")
-                new_pending[key] = P
-                continue
-
-            success_results[key] = result
-            print(f"✅ OK → {P['name']}")
+    # a property's message is posted the moment it succeeds (TELEGRAM_STREAM),
+    # the consolidated report only once every property is in
+    success_results = {}
+    totals = {}
 
-        pending = new_pending
+    async with shared_session() as tg_session:
 
-        if pending:
-            if run_attempt == MAX_FULL_RUN_RETRIES:
-                raise RuntimeError(
-                    f"FINAL FAILURE: {[p['name'] for p in pending.values()]}"
-                )
-            await asyncio.sleep(FULL_RUN_RETRY_DELAY)
+        try:
+            async for key, result in stream_properties(
+                PROPERTIES,
+                lambda P: run_property_with_retry(P, TF, TT, HF, HT),
+                retries=MAX_FULL_RUN_RETRIES,
+                delay=FULL_RUN_RETRY_DELAY,
+            ):
+                success_results[key] = result
+
+                if TELEGRAM_STREAM:
+                    totals[key] = await send_property_report(result, TT, tg_session)
+        except Exception:
+            # FINAL FAILURE → messages already posted still reach the chat
+            await OUTBOX.drain()
+            raise
 
-    valid_results = [success_results[k] for k in PROPERTIES.keys() if k in success_results]
+        valid_results = [success_results[k] for k in PROPERTIES.keys() if k in success_results]
 
-    if len(valid_results) != len(PROPERTIES):
-        raise RuntimeError("DATA INCOMPLETE")
+        if len(valid_results) != len(PROPERTIES):
+            raise RuntimeError("DATA INCOMPLETE")
 
-    # ================= TELEGRAM SEND =================
-    async with aiohttp.ClientSession() as tg_session:
+        # ================= TELEGRAM SEND =================
+        if not TELEGRAM_STREAM:
+            for key in PROPERTIES.keys():
+                totals[key] = await send_property_report(success_results[key], TT, tg_session)
 
         consolidated_cash = 0
         consolidated_qr = 0
@@ -490,30 +432,9 @@ async def main():
         consolidated_discount = 0
         consolidated_guests = 0
 
-        for name, df in valid_results:
-
-            total_guests = df["Booking Id"].nunique() if not df.empty else 0
-
-            cash = round(df["Cash"].sum(), 2) if not df.empty else 0
-            qr = round(df["QR"].sum(), 2) if not df.empty else 0
-            online = round(df["Online"].sum(), 2) if not df.empty else 0
-            discount = round(df["Discount"].sum(), 2) if not df.empty else 0
-
-            total_amount = cash + qr + online + discount
-
-            msg = build_daily_collection_message(
-                prop=name,
-                report_date=datetime.strptime(TT, "%Y-%m-%d").strftime("%d/%m/%Y"),
-                total_guests=total_guests,
-                total_amount=total_amount,
-                cash=cash,
-                qr=qr,
-                online=online,
-                discount=discount
-            )
-
-            await send_telegram_message(msg, tg_session)
-            await asyncio.sleep(1.2)
+        # PROPERTIES order → same sums whatever order the properties finished in
+        for key in PROPERTIES.keys():
+            cash, qr, online, discount, total_guests = totals[key]
 
             consolidated_cash += cash
             consolidated_qr += qr
@@ -541,12 +462,13 @@ async def main():
         )
 
         await send_telegram_message(consolidated_msg, tg_session)
+        await OUTBOX.flush()
 
     print("✅ ALL PROPERTY REPORTS SENT")
 # ================= RUN =================
 if __name__ == "__main__":
     try:
-        asyncio.run(main())
+        run(main())
     except Exception as e:
         print("SCRIPT CRASHED")
         print(e)
@@ -8,25 +8,23 @@
 import os
 import json
 import asyncio
-import aiohttp
 import pandas as pd
 from datetime import datetime, timedelta
 import traceback
 import pytz
+from detail_resolver import DetailPipeline
+from oyo_client import (
+    shared_session,
+    run,
+    BookingPages,
+    fetch_booking_details_raw,
+)
 IST = pytz.timezone("Asia/Kolkata")
 now = datetime.now(IST)
 
 MAX_FULL_RUN_RETRIES = 5
 FULL_RUN_RETRY_DELAY = 10
 
-PROP_PARALLEL_LIMIT = 3
-DETAIL_PARALLEL_LIMIT = 10
-
-prop_semaphore = asyncio.Semaphore(PROP_PARALLEL_LIMIT)
-
-DETAIL_TIMEOUT = 25
-ROOMS_TIMEOUT = 25
-BATCH_TIMEOUT = 35
 
 
 
@@ -110,138 +108,55 @@ def get_booking_source(b):
 
 # ================= FETCH DETAILS =================
 async def fetch_booking_details(session, P, booking_no):
-    url = "https://www.oyoos.com/hms_ms/api/v1/visibility/booking_details_with_entities"
-    params = {
-        "qid": P["QID"],
-        "booking_id": booking_no,
-        "role": 0,
-        "platform": "OYOOS",
-        "country_code": 1
-    }
-    cookies = {"uif": P["UIF"], "uuid": P["UUID"]}
-    headers = {
-        "accept": "application/json",
-        "content-type": "application/json",
-        "x-qid": str(P["QID"]),
-        "x-source-client": "merchant"
-    }
-
-    for attempt in range(1, 4):
-        try:
-            async with session.get(
-                url,
-                params=params,
-                headers=headers,
-                cookies=cookies,
-                timeout=DETAIL_TIMEOUT
-            ) as r:
-
-                if r.status != 200:
-                    raise RuntimeError("DETAIL API FAILED")
-
-                data = await r.json()
-
-                booking = next(
-                    iter(data.get("entities", {}).get("bookings", {}).values()),
-                    {}
-                )
+    data = await fetch_booking_details_raw(session, P, booking_no)
 
-                payments = booking.get("payments", [])
-                payment_events = []
+    booking = next(
+        iter(data.get("entities", {}).get("bookings", {}).values()),
+        {}
+    )
 
-                for p in payments:
-
-                    mode = p.get("mode", "")
-                    amt = float(p.get("amount", 0) or 0)
-
-                    # 🔥 Skip zero payments
-                    if amt <= 0:
-                        continue
-
-                    created_at = str(p.get("created_at") or "").strip()
-                    if not created_at:
-                        continue
-
-                    try:
-                        dt = datetime.fromisoformat(created_at.replace("Z", ""))
-                        dt = dt.astimezone(IST)
-                    except Exception:
-                        continue
+    payments = booking.get("payments", [])
+    payment_events = []
 
-                    pay_date = dt.strftime("%Y-%m-%d")
+    for p in payments:
 
-                    # ================= CLASSIFICATION =================
-                    if mode == "Cash at Hotel":
-                        bucket = "cash"
-                    elif mode == "UPI QR":
-                        bucket = "qr"
-                    elif mode == "oyo_wizard_discount":
-                        bucket = "discount"
-                    else:
-                        bucket = "online"
+        mode = p.get("mode", "")
+        amt = float(p.get("amount", 0) or 0)
 
-                    payment_events.append({
-                        "date": pay_date,
-                        "mode": bucket,
-                        "amt": amt
-                    })
+        # 🔥 Skip zero payments
+        if amt <= 0:
+            continue
 
-                return payment_events
+        created_at = str(p.get("created_at") or "").strip()
+        if not created_at:
+            continue
 
+        try:
+            dt = datetime.fromisoformat(created_at.replace("Z", ""))
+            dt = dt.astimezone(IST)
         except Exception:
-            await asyncio.sleep(2 + attempt)
-
-    raise RuntimeError("DETAIL FETCH FAILED")
-# ================= BATCH FETCH =================
-async def fetch_bookings_batch(session, offset, f, t, P):
-    url = "https://www.oyoos.com/hms_ms/api/v1/get_booking_with_ids"
-    params = {
-        "qid": P["QID"],
-        "checkin_from": f,
-        "checkin_till": t,
-        "batch_count": 100,
-        "batch_offset": offset,
-        "visibility_required": "true",
-        "additionalParams": "payment_hold_transaction,guest,stay_details",
-        "decimal_price": "true",
-        "ascending": "true",
-        "sort_on": "checkin_date"
-    }
-    cookies = {"uif": P["UIF"], "uuid": P["UUID"]}
-    headers = {
-        "accept": "application/json",
-        "content-type": "application/json",
-        "x-qid": str(P["QID"]),
-        "x-source-client": "merchant"
-    }
-
-    async with session.get(url, params=params, cookies=cookies, headers=headers, timeout=BATCH_TIMEOUT) as r:
-        if r.status != 200:
-            raise RuntimeError("BATCH API FAILED")
-        return await r.json()
+            continue
 
+        pay_date = dt.strftime("%Y-%m-%d")
 
+        # ================= CLASSIFICATION =================
+        if mode == "Cash at Hotel":
+            bucket = "cash"
+        elif mode == "UPI QR":
+            bucket = "qr"
+        elif mode == "oyo_wizard_discount":
+            bucket = "discount"
+        else:
+            bucket = "online"
 
+        payment_events.append({
+            "date": pay_date,
+            "mode": bucket,
+            "amt": amt
+        })
 
-# ================= FETCH TOTAL ROOMS =================
-async def fetch_total_rooms(session, P):
-    url = "https://www.oyoos.com/hms_ms/api/v1/hotels/roomsNew"
-    params = {"qid": P["QID"]}
-    cookies = {"uif": P["UIF"], "uuid": P["UUID"]}
-    headers = {"accept": "application/json", "x-qid": str(P["QID"]), "x-source-client": "merchant"}
-
-    for attempt in range(1, 4):
-        try:
-            async with session.get(url, params=params, cookies=cookies, headers=headers, timeout=ROOMS_TIMEOUT) as r:
-                if r.status != 200:
-                    raise RuntimeError("ROOM API FAILED")
-                data = await r.json()
-                rooms = data.get("rooms", {})
-                return len(rooms)
-        except Exception:
-            await asyncio.sleep(2 + attempt)
+    return payment_events
 
-    return 0
 
 # ================= PROCESS PROPERTY =================
 async def process_property(P, TF, TT, HF, HT):
@@ -250,94 +165,108 @@ async def process_property(P, TF, TT, HF, HT):
     tf_dt = datetime.strptime(TF, "%Y-%m-%d").date()
     tt_dt = datetime.strptime(TT, "%Y-%m-%d").date()
 
-    async with aiohttp.ClientSession() as session:
+    async with shared_session() as session:
 
-        detail_semaphore = asyncio.Semaphore(DETAIL_PARALLEL_LIMIT)
         detail_cache = {}
 
+        # concurrency comes from the run-wide adaptive OYO limiter (rate_control)
         async def limited_detail_call(booking_no):
-            async with detail_semaphore:
-                if booking_no in detail_cache:
-                    return detail_cache[booking_no]
-                res = await fetch_booking_details(session, P, booking_no)
-                detail_cache[booking_no] = res
-                return res
+            if booking_no in detail_cache:
+                return detail_cache[booking_no]
+            res = await fetch_booking_details(session, P, booking_no)
+            detail_cache[booking_no] = res
+            return res
 
         booking_date_mode_map = {}
 
         offset = 0
-        while True:
-            data = await fetch_bookings_batch(session, offset, HF, HT, P)
-            if not data or not data.get("bookingIds"):
-                break
+        pipeline = DetailPipeline(limited_detail_call)   # detail calls start as pages arrive
+        pending_pages = []   # per listing page, processed in page order after pagination
+        pages = BookingPages(session, P, HF, HT)   # next pages fetched ahead
 
-            bookings = data.get("entities", {}).get("bookings", {})
-            if not bookings:
-                break
+        try:
+            while True:
+                data = await pages.get(offset)
+                if not data or not data.get("bookingIds"):
+                    break
 
-            tasks = []
-            mapping = []
+                bookings = data.get("entities", {}).get("bookings", {})
+                if not bookings:
+                    break
 
-            for b in bookings.values():
-                status = (b.get("status") or "").strip()
-                if status not in ["Checked In", "Checked Out"]:
-                    continue
+                tasks = []
+                mapping = []
 
-                booking_no = b.get("booking_no")
-                if not booking_no:
-                    continue
+                for b in bookings.values():
+                    status = (b.get("status") or "").strip()
+                    if status not in ["Checked In", "Checked Out"]:
+                        continue
 
-                tasks.append(limited_detail_call(booking_no))
-                mapping.append(b)
+                    booking_no = b.get("booking_no")
+                    if not booking_no:
+                        continue
 
-            results = await asyncio.gather(*tasks, return_exceptions=True)
+                    tasks.append(await pipeline.submit(booking_no))
+                    mapping.append(b)
 
-            for res, b in zip(results, mapping):
-                if isinstance(res, Exception):
-                    continue
+                pending_pages.append((tasks, mapping))
 
-                payment_events = res or []
-                booking_no = b.get("booking_no")
-                source = get_booking_source(b)
+                if len(data.get("bookingIds", [])) < 100:
+                    break
+                offset += 100
 
-                for ev in payment_events:
-                    d = ev.get("date")
-                    if not d:
-                        continue
+            # ================= DETAIL RESULTS (STARTED DURING PAGINATION) =================
+            for tasks, mapping in pending_pages:
+                results = await asyncio.gather(*tasks, return_exceptions=True)
 
-                    try:
-                        d_dt = datetime.strptime(d, "%Y-%m-%d").date()
-                    except Exception:
+                for res, b in zip(results, mapping):
+                    if isinstance(res, Exception):
                         continue
 
-                    if not (tf_dt <= d_dt <= tt_dt):
-                        continue
-
-                    if (d, booking_no) not in booking_date_mode_map:
-                        booking_date_mode_map[(d, booking_no)] = {
-                            "cash": 0.0,
-                            "qr": 0.0,
-                            "online": 0.0,
-                            "discount": 0.0,
-                            "b": b,
-                            "source": source
-                        }
-
-                    mode = ev.get("mode")
-                    amt = float(ev.get("amt", 0) or 0)
-
-                    if mode == "cash":
-                        booking_date_mode_map[(d, booking_no)]["cash"] += amt
-                    elif mode == "qr":
-                        booking_date_mode_map[(d, booking_no)]["qr"] += amt
-                    elif mode == "discount":
-                        booking_date_mode_map[(d, booking_no)]["discount"] += amt
-                    else:
-                        booking_date_mode_map[(d, booking_no)]["online"] += amt
-
-            if len(data.get("bookingIds", [])) < 100:
-                break
-            offset += 100
+                    payment_events = res or []
+                    booking_no = b.get("booking_no")
+                    source = get_booking_source(b)
+
+                    for ev in payment_events:
+                        d = ev.get("date")
+                        if not d:
+                            continue
+
+                        try:
+                            d_dt = datetime.strptime(d, "%Y-%m-%d").date()
+                        except Exception:
+                            continue
+
+                        if not (tf_dt <= d_dt <= tt_dt):
+                            continue
+
+                        if (d, booking_no) not in booking_date_mode_map:
+                            booking_date_mode_map[(d, booking_no)] = {
+                                "cash": 0.0,
+                                "qr": 0.0,
+                                "online": 0.0,
+                                "discount": 0.0,
+                                "b": b,
+                                "source": source
+                            }
+
+                        mode = ev.get("mode")
+                        amt = float(ev.get("amt", 0) or 0)
+
+                        if mode == "cash":
+                            booking_date_mode_map[(d, booking_no)]["cash"] += amt
+                        elif mode == "qr":
+                            booking_date_mode_map[(d, booking_no)]["qr"] += amt
+                        elif mode == "discount":
+                            booking_date_mode_map[(d, booking_no)]["discount"] += amt
+                        else:
+                            booking_date_mode_map[(d, booking_no)]["online"] += amt
+
+            pipeline.record(label=P["name"])
+        finally:
+            # a page that raised (e.g. BOOKING ENTITY EMPTY) → nothing left running
+            pipeline.close()
+            pages.cancel()
 
         # ================= BUILD DATAFRAME =================
         all_rows = []
@@ -392,10 +321,6 @@ async def run_property_with_retry(P, TF, TT, HF, HT, retries=3):
             await asyncio.sleep(2 + attempt * 2)
     raise RuntimeError(f"PROPERTY FAILED → {P['name']}") from last_error
 
-async def run_property_limited(P, TF, TT, HF, HT):
-    async with prop_semaphore:
-        return await run_property_with_retry(P, TF, TT, HF, HT)
-
 
 
 def build_daily_collection_message(
@@ -454,7 +379,7 @@ async def main():
             break
 
         print(f"\n🔁 PARTIAL RUN {run_attempt}/{MAX_FULL_RUN_RETRIES}")
-        tasks = [run_property_limited(P, TF, TT, HF, HT) for P in pending.values()]
+        tasks = [run_property_with_retry(P, TF, TT, HF, HT) for P in pending.values()]
         results = await asyncio.gather(*tasks, return_exceptions=True)
 
         new_pending = {}
@@ -482,7 +407,7 @@ async def main():
         raise RuntimeError("DATA INCOMPLETE")
 
     # ================= TELEGRAM SEND =================
-    async with aiohttp.ClientSession() as tg_session:
+    async with shared_session() as tg_session:
 
         consolidated_cash = 0
         consolidated_qr = 0
@@ -546,7 +471,7 @@ async def main():
 # ================= RUN =================
 if __name__ == "__main__":
     try:
-        asyncio.run(main())
+        run(main())
     except Exception as e:
         print("SCRIPT CRASHED")
         print(e)
@@ -0,0 +1,194 @@
+# ==============================
+# PERSISTENT BOOKING DETAIL CACHE (SQLite)
+# KEYED BY (QID, booking_no) — SHARED ACROSS ALL SCRIPTS
+# ==============================
+#
+# Checked Out  → never expires (booking is final)
+# Checked In   → expires after CHECKED_IN_TTL, or as soon as the batch
+#                listing shows a different status / amount fingerprint
+# other status → never cached (Confirm / Cancelled keep changing)
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+
+DETAIL_CACHE_PATH = os.getenv(
+    "OYO_DETAIL_CACHE", os.path.join(".cache", "booking_details.sqlite")
+)
+CHECKED_IN_TTL = int(os.getenv("OYO_DETAIL_CACHE_TTL", "900"))  # seconds
+
+CACHEABLE_STATUSES = ("Checked In", "Checked Out")
+
+# listing fields that change whenever the detail payload can change
+FINGERPRINT_FIELDS = (
+    "status",
+    "checkin",
+    "checkout",
+    "no_of_rooms",
+    "get_amount_paid",
+    "final_amount",
+    "payable_amount",
+)
+
+_conn = None
+
+# (qid, booking_no) → (status, fingerprint) from this run's batch listings
+_listing = {}
+
+
+# ================= CACHE COUNTER =================
+class CacheStats:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.stored = 0
+
+    def lookups(self):
+        return self.hits + self.misses + self.stale
+
+    def summary(self):
+        return (
+            f"🗄️ DETAIL CACHE → hits={self.hits} misses={self.misses} "
+            f"stale={self.stale} stored={self.stored}"
+        )
+
+
+CACHE_STATS = CacheStats()
+
+
+def enabled():
+    return DETAIL_CACHE_PATH.lower() not in ("", "0", "off", "none")
+
+
+# ================= DB =================
+def _db():
+    global _conn
+
+    if _conn is None:
+        folder = os.path.dirname(DETAIL_CACHE_PATH)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+
+        _conn = sqlite3.connect(DETAIL_CACHE_PATH, timeout=30)
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.execute("PRAGMA synchronous=NORMAL")
+        _conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS booking_details (
+                qid         TEXT NOT NULL,
+                booking_no  TEXT NOT NULL,
+                status      TEXT NOT NULL,
+                fingerprint TEXT NOT NULL,
+                fetched_at  REAL NOT NULL,
+                payload     TEXT NOT NULL,
+                PRIMARY KEY (qid, booking_no)
+            )
+            """
+        )
+        # expired Checked In rows are useless to every script
+        _conn.execute(
+            "DELETE FROM booking_details WHERE status = 'Checked In' AND fetched_at < ?",
+            (time.time() - CHECKED_IN_TTL,),
+        )
+        _conn.commit()
+
+    return _conn
+
+
+def close():
+    global _conn
+
+    if _conn is not None:
+        _conn.close()
+        _conn = None
+
+    if CACHE_STATS.lookups():
+        print(CACHE_STATS.summary())
+
+
+# ================= LISTING HINTS =================
+def listing_fingerprint(b):
+    raw = json.dumps([b.get(k) for k in FINGERPRINT_FIELDS], default=str)
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def note_listing(P, bookings):
+    """
+    Called for every get_booking_with_ids page:
+    remembers the current status + fingerprint of each booking
+    """
+    qid = str(P["QID"])
+
+    for b in (bookings or {}).values():
+        booking_no = b.get("booking_no")
+        if not booking_no:
+            continue
+        status = (b.get("status") or "").strip()
+        _listing[(qid, str(booking_no))] = (status, listing_fingerprint(b))
+
+
+# ================= GET / PUT =================
+def get(P, booking_no):
+    """cached booking_details_with_entities payload, or None"""
+    if not enabled():
+        return None
+
+    key = (str(P["QID"]), str(booking_no))
+    hint = _listing.get(key)
+
+    if hint and hint[0] not in CACHEABLE_STATUSES:
+        CACHE_STATS.misses += 1
+        return None
+
+    row = _db().execute(
+        "SELECT status, fingerprint, fetched_at, payload FROM booking_details "
+        "WHERE qid = ? AND booking_no = ?",
+        key,
+    ).fetchone()
+
+    if row is None:
+        CACHE_STATS.misses += 1
+        return None
+
+    status, fingerprint, fetched_at, payload = row
+
+    if hint:
+        fresh = (status, fingerprint) == hint
+    else:
+        # no listing seen this run → only trust final bookings
+        fresh = status == "Checked Out"
+
+    if fresh and status == "Checked In":
+        fresh = (time.time() - fetched_at) <= CHECKED_IN_TTL
+
+    if not fresh:
+        CACHE_STATS.stale += 1
+        return None
+
+    CACHE_STATS.hits += 1
+    return json.loads(payload)
+
+
+def put(P, booking_no, payload):
+    if not enabled():
+        return
+
+    key = (str(P["QID"]), str(booking_no))
+    hint = _listing.get(key)
+
+    # status unknown or still changing → do not cache
+    if not hint or hint[0] not in CACHEABLE_STATUSES:
+        return
+
+    db = _db()
+    db.execute(
+        "INSERT OR REPLACE INTO booking_details "
+        "(qid, booking_no, status, fingerprint, fetched_at, payload) "
+        "VALUES (?, ?, ?, ?, ?, ?)",
+        (*key, hint[0], hint[1], time.time(), json.dumps(payload)),
+    )
+    db.commit()
+    CACHE_STATS.stored += 1
@@ -0,0 +1,189 @@
+# ==============================
+# PER-RUN BOOKING DETAIL RESOLUTION
+# ONE DETAIL CALL PER BOOKING (NOT PER STAY NIGHT)
+# ==============================
+
+import os
+import asyncio
+from datetime import timedelta
+
+
+# ================= DETAIL REQUEST COUNTER =================
+class DetailStats:
+    """
+    naive   = detail calls the old per-night loop would have made
+    fetched = detail calls actually made (one per booking_no)
+    """
+
+    def __init__(self):
+        self.naive = 0
+        self.fetched = 0
+
+    def add(self, naive, fetched):
+        self.naive += naive
+        self.fetched += fetched
+
+    def saved(self):
+        return self.naive - self.fetched
+
+    def summary(self, label="RUN"):
+        return (
+            f"🔎 DETAIL CALLS → {label} :: "
+            f"deduplicated={self.fetched} naive={self.naive} saved={self.saved()}"
+        )
+
+
+# one counter per process (= per run)
+DETAIL_STATS = DetailStats()
+
+
+# ================= STAY NIGHT EXPANSION =================
+def stay_nights(ci, co, start, end):
+    """
+    Yields every night in [start, end] the booking occupies
+    (same rule as the old loop: ci <= night < co)
+    """
+    day = max(ci, start)
+    last = min(co - timedelta(days=1), end)
+
+    while day <= last:
+        yield day
+        day += timedelta(days=1)
+
+
+def listing_order(stay_rows):
+    """
+    stay_rows = [(page, booking, night, ci, co)] appended booking → night
+    → (booking, night, ci, co) in the old loop's row order: page → night → listing
+    """
+    rows = sorted(stay_rows, key=lambda row: (row[0], row[2]))   # stable → listing order kept
+    return [row[1:] for row in rows]
+
+
+# ================= RESOLVE DETAILS (ONCE PER BOOKING) =================
+def _record(naive, fetched, stats=None, label=None):
+    local = DetailStats()
+    local.add(naive, fetched)
+
+    if stats is None:
+        stats = DETAIL_STATS
+    stats.add(local.naive, local.fetched)
+
+    if label:
+        print(local.summary(label))
+
+
+async def resolve_details(booking_nos, fetch, stats=None, label=None):
+    """
+    booking_nos = every booking_no a stay-night row needs (duplicates allowed)
+    fetch       = async fn(booking_no) -> details (already rate limited)
+
+    Returns {booking_no: details or Exception}
+    """
+    booking_nos = list(booking_nos)
+    unique = list(dict.fromkeys(booking_nos))
+
+    results = await asyncio.gather(*(fetch(no) for no in unique), return_exceptions=True)
+
+    _record(len(booking_nos), len(unique), stats, label)
+
+    return dict(zip(unique, results))
+
+
+# ================= PIPELINED DETAILS (OVERLAP WITH PAGINATION) =================
+# every property runs at once (no property semaphore) → a few workers each; the
+# run-wide rate_control limiter (≤ OYO_MAX_CONCURRENCY) is what paces OYO
+DETAIL_WORKERS = int(os.getenv("OYO_DETAIL_WORKERS", "8"))    # detail calls in flight, per property
+DETAIL_QUEUE_LIMIT = 200   # bookings waiting for a worker, per property
+
+
+def _consume(fut):
+    # failures are read by the caller; never "exception was never retrieved"
+    if not fut.cancelled():
+        fut.exception()
+
+
+class DetailPipeline:
+    """
+    Starts each booking's detail call as soon as its listing page arrives,
+    so detail work runs while later pages are still downloading.
+
+        pipeline = DetailPipeline(limited_detail_call)
+        try:
+            fut = await pipeline.submit(booking_no)      # inside the listing loop
+            details = await pipeline.results(label=P["name"])
+        finally:
+            pipeline.close()
+
+    A fixed pool of DETAIL_WORKERS workers takes booking_nos off a bounded
+    queue (submit() waits once DETAIL_QUEUE_LIMIT are waiting → backpressure);
+    the run-wide rate_control limiter still decides how many reach OYO.
+    submit() returns the same future for a booking_no seen before.
+    close() cancels the workers and every unfinished future, so a listing
+    page that raises leaves nothing running behind the property.
+    Rows are still built from results() after pagination: they must come
+    out in listing order (listing_order) and building them is CPU-only, so
+    the overlap that matters is the detail calls, not the row loop.
+    """
+
+    def __init__(self, fetch, workers=DETAIL_WORKERS, limit=DETAIL_QUEUE_LIMIT, stats=None):
+        self.fetch = fetch
+        self.size = max(1, workers)
+        self.queue = asyncio.Queue(limit)
+        self.futures = {}
+        self.workers = []
+        self.naive = 0
+        self.stats = stats
+
+    async def _worker(self):
+        while True:
+            booking_no, fut = await self.queue.get()
+
+            try:
+                if not fut.done():
+                    res = await self.fetch(booking_no)
+                    if not fut.done():
+                        fut.set_result(res)
+            except Exception as e:
+                if not fut.done():
+                    fut.set_exception(e)
+            finally:
+                self.queue.task_done()
+
+    async def submit(self, booking_no):
+        self.naive += 1
+
+        if booking_no not in self.futures:
+            fut = asyncio.get_running_loop().create_future()
+            fut.add_done_callback(_consume)
+            self.futures[booking_no] = fut
+
+            # workers start with the first bookings (an empty window costs none)
+            if len(self.workers) < self.size:
+                self.workers.append(asyncio.ensure_future(self._worker()))
+
+            await self.queue.put((booking_no, fut))
+
+        return self.futures[booking_no]
+
+    def close(self):
+        """stop the workers; a future nobody resolved yet is cancelled"""
+        for worker in self.workers:
+            worker.cancel()
+        self.workers = []
+
+        for fut in self.futures.values():
+            if not fut.done():
+                fut.cancel()
+
+    def record(self, label=None):
+        _record(self.naive, len(self.futures), self.stats, label)
+
+    async def results(self, label=None):
+        """{booking_no: details or Exception} once every submitted call is done"""
+        unique = list(self.futures)
+        results = await asyncio.gather(*self.futures.values(), return_exceptions=True)
+
+        self.record(label)
+
+        return dict(zip(unique, results))
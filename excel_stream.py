@@ -0,0 +1,359 @@
+# ==============================
+# REPORT EXCEL ENGINE
+# NAMED STYLES + STREAMING (write_only) SHEETS + SINGLE-PASS BEAUTIFY
+# ==============================
+#
+# STYLES         → every report look is one NamedStyle, registered once per
+#                  workbook → styling a cell is one set_style(cell, "rpt_...")
+#                  (the cell keeps its own number format, e.g. dates)
+# write_frame()  → booking rows go straight to the sheet's temp file with the
+#                  beautify() look (blue header, banded rows, borders, col-A
+#                  highlight) → memory stays flat however many rows there are
+# ws.cell / ws.append / ws.merge_cells keep working for the small blocks
+# after the bookings (stats, payment tables, property box): their rows sit
+# in a short pending window and are flushed once the writer moves past them
+# beautify(ws)   → the same look for normal worksheets, one pass per cell
+#
+# write_only sheets write column widths before the first row, so widths are
+# planned up front (frame widths + the fixed table widths).
+
+import numpy as np
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import PatternFill, Font, Border, Side, Alignment, NamedStyle
+from openpyxl.styles.fonts import DEFAULT_FONT
+from openpyxl.utils import get_column_letter
+from openpyxl.utils.dataframe import dataframe_to_rows
+from openpyxl.worksheet.cell_range import CellRange
+
+# rows kept editable behind the last written row (property box looks back 4)
+PENDING_ROWS = 16
+
+# ================= STYLE OBJECTS (built once per process) =================
+BLUE = PatternFill("solid", fgColor="1F4E78")
+LIGHT1 = PatternFill("solid", fgColor="DDEBF7")
+LIGHT2 = PatternFill("solid", fgColor="F2F2F2")
+WHITE = PatternFill("solid", fgColor="FFFFFF")
+YELLOW = PatternFill("solid", fgColor="FFF4CC")
+GREEN = PatternFill("solid", fgColor="C6EFCE")
+RED = PatternFill("solid", fgColor="FFC7CE")
+
+BOLD_WHITE = Font(color="FFFFFF", bold=True, size=12)
+BOLD_BLACK = Font(color="000000", bold=True, size=12)
+BOLD_BLACK_11 = Font(color="000000", bold=True, size=11)
+NORMAL = Font(color="000000", size=11)
+LINK = Font(color="0563C1", underline="single", bold=True, size=11)
+
+CENTER = Alignment(horizontal="center", vertical="center")
+H_CENTER = Alignment(horizontal="center")
+LEFT_WRAP = Alignment(horizontal="left", vertical="center", wrap_text=True)
+
+THIN = Border(
+    left=Side(style='thin'),
+    right=Side(style='thin'),
+    top=Side(style='thin'),
+    bottom=Side(style='thin')
+)
+
+# ================= NAMED STYLES =================
+# one xf per look → a styled cell is a single set_style(cell, "rpt_...")
+STYLES = {
+    # beautify()
+    "rpt_header": dict(fill=BLUE, font=BOLD_WHITE, alignment=CENTER, border=THIN),
+    "rpt_band1": dict(fill=LIGHT1, border=THIN),
+    "rpt_band2": dict(fill=LIGHT2, border=THIN),
+    "rpt_label": dict(fill=YELLOW, font=BOLD_BLACK, border=THIN),
+    # payment tables
+    "rpt_head": dict(fill=LIGHT1, font=BOLD_BLACK_11, alignment=CENTER, border=THIN),
+    "rpt_cell": dict(fill=WHITE, font=NORMAL, alignment=CENTER, border=THIN),
+    "rpt_key": dict(fill=YELLOW, font=BOLD_BLACK_11, alignment=CENTER, border=THIN),
+    "rpt_light": dict(fill=LIGHT1, alignment=CENTER, border=THIN),
+    "rpt_white": dict(fill=WHITE, alignment=CENTER, border=THIN),
+    "rpt_good": dict(fill=GREEN, alignment=CENTER, border=THIN),
+    "rpt_fair": dict(fill=YELLOW, alignment=CENTER, border=THIN),
+    "rpt_poor": dict(fill=RED, alignment=CENTER, border=THIN),
+    # consolidated statistics tables (banded by beautify, so no fill on cells)
+    "rpt_table_head": dict(fill=LIGHT1, font=BOLD_BLACK_11, alignment=H_CENTER, border=THIN),
+    "rpt_table_cell": dict(alignment=H_CENTER, border=THIN),
+    "rpt_table_total": dict(fill=YELLOW, font=BOLD_BLACK_11, alignment=H_CENTER, border=THIN),
+    "rpt_score_good": dict(fill=GREEN, font=NORMAL, alignment=CENTER, border=THIN),
+    "rpt_score_fair": dict(fill=YELLOW, font=NORMAL, alignment=CENTER, border=THIN),
+    "rpt_score_poor": dict(fill=RED, font=NORMAL, alignment=CENTER, border=THIN),
+    # property details box
+    "rpt_box_label": dict(fill=LIGHT1, font=BOLD_BLACK_11, alignment=LEFT_WRAP, border=THIN),
+    "rpt_box_value": dict(fill=WHITE, font=NORMAL, alignment=LEFT_WRAP, border=THIN),
+    "rpt_box_link": dict(fill=WHITE, font=LINK, alignment=CENTER, border=THIN),
+    "rpt_edge": dict(border=THIN),
+}
+
+BANDS = ("rpt_band1", "rpt_band2")   # indexed by row % 2 (even rows light blue)
+BAND_FILLS = (LIGHT1, LIGHT2)
+
+
+def register_styles(wb):
+    """add the report named styles to a workbook (once; safe to call again)"""
+    known = set(wb.named_styles)
+    for name, spec in STYLES.items():
+        if name not in known:
+            wb.add_named_style(NamedStyle(name=name, **{"font": DEFAULT_FONT, **spec}))
+
+
+def score_style(score, prefix="rpt_"):
+    """green > 80, yellow >= 60, red below (prefix="rpt_score_" → property score table)"""
+    return f"{prefix}good" if score > 80 else f"{prefix}fair" if score >= 60 else f"{prefix}poor"
+
+
+KEYWORDS = ("Booking", "Amount", "Total", "OYO")
+
+
+def set_style(cell, name):
+    """
+    cell.style = name, keeping the cell's own number format
+    (a NamedStyle carries General → dates would turn into bare serials)
+    """
+    fmt = cell.number_format
+    cell.style = name
+    if fmt != "General":
+        cell.number_format = fmt
+
+
+def _highlight(value):
+    """beautify() col-A rule: label rows mentioning Booking / Amount / Total / OYO"""
+    text = str(value or "").strip()
+    return bool(text) and any(k in text for k in KEYWORDS)
+
+
+def _style_row(r, cells, widths, measure=True):
+    """
+    beautify() rules for one row, in one pass:
+    header / band fill + border, col-A highlight, running max width
+    (measure=False → widths already planned from the frame)
+    """
+    for c, cell in enumerate(cells, start=1):
+        value = cell.value
+
+        if measure and value:
+            n = len(str(value))
+            if n > widths.get(c, 0):
+                widths[c] = n
+
+        if r == 1:
+            set_style(cell, "rpt_header")
+            continue
+        if value is None:
+            continue
+
+        plain = cell.fill is None or cell.fill.patternType is None
+        label = c == 1 and _highlight(value)
+
+        if plain and not cell.has_style:
+            # untouched cell → the whole look is one named style
+            set_style(cell, "rpt_label" if label else BANDS[r % 2])
+        elif plain:
+            # own font / alignment (e.g. centered table values) → only fill + border
+            cell.fill, cell.border = (YELLOW if label else BAND_FILLS[r % 2]), THIN
+            if label:
+                cell.font = BOLD_BLACK
+        else:
+            # ✅ DO NOT override custom styled rows (headings/tables/boxes)
+            cell.border = THIN
+            if label:
+                cell.fill, cell.font = YELLOW, BOLD_BLACK
+
+
+def beautify(ws, widths=None):
+    """
+    single-pass beautify() for a normal (in-memory) worksheet
+    widths = frame_widths(df) when the sheet holds just that frame
+             (skips measuring every cell)
+    """
+    register_styles(ws.parent)
+    ws.freeze_panes = "A2"
+    measure = widths is None
+    seen = {}
+
+    for r, cells in enumerate(ws.iter_rows(min_row=1, max_row=ws.max_row, max_col=ws.max_column), start=1):
+        _style_row(r, cells, seen, measure)
+
+    if measure:
+        widths = {c: w + 5 for c, w in seen.items()}
+
+    for c in range(1, ws.max_column + 1):
+        ws.column_dimensions[get_column_letter(c)].width = widths.get(c, 5)
+
+
+# ================= WIDTH PLANNER =================
+def frame_widths(df, fixed=()):
+    """
+    beautify() width rule (longest value + 5) per column, straight from the
+    frame: one astype(str) + str_len().max() per column, no per-cell loop.
+
+      fixed = minimum widths [A, B, ...] merged in (e.g. PREMIUM_WIDTHS)
+
+    Empty / zero / None values don't count, same as beautify().
+    """
+    widths = {}
+
+    for i, col in enumerate(df.columns, start=1):
+        values = df.iloc[:, i - 1].to_numpy(dtype=object)
+        values = values[values.astype(bool)]
+        longest = int(np.char.str_len(values.astype(str)).max()) if len(values) else 0
+        if col:
+            longest = max(longest, len(str(col)))
+        if longest:
+            widths[i] = longest + 5
+
+    for i, w in enumerate(fixed, start=1):
+        widths[i] = max(widths.get(i, 0), w)
+
+    return widths
+
+
+class StreamSheet:
+    """
+    Forward-only worksheet on a Workbook(write_only=True).
+
+      widths = {col_index: min width} or [w1, w2, ...] planned before writing
+      window = rows kept editable behind the write position
+               (None → keep every row until close(), for small sheets)
+    """
+
+    def __init__(self, wb, title, widths=None, window=PENDING_ROWS):
+        register_styles(wb)
+        self.ws = wb.create_sheet(title)
+        self.window = window
+        self.pending = {}      # row → {col: WriteOnlyCell}
+        self.written = 0       # rows already sent to the stream
+        self.last = 0          # highest row holding a cell (openpyxl max_row)
+        self.current = 0       # row used by the last append / cell (next append goes after it)
+        self.widths = {}
+        self.plan_widths(widths or {})
+
+    # ---------- layout ----------
+    def plan_widths(self, widths):
+        if isinstance(widths, (list, tuple)):
+            widths = dict(enumerate(widths, start=1))
+
+        if self.written and any(w > self.widths.get(c, 0) for c, w in widths.items()):
+            raise RuntimeError("column widths must be planned before the first row is written")
+
+        for c, w in widths.items():
+            self.widths[c] = max(self.widths.get(c, 0), w)
+            self.ws.column_dimensions[get_column_letter(c)].width = self.widths[c]
+
+    @property
+    def max_row(self):
+        return self.last or 1
+
+    @property
+    def row_dimensions(self):
+        return self.ws.row_dimensions
+
+    @property
+    def column_dimensions(self):
+        return self.ws.column_dimensions
+
+    @property
+    def freeze_panes(self):
+        return self.ws.freeze_panes
+
+    @freeze_panes.setter
+    def freeze_panes(self, ref):
+        self.ws.freeze_panes = ref
+
+    def add_image(self, img, anchor):
+        self.ws.add_image(img, anchor)
+
+    def merge_cells(self, start_row, start_column, end_row, end_column):
+        for r in range(start_row, end_row + 1):
+            for c in range(start_column, end_column + 1):
+                self.cell(r, c)
+        self.ws.merged_cells.add(
+            CellRange(min_col=start_column, min_row=start_row, max_col=end_column, max_row=end_row)
+        )
+
+    # ---------- random access inside the window ----------
+    def cell(self, row, column, value=None):
+        if row <= self.written:
+            raise RuntimeError(f"row {row} already written to the stream")
+
+        cells = self.pending.setdefault(row, {})
+        c = cells.get(column)
+        if c is None:
+            c = cells[column] = WriteOnlyCell(self.ws)
+            c.row, c.column = row, column
+        if value is not None:
+            c.value = value
+
+        self.last = max(self.last, row)
+        if row > self.current:
+            self.current = row
+            self._flush_behind()
+        return c
+
+    def append(self, values):
+        """same row rule as Worksheet.append (an empty row only moves the cursor)"""
+        row = self.current + 1
+        for col, v in enumerate(values, start=1):
+            self.cell(row, col, v)
+        self.current = row
+        self._flush_behind()
+
+    # ---------- streaming ----------
+    def _emit(self, upto):
+        while self.written < upto:
+            self.written += 1
+            cells = self.pending.pop(self.written, {})
+            width = max(cells) if cells else 0
+            self.ws.append([cells.get(c) for c in range(1, width + 1)])
+
+    def _flush_behind(self):
+        if self.window is not None:
+            self._emit(self.current - self.window)
+
+    def write_frame(self, df):
+        """
+        Header + booking rows with the beautify() look, straight to the stream.
+        Must be the first block of the sheet.
+        """
+        if self.current:
+            raise RuntimeError("write_frame() must start the sheet")
+
+        self.plan_widths(frame_widths(df))
+        self.ws.freeze_panes = "A2"
+
+        for r, row in enumerate(dataframe_to_rows(df, index=False, header=True), start=1):
+            out = []
+            band = BANDS[r % 2]
+
+            for c, v in enumerate(row, start=1):
+                cell = WriteOnlyCell(self.ws, v)
+                if r == 1:
+                    set_style(cell, "rpt_header")
+                elif v is not None:
+                    set_style(cell, "rpt_label" if c == 1 and _highlight(v) else band)
+                out.append(cell)
+
+            self.ws.append(out)
+
+        self.written = self.last = self.current = len(df) + 1
+
+    def _beautify_pending(self):
+        """beautify() over the rows still in memory (window=None sheets)"""
+        max_col = max((max(c) for c in self.pending.values() if c), default=0)
+        widths = {}
+
+        for r in range(1, self.last + 1):
+            _style_row(r, [self.cell(r, c) for c in range(1, max_col + 1)], widths)
+
+        for c in range(1, max_col + 1):
+            self.widths[c] = widths.get(c, 0) + 5
+            self.ws.column_dimensions[get_column_letter(c)].width = self.widths[c]
+        self.ws.freeze_panes = "A2"
+
+    def close(self, beautify=False):
+        """flush every pending row (beautify=True → old beautify(ws) look first)"""
+        if beautify:
+            if self.written:
+                raise RuntimeError("beautify needs a sheet kept in memory (window=None)")
+            self._beautify_pending()
+        self._emit(self.last)
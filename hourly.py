@@ -7,7 +7,6 @@
 import os
 import json
 import asyncio
-import aiohttp
 import pandas as pd
 from datetime import datetime, timedelta
 import traceback
@@ -17,6 +16,17 @@ from openpyxl.styles import PatternFill, Font, Alignment, Border, Side
 from openpyxl.utils import get_column_letter
 from io import BytesIO
 import pytz
+from booking_store import sync_bookings
+from report_cube import BookingCube
+from detail_resolver import DETAIL_STATS, DetailPipeline, listing_order
+from telegram_outbox import OUTBOX, TELEGRAM_STREAM
+from property_runs import stream_properties
+from oyo_client import (
+    shared_session,
+    run,
+    fetch_booking_details,
+    fetch_total_rooms,
+)
 IST = pytz.timezone("Asia/Kolkata")
 
 now = datetime.now(IST)
@@ -24,17 +34,6 @@ now = datetime.now(IST)
 MAX_FULL_RUN_RETRIES = 5
 FULL_RUN_RETRY_DELAY = 10  # seconds
 
-# ================= NEW: GLOBAL THROTTLES (NO FEATURE REMOVED) =================
-PROP_PARALLEL_LIMIT = 3      # max properties running in parallel
-DETAIL_PARALLEL_LIMIT = 10   # max detail calls in parallel per property
-
-prop_semaphore = asyncio.Semaphore(PROP_PARALLEL_LIMIT)
-
-# ================= NEW: TIMEOUTS (MORE STABLE MONTHLY) =================
-DETAIL_TIMEOUT = 25
-ROOMS_TIMEOUT = 25
-BATCH_TIMEOUT = 35
-
 
 # ================= TELEGRAM =================
 
@@ -66,120 +65,25 @@ if not PROPERTIES:
     raise RuntimeError("❌ OYO_PROPERTIES secret missing or empty")
 
 # ================= TELEGRAM =================
-# ✅ ULTRA SAFE: Guaranteed ordered sending (one-by-one)
-# ✅ Handles 429 retry_after properly
+# ✅ Ordered per chat + paced by telegram_outbox (token bucket, no fixed sleeps)
+# ✅ Handles 429 retry_after properly (pauses only that chat)
 # ✅ Strictly verifies JSON "ok": true
 # ✅ Auto-split long messages
 # ✅ Exponential backoff retries
 # ✅ Never loses a property message unless Telegram is fully down
 
-TELEGRAM_SEND_LOCK = asyncio.Lock()
 TG_MESSAGES = 0
 EARLY_ALERTS = 0
 LATE_ALERTS = 0
 
 
-async def send_telegram_message(text, retries=15, session=None):
-    url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
-
-    def split_message(msg, limit=3900):
-        msg = str(msg or "")
-        if len(msg) <= limit:
-            return [msg]
-
-        parts = []
-        while len(msg) > limit:
-            cut = msg.rfind("\n", 0, limit)
-            if cut == -1 or cut < 1000:
-                cut = limit
-            parts.append(msg[:cut].strip())
-            msg = msg[cut:].strip()
-        if msg:
-            parts.append(msg)
-        return parts
-
-    async def _post(sess, msg_part):
-        payload = {"chat_id": TELEGRAM_CHAT_ID, "text": msg_part, "parse_mode": "HTML"}
-
-        async with sess.post(url, json=payload, timeout=25) as resp:
-            # ✅ 429 flood control
-            if resp.status == 429:
-                retry_after = 5
-                try:
-                    data = await resp.json()
-                    retry_after = int(data.get("parameters", {}).get("retry_after", 5))
-                except Exception:
-                    retry_after = 5
-
-                print(f"⚠️ TELEGRAM 429 RATE LIMIT → sleeping {retry_after}s")
-                await asyncio.sleep(retry_after + 1)
-                return False
-
-            # ✅ Non-200
-            if resp.status != 200:
-                try:
-                    err = await resp.text()
-                except Exception:
-                    err = ""
-                raise RuntimeError(f"Telegram HTTP {resp.status} {err}")
-
-            # ✅ Very important: Telegram sometimes returns 200 but ok:false
-            try:
-                data = await resp.json()
-            except Exception:
-                data = {}
-
-            if data.get("ok") is True:
-                global TG_MESSAGES
-                TG_MESSAGES += 1
-                return True
-               
-
-            # ok:false -> treat as failure and retry
-            desc = data.get("description", "Unknown Telegram error")
-            raise RuntimeError(f"Telegram API ok:false → {desc}")
-
-    parts = split_message(text)
-
-    # ✅ Guarantee ONE-BY-ONE send (no burst)
-    async with TELEGRAM_SEND_LOCK:
-
-        # If session not provided (still works as before)
-        if session is None:
-            async with aiohttp.ClientSession() as s:
-                for part in parts:
-                    last_err = None
-                    for attempt in range(1, retries + 1):
-                        try:
-                            ok = await _post(s, part)
-                            if ok:
-                                await asyncio.sleep(0.3)  # small safe gap
-                                break
-                        except Exception as e:
-                            last_err = e
-                            wait = min(60, 2 * attempt)  # backoff
-                            print(f"⚠️ Telegram retry {attempt}/{retries} → {wait}s :: {e}")
-                            await asyncio.sleep(wait)
-                    else:
-                        raise RuntimeError(f"Telegram send failed after retries: {last_err}")
-            return
-
-        # ✅ Session provided (fast + stable)
-        for part in parts:
-            last_err = None
-            for attempt in range(1, retries + 1):
-                try:
-                    ok = await _post(session, part)
-                    if ok:
-                        await asyncio.sleep(0.3)  # small safe gap
-                        break
-                except Exception as e:
-                    last_err = e
-                    wait = min(60, 2 * attempt)  # backoff
-                    print(f"⚠️ Telegram retry {attempt}/{retries} → {wait}s :: {e}")
-                    await asyncio.sleep(wait)
-            else:
-                raise RuntimeError(f"Telegram send failed after retries: {last_err}")
+async def send_telegram_message(text, retries=15, session=None, strict=True):
+    """
+    Queues text on the run's Telegram outbox and returns at once (a future),
+    so the next property's message is built while this one is being sent.
+    session is kept for the existing call sites; delivery uses the pooled one.
+    """
+    return OUTBOX.post(TELEGRAM_CHAT_ID, text, retries=retries, strict=strict)
 
 # ================= BEAUTIFY EXCEL =================
 def beautify(ws):
@@ -282,249 +186,114 @@ def get_booking_source(b):
     return "OBA"
 
 
-# ================= FETCH DETAILS =================
-async def fetch_booking_details(session, P, booking_no):
-    url = "https://www.oyoos.com/hms_ms/api/v1/visibility/booking_details_with_entities"
-    params = {
-        "qid": P["QID"],
-        "booking_id": booking_no,
-        "role": 0,
-        "platform": "OYOOS",
-        "country_code": 1
-    }
-    cookies = {"uif": P["UIF"], "uuid": P["UUID"]}
-    headers = {
-        "accept": "application/json",
-        "content-type": "application/json",
-        "x-qid": str(P["QID"]),
-        "x-source-client": "merchant"
-    }
-
-    for attempt in range(1, 4):
-        try:
-            async with session.get(
-                url, params=params, headers=headers, cookies=cookies, timeout=DETAIL_TIMEOUT
-            ) as r:
-                if r.status != 200:
-                    raise RuntimeError("DETAIL API FAILED")
-
-                data = await r.json()
-
-                rooms = []
-                stay = data.get("entities", {}).get("stayDetails", {})
-                for s in stay.values():
-                    rn = s.get("room_number")
-                    if rn:
-                        rooms.append(rn)
-
-                booking = next(iter(data.get("entities", {}).get("bookings", {}).values()), {})
-                payments = booking.get("payments", [])
-
-                cash = qr = online = discount = 0
-                for p in payments:
-                    mode = p.get("mode", "")
-                    amt = float(p.get("amount", 0))
-                    if mode == "oyo_wizard_discount":
-                        discount += amt
-                    elif mode == "Cash at Hotel":
-                        cash += amt
-                    elif mode == "UPI QR":
-                        qr += amt
-                    else:
-                        online += amt
-
-                balance = booking.get("payable_amount", 0)
-                return rooms, cash, qr, online, discount, balance
-
-        except Exception:
-            # NEW FEATURE: Better backoff (reduces rate limits)
-            await asyncio.sleep(2 + attempt)
-
-    raise RuntimeError("DETAIL FETCH FAILED")
-
-# ================= BATCH FETCH =================
-async def fetch_bookings_batch(session, offset, f, t, P):
-    url = "https://www.oyoos.com/hms_ms/api/v1/get_booking_with_ids"
-    params = {
-        "qid": P["QID"],
-        "checkin_from": f,
-        "checkin_till": t,
-        "batch_count": 100,
-        "batch_offset": offset,
-        "visibility_required": "true",
-        "additionalParams": "payment_hold_transaction,guest,stay_details",
-        "decimal_price": "true",
-        "ascending": "true",
-        "sort_on": "checkin_date"
-    }
-    cookies = {"uif": P["UIF"], "uuid": P["UUID"]}
-    headers = {
-        "accept": "application/json",
-        "content-type": "application/json",
-        "x-qid": str(P["QID"]),
-        "x-source-client": "merchant"
-    }
-
-    async with session.get(
-        url, params=params, cookies=cookies, headers=headers, timeout=BATCH_TIMEOUT
-    ) as r:
-        if r.status != 200:
-            raise RuntimeError("BATCH API FAILED")
-        return await r.json()
-
-# ================= FETCH TOTAL ROOMS =================
-async def fetch_total_rooms(session, P):
-    url = "https://www.oyoos.com/hms_ms/api/v1/hotels/roomsNew"
-    params = {"qid": P["QID"]}
-    cookies = {"uif": P["UIF"], "uuid": P["UUID"]}
-    headers = {
-        "accept": "application/json",
-        "x-qid": str(P["QID"]),
-        "x-source-client": "merchant"
-    }
-
-    for attempt in range(1, 4):
-        try:
-            async with session.get(
-                url, params=params, cookies=cookies, headers=headers, timeout=ROOMS_TIMEOUT
-            ) as r:
-                if r.status != 200:
-                    raise RuntimeError("ROOM API FAILED")
-
-                data = await r.json()
-                rooms = data.get("rooms", {})
-                return len(rooms)
-
-        except Exception:
-            await asyncio.sleep(2 + attempt)
-
-    return 0
-
 # ================= PROCESS PROPERTY =================
 async def process_property(P, TF, TT, HF, HT):
     print(f"PROCESSING FAST ASYNC → {P['name']}")
 
-    async with aiohttp.ClientSession() as session:
+    async with shared_session() as session:
         total_rooms = await fetch_total_rooms(session, P)
 
         if total_rooms == 0:
             raise RuntimeError("TOTAL ROOMS FETCH FAILED")
 
-        detail_semaphore = asyncio.Semaphore(DETAIL_PARALLEL_LIMIT)
-
+        # concurrency comes from the run-wide adaptive OYO limiter (rate_control)
         async def limited_detail_call(booking_no):
-            async with detail_semaphore:
-                return await fetch_booking_details(session, P, booking_no)
+            return await fetch_booking_details(session, P, booking_no)
 
         all_rows = []
-        offset = 0
+        stay_rows = []   # (page, booking, night, ci, co) → details resolved once per booking below
+        pipeline = DetailPipeline(limited_detail_call)   # detail calls start as pages arrive
         upcoming_count = cancelled_count = inhouse_count = checkedout_count = 0
 
         early_checkins = set()
         late_checkouts = set()
 
-        while True:
-            data = await fetch_bookings_batch(session, offset, HF, HT, P)
-
-            if not data or not data.get("bookingIds"):
-                break
-
-            bookings = data.get("entities", {}).get("bookings", {})
-
-            if not bookings:
-                raise RuntimeError("BOOKING ENTITY EMPTY")
+        tf_date = datetime.strptime(TF, "%Y-%m-%d")
+        end = datetime.strptime(TT, "%Y-%m-%d")
 
-            curr = datetime.strptime(TF, "%Y-%m-%d")
-            end = datetime.strptime(TT, "%Y-%m-%d")
-
-            while curr <= end:
-                target = curr.strftime("%Y-%m-%d")
-                target_dt = curr
-
-                tasks, mapping = [], []
-
-                for b in bookings.values():
-                    status = (b.get("status") or "").strip()
-                    ci = datetime.strptime(b["checkin"], "%Y-%m-%d")
-                    co = datetime.strptime(b["checkout"], "%Y-%m-%d")
-                    tf_date = datetime.strptime(TF, "%Y-%m-%d")
-
-                    # ---- STATUS COUNTS ----
-                    if status == "Checked In":
-                        if ci <= tf_date or ci == tf_date + timedelta(days=1):
-                            inhouse_count += 1
-
-                    elif status == "Checked Out":
-                        today = now.date()
-                        if co.date() == today:
-                            checkedout_count += 1
-
-                    elif status == "Confirm Booking":
-                        today = now.date()
-                        if ci.date() == today:
-                            upcoming_count += 1
-
-                    elif status == "Cancelled Booking":
-                        if ci == tf_date or ci == tf_date + timedelta(days=1):
-                            cancelled_count += 1
-
-                    # ---- EARLY / LATE DETECTION ----
-                    if status == "Checked In":
-                        if ci.date() > tf_date.date():
-                            early_checkins.add(str(b.get("booking_no", "")).strip())
-
-                        if co.date() == tf_date.date():
-                            late_checkouts.add(str(b.get("booking_no", "")).strip())
-
-                    # ---------- ROW FILTER ----------
-                    if status != "Checked In":
-                        continue
-
-                    if not (ci <= target_dt <= co or (ci == tf_date + timedelta(days=1) and target_dt <= co)):
-                        continue
-
-                    tasks.append(limited_detail_call(b["booking_no"]))
-                    mapping.append((b, target, ci, co))
-
-                if tasks:
-                    results = await asyncio.gather(*tasks, return_exceptions=True)
-                else:
-                    results = []
-
-                for res, (b, target, ci, co) in zip(results, mapping):
-                    if isinstance(res, Exception):
-                        continue
-
-                    rooms, cash, qr, online, discount, balance = res
-
-                    stay = max((co - ci).days, 1)
-                    paid = float(b.get("get_amount_paid") or 0)
-                    total_amt = paid + float(balance or 0)
-
-                    all_rows.append({
-                        "Date": target,
-                        "Booking Id": b["booking_no"],
-                        "Guest Name": b["guest_name"],
-                        "Status": b.get("status"),
-                        "Booking Source": get_booking_source(b),
-                        "Check In": b["checkin"],
-                        "Check Out": b["checkout"],
-                        "Rooms": b.get("no_of_rooms", 1),
-                        "Room Numbers": ", ".join(rooms),
-                        "Amount": round(total_amt / stay, 2),
-                        "Cash": round(cash / stay, 2),
-                        "QR": round(qr / stay, 2),
-                        "Online": round(online / stay, 2),
-                        "Discount": round(discount / stay, 2),
-                        "Balance": round(balance / stay, 2),
-                    })
-
-                curr += timedelta(days=1)
-
-            if len(data["bookingIds"]) < 100:
-                break
+        try:
+            # closed history from the local store, only the open tail is paged
+            bookings = await sync_bookings(session, P, HF, HT)
+
+            # listing order kept → position // 100 = the old listing page
+            for position, b in enumerate(bookings.values()):
+                status = (b.get("status") or "").strip()
+                ci = datetime.strptime(b["checkin"], "%Y-%m-%d")
+                co = datetime.strptime(b["checkout"], "%Y-%m-%d")
+
+                # ---- STATUS COUNTS ----
+                if status == "Checked In":
+                    if ci <= tf_date or ci == tf_date + timedelta(days=1):
+                        inhouse_count += 1
+
+                elif status == "Checked Out":
+                    today = now.date()
+                    if co.date() == today:
+                        checkedout_count += 1
+
+                elif status == "Confirm Booking":
+                    today = now.date()
+                    if ci.date() == today:
+                        upcoming_count += 1
+
+                elif status == "Cancelled Booking":
+                    if ci == tf_date or ci == tf_date + timedelta(days=1):
+                        cancelled_count += 1
+
+                # ---- EARLY / LATE DETECTION ----
+                if status == "Checked In":
+                    if ci.date() > tf_date.date():
+                        early_checkins.add(str(b.get("booking_no", "")).strip())
+
+                    if co.date() == tf_date.date():
+                        late_checkouts.add(str(b.get("booking_no", "")).strip())
+
+                # ---------- ROW FILTER ----------
+                if status != "Checked In":
+                    continue
+
+                # nights are expanded locally (no API call per night)
+                night = tf_date
+                while night <= end:
+                    if ci <= night <= co or (ci == tf_date + timedelta(days=1) and night <= co):
+                        stay_rows.append((position // 100, b, night.strftime("%Y-%m-%d"), ci, co))
+                        await pipeline.submit(b["booking_no"])
+                    night += timedelta(days=1)
+
+            # ================= DETAIL RESULTS (STARTED DURING PAGINATION) =================
+            details = await pipeline.results(label=P["name"])
+        finally:
+            # store sync / listing that raised → no detail call left running
+            pipeline.close()
+
+        for b, target, ci, co in listing_order(stay_rows):
+            res = details[b["booking_no"]]
+            if isinstance(res, Exception):
+                continue
 
-            offset += 100
+            rooms, cash, qr, online, discount, balance = res
+
+            stay = max((co - ci).days, 1)
+            paid = float(b.get("get_amount_paid") or 0)
+            total_amt = paid + float(balance or 0)
+
+            all_rows.append({
+                "Date": target,
+                "Booking Id": b["booking_no"],
+                "Guest Name": b["guest_name"],
+                "Status": b.get("status"),
+                "Booking Source": get_booking_source(b),
+                "Check In": b["checkin"],
+                "Check Out": b["checkout"],
+                "Rooms": b.get("no_of_rooms", 1),
+                "Room Numbers": ", ".join(rooms),
+                "Amount": round(total_amt / stay, 2),
+                "Cash": round(cash / stay, 2),
+                "QR": round(qr / stay, 2),
+                "Online": round(online / stay, 2),
+                "Discount": round(discount / stay, 2),
+                "Balance": round(balance / stay, 2),
+            })
 
         df = pd.DataFrame(all_rows)
 
@@ -563,11 +332,6 @@ async def run_property_with_retry(P, TF, TT, HF, HT, retries=3):
             await asyncio.sleep(2 + attempt * 2)
     raise RuntimeError(f"PROPERTY FAILED → {P['name']}") from last_error
 
-# NEW FEATURE: PROPERTY PARALLEL LIMITER (reduces failures)
-async def run_property_limited(P, TF, TT, HF, HT):
-    async with prop_semaphore:
-        return await run_property_with_retry(P, TF, TT, HF, HT)
-
 
 
 
@@ -606,51 +370,6 @@ def build_early_late_alert_message(prop, report_date, early_list, late_list):
 
     return "\n".join(lines).strip()
 
-# ================= COUNT / AMOUNT =================
-def count(df, src):
-    if df.empty:
-        return 0
-    return int(df[df["Booking Source"] == src]["Rooms"].sum())
-
-def amt(df, src):
-    if df.empty:
-        return 0
-    return round(df[df["Booking Source"] == src]["Amount"].sum(), 2)
-
-def count_upcoming(df, tf):
-    tf_date = datetime.strptime(tf, "%Y-%m-%d")
-    next_date = tf_date + timedelta(days=1)
-
-    c = 0
-    for _, r in df.iterrows():
-        if r.get("Status") != "Confirm Booking":
-            continue
-
-        d = datetime.strptime(r["Date"], "%Y-%m-%d")
-
-        if d == tf_date and now.hour >= 12:
-            c += 1
-        elif d == next_date and now.hour < 12:
-            c += 1
-
-    return c
-
-def count_cancelled(df, tf):
-    tf_date = datetime.strptime(tf, "%Y-%m-%d")
-    next_date = tf_date + timedelta(days=1)
-
-    c = 0
-    for _, r in df.iterrows():
-        if r.get("Status") != "Cancelled Booking":
-            continue
-
-        d = datetime.strptime(r["Date"], "%Y-%m-%d")
-
-        if d == tf_date or d == next_date:
-            c += 1
-
-    return c
-
 def build_telegram_message(
     prop,
     total_rooms,
@@ -710,6 +429,94 @@ HOURLY REPORT : {prop}
 """.strip()
 
 
+# ================= PER-PROPERTY TELEGRAM =================
+def empty_result(result):
+    """property finished without a booking frame → retried like a failure"""
+    name, df, *_ = result
+    return "EMPTY DATA" if df is None else None
+
+
+async def send_property_report(result, TF, tg_session):
+    """hourly message (+ early / late alert) of one property → outbox"""
+    global EARLY_ALERTS, LATE_ALERTS
+
+    name, df, total_rooms, inhouse, checkedout, upcoming, cancelled, early_checkins, late_checkouts = result
+
+    cube = BookingCube(df)
+
+    booked_rooms = int(df["Rooms"].sum()) if not df.empty else 0
+
+    booked_rooms = int(df["Rooms"].sum())
+    available_rooms = total_rooms - booked_rooms
+    occupancy = round((booked_rooms / total_rooms) * 100) if total_rooms else 0
+
+    total_amount = float(df["Amount"].sum()) if not df.empty else 0.0
+    arr = round(total_amount / booked_rooms, 2) if booked_rooms else 0
+
+    oyo_rooms = cube.count("OYO")
+    oyo_amount = float(cube.sum("Amount", "OYO"))
+    app_arr = round(oyo_amount / oyo_rooms, 2) if oyo_rooms else 0
+
+    counts = {
+        "Walk-in": cube.count("Walk-in"),
+        "OYO": cube.count("OYO"),
+        "MMT": cube.count("MMT"),
+        "Agoda": cube.count("Agoda"),
+        "CB": cube.count("CB"),
+        "BDC": cube.count("BDC"),
+        "TA": cube.count("TA"),
+        "OBA": cube.count("OBA")
+    }
+
+    amounts = {
+        "Total": int(total_amount),
+        "Cash": int(df["Cash"].sum()) if not df.empty else 0,
+        "QR": int(df["QR"].sum()) if not df.empty else 0,
+        "Online": int(df["Online"].sum()) if not df.empty else 0,
+        "Discount": int(df["Discount"].sum()) if not df.empty else 0,
+        "Balance": int(df["Balance"].sum()) if not df.empty else 0
+    }
+
+    hourly_message = build_telegram_message(
+        prop=name,
+        total_rooms=total_rooms,
+        booked_rooms=booked_rooms,
+        available_rooms=available_rooms,
+        occupancy=occupancy,
+        inhouse=inhouse,
+        checkedout=checkedout,
+        upcoming=upcoming,
+        cancelled=cancelled,
+        counts=counts,
+        amounts=amounts,
+        arr=arr,
+        app_arr=app_arr
+    )
+
+    await send_telegram_message(hourly_message, session=tg_session)
+
+    # ================= EARLY / LATE ALERT =================
+    if (early_checkins and len(early_checkins) > 0) or (late_checkouts and len(late_checkouts) > 0):
+
+        alert_msg = build_early_late_alert_message(
+            prop=name,
+            report_date=datetime.strptime(TF, "%Y-%m-%d").strftime("%d/%m/%Y"),
+            early_list=early_checkins or [],
+            late_list=late_checkouts or []
+        )
+
+        if alert_msg:
+
+            if early_checkins:
+                EARLY_ALERTS += 1
+
+            if late_checkouts:
+                LATE_ALERTS += 1
+
+            # alerts never fail the run (logged by the outbox)
+            await send_telegram_message(alert_msg, session=tg_session, strict=False)
+
+
 # ================= MAIN =================
 # ================= MAIN =================
 async def main():
@@ -732,142 +539,47 @@ async def main():
     HT = now.strftime("%Y-%m-%d")
 
     # ================= SMART RETRY (ONLY FAILED PROPERTIES) =================
-    pending = {k: v for k, v in PROPERTIES.items()}
+    # a property's message is posted the moment it succeeds (TELEGRAM_STREAM),
+    # the consolidated report only once every property is in
     success_results = {}
 
-    for run_attempt in range(1, MAX_FULL_RUN_RETRIES + 1):
-        if not pending:
-            break
-
-        print(f"\n🔁 PARTIAL RUN ATTEMPT {run_attempt}/{MAX_FULL_RUN_RETRIES}")
-        print(f"⏳ Pending Properties: {len(pending)}")
+    async with shared_session() as tg_session:
 
-        tasks = [run_property_limited(P, TF, TT, HF, HT) for P in pending.values()]
-        results = await asyncio.gather(*tasks, return_exceptions=True)
-
-        new_pending = {}
-        for key, (P, result) in zip(list(pending.keys()), zip(pending.values(), results)):
-
-            if isinstance(result, Exception):
-                print(f"❌ FAILED → {P['name']} :: {result}")
-                new_pending[key] = P
-                continue
-
-            name, df, *_ = result
-
-            if df is None:
-                print(f"❌ EMPTY DATA → {name}")
-                new_pending[key] = P
-                continue
-
-            success_results[key] = result
-            print(f"✅ OK → {name} rows={len(df)}")
-
-        pending = new_pending
-
-        if pending:
-            if run_attempt == MAX_FULL_RUN_RETRIES:
-                failed_names = [p["name"] for p in pending.values()]
-                raise RuntimeError(f"FINAL FAILURE: Properties failed after retries: {failed_names}")
-
-            print(f"🔁 RETRYING ONLY FAILED PROPERTIES after {FULL_RUN_RETRY_DELAY}s...")
-            await asyncio.sleep(FULL_RUN_RETRY_DELAY)
-
-    # ================= FINAL VERIFICATION =================
-    valid_results = [success_results[k] for k in PROPERTIES.keys() if k in success_results]
+        try:
+            async for key, result in stream_properties(
+                PROPERTIES,
+                lambda P: run_property_with_retry(P, TF, TT, HF, HT),
+                retries=MAX_FULL_RUN_RETRIES,
+                delay=FULL_RUN_RETRY_DELAY,
+                check=empty_result,
+            ):
+                success_results[key] = result
+
+                if TELEGRAM_STREAM:
+                    await send_property_report(result, TF, tg_session)
+        except Exception:
+            # FINAL FAILURE → messages already posted still reach the chat
+            await OUTBOX.drain()
+            raise
 
-    if len(valid_results) != len(PROPERTIES):
-        missing = [PROPERTIES[k]["name"] for k in PROPERTIES.keys() if k not in success_results]
-        raise RuntimeError(f"DATA INCOMPLETE: Missing properties: {missing}")
+        # ================= FINAL VERIFICATION =================
+        valid_results = [success_results[k] for k in PROPERTIES.keys() if k in success_results]
 
-    print("✅ DATA VERIFIED — ALL PROPERTIES PRESENT")
+        if len(valid_results) != len(PROPERTIES):
+            missing = [PROPERTIES[k]["name"] for k in PROPERTIES.keys() if k not in success_results]
+            raise RuntimeError(f"DATA INCOMPLETE: Missing properties: {missing}")
 
-    async with aiohttp.ClientSession() as tg_session:
+        print("✅ DATA VERIFIED — ALL PROPERTIES PRESENT")
+        print(DETAIL_STATS.summary())
 
         # ================= PER-PROPERTY REPORTS =================
-        for name, df, total_rooms, inhouse, checkedout, upcoming, cancelled, early_checkins, late_checkouts in valid_results:
-
-            booked_rooms = int(df["Rooms"].sum()) if not df.empty else 0
-
-            booked_rooms = int(df["Rooms"].sum())
-            available_rooms = total_rooms - booked_rooms
-            occupancy = round((booked_rooms / total_rooms) * 100) if total_rooms else 0
-
-            total_amount = float(df["Amount"].sum()) if not df.empty else 0.0
-            arr = round(total_amount / booked_rooms, 2) if booked_rooms else 0
-
-            oyo_df = df[df["Booking Source"] == "OYO"] if not df.empty else df
-            oyo_rooms = int(oyo_df["Rooms"].sum()) if not oyo_df.empty else 0
-            oyo_amount = float(oyo_df["Amount"].sum()) if not oyo_df.empty else 0.0
-            app_arr = round(oyo_amount / oyo_rooms, 2) if oyo_rooms else 0
-
-            counts = {
-                "Walk-in": count(df, "Walk-in"),
-                "OYO": count(df, "OYO"),
-                "MMT": count(df, "MMT"),
-                "Agoda": count(df, "Agoda"),
-                "CB": count(df, "CB"),
-                "BDC": count(df, "BDC"),
-                "TA": count(df, "TA"),
-                "OBA": count(df, "OBA")
-            }
-
-            amounts = {
-                "Total": int(total_amount),
-                "Cash": int(df["Cash"].sum()) if not df.empty else 0,
-                "QR": int(df["QR"].sum()) if not df.empty else 0,
-                "Online": int(df["Online"].sum()) if not df.empty else 0,
-                "Discount": int(df["Discount"].sum()) if not df.empty else 0,
-                "Balance": int(df["Balance"].sum()) if not df.empty else 0
-            }
-
-            hourly_message = build_telegram_message(
-                prop=name,
-                total_rooms=total_rooms,
-                booked_rooms=booked_rooms,
-                available_rooms=available_rooms,
-                occupancy=occupancy,
-                inhouse=inhouse,
-                checkedout=checkedout,
-                upcoming=upcoming,
-                cancelled=cancelled,
-                counts=counts,
-                amounts=amounts,
-                arr=arr,
-                app_arr=app_arr
-            )
-
-            await send_telegram_message(hourly_message, session=tg_session)
-            await asyncio.sleep(1.5)
-
-            # ================= EARLY / LATE ALERT =================
-            if (early_checkins and len(early_checkins) > 0) or (late_checkouts and len(late_checkouts) > 0):
-
-                alert_msg = build_early_late_alert_message(
-                    prop=name,
-                    report_date=datetime.strptime(TF, "%Y-%m-%d").strftime("%d/%m/%Y"),
-                    early_list=early_checkins or [],
-                    late_list=late_checkouts or []
-                )
-
-                if alert_msg:
-
-                    global EARLY_ALERTS, LATE_ALERTS
-
-                    if early_checkins:
-                        EARLY_ALERTS += 1
-
-                    if late_checkouts:
-                        LATE_ALERTS += 1
-
-                    try:
-                        await send_telegram_message(alert_msg, session=tg_session)
-                        await asyncio.sleep(1.5)
-                    except Exception as e:
-                        print(f"⚠️ ALERT TELEGRAM FAILED → {name} :: {e}")
+        if not TELEGRAM_STREAM:
+            for result in valid_results:
+                await send_property_report(result, TF, tg_session)
 
         # ================= CONSOLIDATED REPORT =================
         all_df = pd.concat([r[1] for r in valid_results], ignore_index=True)
+        all_cube = BookingCube(all_df)
 
         total_rooms_all = sum(r[2] for r in valid_results)
         inhouse_all = sum(r[3] for r in valid_results)
@@ -884,12 +596,11 @@ async def main():
         total_amount_all = float(all_df["Amount"].sum()) if not all_df.empty else 0.0
         arr_all = round(total_amount_all / booked_rooms_all, 2) if booked_rooms_all else 0
 
-        oyo_df_all = all_df[all_df["Booking Source"] == "OYO"] if not all_df.empty else all_df
-        oyo_rooms_all = int(oyo_df_all["Rooms"].sum()) if not oyo_df_all.empty else 0
-        oyo_amount_all = float(oyo_df_all["Amount"].sum()) if not oyo_df_all.empty else 0.0
+        oyo_rooms_all = all_cube.count("OYO")
+        oyo_amount_all = float(all_cube.sum("Amount", "OYO"))
         app_arr_all = round(oyo_amount_all / oyo_rooms_all, 2) if oyo_rooms_all else 0
 
-        counts_all = {k: count(all_df, k) for k in ["Walk-in","OYO","MMT","Agoda","CB","BDC","TA","OBA"]}
+        counts_all = {k: all_cube.count(k) for k in ["Walk-in","OYO","MMT","Agoda","CB","BDC","TA","OBA"]}
 
         amounts_all = {
             "Total": int(total_amount_all),
@@ -918,6 +629,12 @@ async def main():
 
         await send_telegram_message(consolidated_hourly, session=tg_session)
 
+        # every queued message delivered (in order) before the summary
+        await OUTBOX.flush()
+
+        global TG_MESSAGES
+        TG_MESSAGES = OUTBOX.sent
+
         print("")
         print("========================================")
         print("USAGE SUMMARY")
@@ -937,7 +654,7 @@ async def main():
 # ================= RUN =================
 if __name__ == "__main__":
     try:
-        asyncio.run(main())
+        run(main())
     except Exception as e:
         print("SCRIPT CRASHED")
         print(e)
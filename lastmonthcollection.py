@@ -13,24 +13,26 @@ from datetime import datetime, timedelta
 import traceback
 from openpyxl import Workbook
 from openpyxl.utils.dataframe import dataframe_to_rows
-from openpyxl.styles import PatternFill, Font, Alignment, Border, Side
 from openpyxl.utils import get_column_letter
-from io import BytesIO
+from report_sink import ReportSink
 import pytz
+from excel_stream import beautify, frame_widths, register_styles, set_style
+from report_cube import BookingCube
+from detail_resolver import DetailPipeline
+from oyo_client import (
+    shared_session,
+    run,
+    BookingPages,
+    fetch_booking_details_raw,
+    fetch_total_rooms,
+    fetch_property_details,
+)
 IST = pytz.timezone("Asia/Kolkata")
 now = datetime.now(IST)
 
 MAX_FULL_RUN_RETRIES = 5
 FULL_RUN_RETRY_DELAY = 10
 
-PROP_PARALLEL_LIMIT = 3
-DETAIL_PARALLEL_LIMIT = 10
-
-prop_semaphore = asyncio.Semaphore(PROP_PARALLEL_LIMIT)
-
-DETAIL_TIMEOUT = 25
-ROOMS_TIMEOUT = 25
-BATCH_TIMEOUT = 35
 
 
 # ================= TELEGRAM =================
@@ -78,70 +80,12 @@ async def send_telegram_excel_buffer(buffer, filename, caption=None):
         content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
     )
 
-    async with aiohttp.ClientSession() as session:
+    async with shared_session() as session:
         async with session.post(url, data=data, timeout=120) as resp:
             if resp.status != 200:
                 text = await resp.text()
                 raise RuntimeError(f"Telegram send failed: {text}")
 
-# ================= BEAUTIFY EXCEL =================
-def beautify(ws):
-    blue = PatternFill("solid", fgColor="1F4E78")
-    light1 = PatternFill("solid", fgColor="DDEBF7")
-    light2 = PatternFill("solid", fgColor="F2F2F2")
-    yellow = PatternFill("solid", fgColor="FFF4CC")
-
-    bold_white = Font(color="FFFFFF", bold=True, size=12)
-    bold_black = Font(color="000000", bold=True, size=12)
-
-    thin = Border(
-        left=Side(style='thin'),
-        right=Side(style='thin'),
-        top=Side(style='thin'),
-        bottom=Side(style='thin')
-    )
-
-    max_row = ws.max_row
-    max_col = ws.max_column
-    ws.freeze_panes = "A2"
-
-    for col in range(1, max_col + 1):
-        c = ws.cell(row=1, column=col)
-        c.fill = blue
-        c.font = bold_white
-        c.alignment = Alignment(horizontal="center", vertical="center")
-        c.border = thin
-
-    for r in range(2, max_row + 1):
-        fill = light1 if r % 2 == 0 else light2
-        for c in range(1, max_col + 1):
-            cell = ws.cell(row=r, column=c)
-            if cell.value is None:
-                continue
-
-            if cell.fill is not None and cell.fill.patternType is not None:
-                cell.border = thin
-                continue
-
-            cell.fill = fill
-            cell.border = thin
-
-    for col in ws.columns:
-        max_length = 0
-        col_letter = get_column_letter(col[0].column)
-        for cell in col:
-            if cell.value:
-                max_length = max(max_length, len(str(cell.value)))
-        ws.column_dimensions[col_letter].width = max_length + 5
-
-    for r in range(2, max_row + 1):
-        text = str(ws.cell(row=r, column=1).value or "")
-        if text.strip() == "":
-            continue
-        if "Booking" in text or "Amount" in text or "Total" in text or "OYO" in text:
-            ws.cell(row=r, column=1).fill = yellow
-            ws.cell(row=r, column=1).font = bold_black
-
 # ================= BOOKING SOURCE =================
 def get_booking_source(b):
     source = str(b.get("source", "") or "").strip()
@@ -170,38 +114,17 @@ def get_booking_source(b):
 
 # ================= PREMIUM PROPERTY DETAILS BOX =================
 def add_property_details_box(ws, prop):
-    blue = PatternFill("solid", fgColor="1F4E78")
-    light = PatternFill("solid", fgColor="DDEBF7")
-    white = PatternFill("solid", fgColor="FFFFFF")
-
-    bold_white = Font(color="FFFFFF", bold=True, size=12)
-    bold_black = Font(color="000000", bold=True, size=11)
-    normal = Font(color="000000", size=11)
-    link_font = Font(color="0563C1", underline="single", bold=True, size=11)
-
-    thin = Border(
-        left=Side(style='thin'),
-        right=Side(style='thin'),
-        top=Side(style='thin'),
-        bottom=Side(style='thin')
-    )
-
     start_col = 1
     end_col = 8
 
-    def _border_range(r1, c1, r2, c2):
-        for rr in range(r1, r2 + 1):
-            for cc in range(c1, c2 + 1):
-                ws.cell(row=rr, column=cc).border = thin
-
-    def _merge(row, c1, c2, value, fill=None, font=None, center=False, wrap=False):
+    def _merge(row, c1, c2, value, style):
         ws.merge_cells(start_row=row, start_column=c1, end_row=row, end_column=c2)
         cell = ws.cell(row=row, column=c1)
         cell.value = value
-        if fill: cell.fill = fill
-        if font: cell.font = font
-        cell.alignment = Alignment(horizontal="center" if center else "left",
-                                   vertical="center", wrap_text=wrap)
+        set_style(cell, style)
+        # rest of the merged range only carries the box border
+        for cc in range(c1 + 1, c2 + 1):
+            set_style(ws.cell(row=row, column=cc), "rpt_edge")
         return cell
 
     plot = (prop.get("plot_number") or "").strip()
@@ -222,66 +145,38 @@ def add_property_details_box(ws, prop):
     ws.append([])
     top = ws.max_row + 1
 
-    _merge(top, start_col, end_col, "PROPERTY DETAILS", fill=blue, font=bold_white, center=True)
+    _merge(top, start_col, end_col, "PROPERTY DETAILS", "rpt_header")
     ws.row_dimensions[top].height = 22
 
-    _merge(top + 1, 1, 2, "Name", fill=light, font=bold_black, wrap=True)
-    _merge(top + 1, 3, end_col, prop.get("name", "") or "", fill=white, font=normal, wrap=True)
+    _merge(top + 1, 1, 2, "Name", "rpt_box_label")
+    _merge(top + 1, 3, end_col, prop.get("name", "") or "", "rpt_box_value")
 
-    _merge(top + 2, 1, 2, "Alternative Name", fill=light, font=bold_black, wrap=True)
-    _merge(top + 2, 3, end_col, prop.get("alternate_name", "") or "", fill=white, font=normal, wrap=True)
+    _merge(top + 2, 1, 2, "Alternative Name", "rpt_box_label")
+    _merge(top + 2, 3, end_col, prop.get("alternate_name", "") or "", "rpt_box_value")
 
-    _merge(top + 3, 1, 2, "Address", fill=light, font=bold_black, wrap=True)
-    _merge(top + 3, 3, end_col, address, fill=white, font=normal, wrap=True)
+    _merge(top + 3, 1, 2, "Address", "rpt_box_label")
+    _merge(top + 3, 3, end_col, address, "rpt_box_value")
     ws.row_dimensions[top + 3].height = 45
 
-    _merge(top + 4, 1, 2, "Google Map", fill=light, font=bold_black, wrap=True)
+    _merge(top + 4, 1, 2, "Google Map", "rpt_box_label")
     map_link = (prop.get("map_link") or "").strip() or ""
     link_cell = _merge(top + 4, 3, end_col,
                        "OPEN IN GOOGLE MAPS" if map_link else "",
-                       fill=white, font=link_font, center=True)
+                       "rpt_box_link")
     if map_link:
         link_cell.hyperlink = map_link
 
-    _border_range(top, start_col, top + 4, end_col)
-
 # ================= PREMIUM PAYMENT TABLES =================
 # ================= PREMIUM PAYMENT TABLES =================
-def add_payment_tables(ws, df, daily_collect, TF, TT, title_prefix=""):
-    blue = PatternFill("solid", fgColor="1F4E78")
-    light = PatternFill("solid", fgColor="DDEBF7")
-    white = PatternFill("solid", fgColor="FFFFFF")
-    yellow = PatternFill("solid", fgColor="FFF4CC")
-
-    bold_white = Font(color="FFFFFF", bold=True, size=12)
-    bold_black = Font(color="000000", bold=True, size=11)
-    normal = Font(color="000000", size=11)
-
-    thin = Border(
-        left=Side(style='thin'),
-        right=Side(style='thin'),
-        top=Side(style='thin'),
-        bottom=Side(style='thin')
-    )
-
-    def _style_row(row, start_col, end_col, fill=None, font=None, center=True):
+def add_payment_tables(ws, cube, daily_collect, TF, TT, title_prefix=""):
+    def _style_row(row, start_col, end_col, style):
         for c in range(start_col, end_col + 1):
-            cell = ws.cell(row=row, column=c)
-            if fill: cell.fill = fill
-            if font: cell.font = font
-            cell.border = thin
-            cell.alignment = Alignment(horizontal="center" if center else "left",
-                                       vertical="center")
-
-    def _merge(row, c1, c2, value, fill=None, font=None, center=True):
+            set_style(ws.cell(row=row, column=c), style)
+    def _merge(row, c1, c2, value, style):
         ws.merge_cells(start_row=row, start_column=c1, end_row=row, end_column=c2)
         cell = ws.cell(row=row, column=c1)
         cell.value = value
-        if fill: cell.fill = fill
-        if font: cell.font = font
-        cell.border = thin
-        cell.alignment = Alignment(horizontal="center" if center else "left",
-                                   vertical="center")
+        set_style(cell, style)
         return cell
 
     start_col = 1
@@ -298,23 +193,24 @@ def add_payment_tables(ws, df, daily_collect, TF, TT, title_prefix=""):
     # ================= TABLE 1 =================
     top = ws.max_row + 1
     heading = f"{title_prefix}BOOKING SOURCE × PAYMENT MODE".strip()
-    _merge(top, start_col, end_col, heading, fill=blue, font=bold_white, center=True)
+    _merge(top, start_col, end_col, heading, "rpt_header")
 
     headers = ["Source", "Cash", "QR", "Online", "Discount", "Total Paid", ""]
     for idx, h in enumerate(headers, start=1):
         ws.cell(row=top + 1, column=idx).value = h
-    _style_row(top + 1, start_col, end_col, fill=light, font=bold_black)
+    _style_row(top + 1, start_col, end_col, "rpt_head")
 
     sources = ["OYO", "Walk-in", "MMT", "BDC", "Agoda", "CB", "TA", "OBA"]
     r = top + 2
+    by_source = cube.by_source()
 
     for src in sources:
-        part = df[df["Booking Source"] == src] if (not df.empty and "Booking Source" in df.columns) else df
+        part = by_source.loc[src]
 
-        cash = round(float(part["Cash"].sum()), 2) if (not part.empty and "Cash" in part.columns) else 0
-        qr = round(float(part["QR"].sum()), 2) if (not part.empty and "QR" in part.columns) else 0
-        online = round(float(part["Online"].sum()), 2) if (not part.empty and "Online" in part.columns) else 0
-        discount = round(float(part["Discount"].sum()), 2) if (not part.empty and "Discount" in part.columns) else 0
+        cash = round(float(part.get("Cash", 0)), 2)
+        qr = round(float(part.get("QR", 0)), 2)
+        online = round(float(part.get("Online", 0)), 2)
+        discount = round(float(part.get("Discount", 0)), 2)
 
         total_paid = round(cash + qr + online + discount, 2)
 
@@ -325,22 +221,16 @@ def add_payment_tables(ws, df, daily_collect, TF, TT, title_prefix=""):
         ws.cell(row=r, column=5).value = discount
         ws.cell(row=r, column=6).value = total_paid
 
-        for c in range(start_col, end_col + 1):
-            cell = ws.cell(row=r, column=c)
-            cell.border = thin
-            cell.font = normal
-            cell.alignment = Alignment(horizontal="center", vertical="center")
-            cell.fill = white
-
-        ws.cell(row=r, column=1).fill = yellow
-        ws.cell(row=r, column=1).font = bold_black
+        _style_row(r, start_col, end_col, "rpt_cell")
+
+        set_style(ws.cell(row=r, column=1), "rpt_key")
         r += 1
 
     # TOTAL row
-    tot_cash = round(float(df["Cash"].sum()), 2) if not df.empty else 0
-    tot_qr = round(float(df["QR"].sum()), 2) if not df.empty else 0
-    tot_online = round(float(df["Online"].sum()), 2) if not df.empty else 0
-    tot_discount = round(float(df["Discount"].sum()), 2) if not df.empty else 0
+    tot_cash = round(float(cube.sum("Cash")), 2)
+    tot_qr = round(float(cube.sum("QR")), 2)
+    tot_online = round(float(cube.sum("Online")), 2)
+    tot_discount = round(float(cube.sum("Discount")), 2)
     tot_paid = round(tot_cash + tot_qr + tot_online + tot_discount, 2)
 
     ws.cell(row=r, column=1).value = "TOTAL"
@@ -350,27 +240,20 @@ def add_payment_tables(ws, df, daily_collect, TF, TT, title_prefix=""):
     ws.cell(row=r, column=5).value = tot_discount
     ws.cell(row=r, column=6).value = tot_paid
 
-    for c in range(start_col, end_col + 1):
-        cell = ws.cell(row=r, column=c)
-        cell.border = thin
-        cell.font = bold_black
-        cell.alignment = Alignment(horizontal="center", vertical="center")
-        cell.fill = light
-
-    ws.cell(row=r, column=1).fill = yellow
-    ws.cell(row=r, column=1).font = bold_black
+    _style_row(r, start_col, end_col, "rpt_head")
 
+    set_style(ws.cell(row=r, column=1), "rpt_key")
     ws.append([])
 
     # ================= TABLE 2 =================
     top2 = ws.max_row + 1
     heading2 = f"{title_prefix}DATE WISE COLLECTION SUMMARY".strip()
-    _merge(top2, start_col, end_col, heading2, fill=blue, font=bold_white, center=True)
+    _merge(top2, start_col, end_col, heading2, "rpt_header")
 
     headers2 = ["Date", "Cash", "QR", "Online", "Discount", "Total Paid", ""]
     for idx, h in enumerate(headers2, start=1):
         ws.cell(row=top2 + 1, column=idx).value = h
-    _style_row(top2 + 1, start_col, end_col, fill=light, font=bold_black)
+    _style_row(top2 + 1, start_col, end_col, "rpt_head")
 
     rr = top2 + 2
     tf_dt = datetime.strptime(TF, "%Y-%m-%d").date()
@@ -402,16 +285,9 @@ def add_payment_tables(ws, df, daily_collect, TF, TT, title_prefix=""):
         ws.cell(row=rr, column=5).value = discount
         ws.cell(row=rr, column=6).value = total_paid
 
-        for c in range(start_col, end_col + 1):
-            cell = ws.cell(row=rr, column=c)
-            cell.border = thin
-            cell.font = normal
-            cell.alignment = Alignment(horizontal="center", vertical="center")
-            cell.fill = white
-
-        ws.cell(row=rr, column=1).fill = yellow
-        ws.cell(row=rr, column=1).font = bold_black
+        _style_row(rr, start_col, end_col, "rpt_cell")
 
+        set_style(ws.cell(row=rr, column=1), "rpt_key")
         grand_cash += cash
         grand_qr += qr
         grand_online += online
@@ -429,179 +305,64 @@ def add_payment_tables(ws, df, daily_collect, TF, TT, title_prefix=""):
     ws.cell(row=rr, column=5).value = round(grand_discount, 2)
     ws.cell(row=rr, column=6).value = grand_total
 
-    for c in range(start_col, end_col + 1):
-        cell = ws.cell(row=rr, column=c)
-        cell.border = thin
-        cell.font = bold_black
-        cell.alignment = Alignment(horizontal="center", vertical="center")
-        cell.fill = light
-
-    ws.cell(row=rr, column=1).fill = yellow
-    ws.cell(row=rr, column=1).font = bold_black
+    _style_row(rr, start_col, end_col, "rpt_head")
 
+    set_style(ws.cell(row=rr, column=1), "rpt_key")
     ws.append([])
 # ================= FETCH DETAILS =================
 # ================= FETCH DETAILS =================
 async def fetch_booking_details(session, P, booking_no):
-    url = "https://www.oyoos.com/hms_ms/api/v1/visibility/booking_details_with_entities"
-    params = {
-        "qid": P["QID"],
-        "booking_id": booking_no,
-        "role": 0,
-        "platform": "OYOOS",
-        "country_code": 1
-    }
-    cookies = {"uif": P["UIF"], "uuid": P["UUID"]}
-    headers = {
-        "accept": "application/json",
-        "content-type": "application/json",
-        "x-qid": str(P["QID"]),
-        "x-source-client": "merchant"
-    }
-
-    for attempt in range(1, 4):
-        try:
-            async with session.get(
-                url,
-                params=params,
-                headers=headers,
-                cookies=cookies,
-                timeout=DETAIL_TIMEOUT
-            ) as r:
-                if r.status != 200:
-                    raise RuntimeError("DETAIL API FAILED")
-
-                data = await r.json()
-                booking = next(
-                    iter(data.get("entities", {}).get("bookings", {}).values()),
-                    {}
-                )
-                payments = booking.get("payments", [])
-
-                payment_events = []
-
-                for p in payments:
-                    mode = p.get("mode", "")
-                    amt = float(p.get("amount", 0) or 0)
+    data = await fetch_booking_details_raw(session, P, booking_no)
 
-                    # 🔥 SKIP ZERO AMOUNT ENTRIES
-                    if amt <= 0:
-                        continue
-
-
-                    created_at = str(p.get("created_at") or "").strip()
-                    if not created_at:
-                        continue
+    booking = next(
+        iter(data.get("entities", {}).get("bookings", {}).values()),
+        {}
+    )
+    payments = booking.get("payments", [])
 
-                    try:
-                        dt = datetime.fromisoformat(created_at.replace("Z", ""))
-                        dt = dt.astimezone(IST)
-                    except Exception:
-                        continue
+    payment_events = []
 
-                    pay_date = dt.strftime("%Y-%m-%d")
-                    pay_time = dt.strftime("%H:%M")
+    for p in payments:
+        mode = p.get("mode", "")
+        amt = float(p.get("amount", 0) or 0)
 
-                    # ================= CLASSIFICATION =================
-                    if mode == "Cash at Hotel":
-                        bucket = "cash"
-                    elif mode == "UPI QR":
-                        bucket = "qr"
-                    elif mode == "oyo_wizard_discount":
-                        bucket = "discount"
-                    else:
-                        bucket = "online"
+        # 🔥 SKIP ZERO AMOUNT ENTRIES
+        if amt <= 0:
+            continue
 
-                    payment_events.append({
-                        "date": pay_date,
-                        "time": pay_time,
-                        "mode": bucket,
-                        "amt": amt
-                    })
 
-                return payment_events
+        created_at = str(p.get("created_at") or "").strip()
+        if not created_at:
+            continue
 
-        except Exception:
-            await asyncio.sleep(2 + attempt)
-
-    raise RuntimeError("DETAIL FETCH FAILED")
-
-
-# ================= BATCH FETCH =================
-async def fetch_bookings_batch(session, offset, f, t, P):
-    url = "https://www.oyoos.com/hms_ms/api/v1/get_booking_with_ids"
-    params = {
-        "qid": P["QID"],
-        "checkin_from": f,
-        "checkin_till": t,
-        "batch_count": 100,
-        "batch_offset": offset,
-        "visibility_required": "true",
-        "additionalParams": "payment_hold_transaction,guest,stay_details",
-        "decimal_price": "true",
-        "ascending": "true",
-        "sort_on": "checkin_date"
-    }
-    cookies = {"uif": P["UIF"], "uuid": P["UUID"]}
-    headers = {
-        "accept": "application/json",
-        "content-type": "application/json",
-        "x-qid": str(P["QID"]),
-        "x-source-client": "merchant"
-    }
-
-    async with session.get(url, params=params, cookies=cookies, headers=headers, timeout=BATCH_TIMEOUT) as r:
-        if r.status != 200:
-            raise RuntimeError("BATCH API FAILED")
-        return await r.json()
-
-# ================= PROPERTY DETAILS API =================
-async def fetch_property_details(session, P):
-    url = "https://www.oyoos.com/hms_ms/api/v1/location/property-details"
-    params = {"qid": P["QID"]}
-    cookies = {"uif": P["UIF"], "uuid": P["UUID"]}
-    headers = {"accept": "application/json", "x-qid": str(P["QID"]), "x-source-client": "merchant"}
-
-    for attempt in range(1, 4):
         try:
-            async with session.get(url, params=params, cookies=cookies, headers=headers, timeout=20) as r:
-                if r.status != 200:
-                    raise RuntimeError(f"PROPERTY DETAILS API FAILED ({r.status})")
-                data = await r.json()
-                return {
-                    "name": str(data.get("name", "") or "").strip(),
-                    "alternate_name": str(data.get("alternate_name", "") or "").strip(),
-                    "plot_number": str(data.get("plot_number", "") or "").strip(),
-                    "street": str(data.get("street", "") or "").strip(),
-                    "pincode": str(data.get("pincode", "") or "").strip(),
-                    "city": str(data.get("city", "") or "").strip(),
-                    "country": str(data.get("country", "") or "").strip(),
-                    "map_link": str(data.get("map_link", "") or "").strip(),
-                }
+            dt = datetime.fromisoformat(created_at.replace("Z", ""))
+            dt = dt.astimezone(IST)
         except Exception:
-            await asyncio.sleep(2 + attempt)
+            continue
 
-    return {"name":"","alternate_name":"","plot_number":"","street":"","pincode":"","city":"","country":"","map_link":""}
+        pay_date = dt.strftime("%Y-%m-%d")
+        pay_time = dt.strftime("%H:%M")
+
+        # ================= CLASSIFICATION =================
+        if mode == "Cash at Hotel":
+            bucket = "cash"
+        elif mode == "UPI QR":
+            bucket = "qr"
+        elif mode == "oyo_wizard_discount":
+            bucket = "discount"
+        else:
+            bucket = "online"
+
+        payment_events.append({
+            "date": pay_date,
+            "time": pay_time,
+            "mode": bucket,
+            "amt": amt
+        })
 
-# ================= FETCH TOTAL ROOMS =================
-async def fetch_total_rooms(session, P):
-    url = "https://www.oyoos.com/hms_ms/api/v1/hotels/roomsNew"
-    params = {"qid": P["QID"]}
-    cookies = {"uif": P["UIF"], "uuid": P["UUID"]}
-    headers = {"accept": "application/json", "x-qid": str(P["QID"]), "x-source-client": "merchant"}
+    return payment_events
 
-    for attempt in range(1, 4):
-        try:
-            async with session.get(url, params=params, cookies=cookies, headers=headers, timeout=ROOMS_TIMEOUT) as r:
-                if r.status != 200:
-                    raise RuntimeError("ROOM API FAILED")
-                data = await r.json()
-                rooms = data.get("rooms", {})
-                return len(rooms)
-        except Exception:
-            await asyncio.sleep(2 + attempt)
-
-    return 0
 
 # ================= PROCESS PROPERTY =================
 # ================= PROCESS PROPERTY =================
@@ -611,114 +372,128 @@ async def process_property(P, TF, TT, HF, HT):
     tf_dt = datetime.strptime(TF, "%Y-%m-%d").date()
     tt_dt = datetime.strptime(TT, "%Y-%m-%d").date()
 
-    async with aiohttp.ClientSession() as session:
+    async with shared_session() as session:
         total_rooms = await fetch_total_rooms(session, P)
         prop_details = await fetch_property_details(session, P)
 
-        detail_semaphore = asyncio.Semaphore(DETAIL_PARALLEL_LIMIT)
         detail_cache = {}
 
+        # concurrency comes from the run-wide adaptive OYO limiter (rate_control)
         async def limited_detail_call(booking_no):
-            async with detail_semaphore:
-                if booking_no in detail_cache:
-                    return detail_cache[booking_no]
-                res = await fetch_booking_details(session, P, booking_no)
-                detail_cache[booking_no] = res
-                return res
+            if booking_no in detail_cache:
+                return detail_cache[booking_no]
+            res = await fetch_booking_details(session, P, booking_no)
+            detail_cache[booking_no] = res
+            return res
 
         daily_collect = {}
         booking_date_mode_map = {}
 
         offset = 0
-        while True:
-            data = await fetch_bookings_batch(session, offset, HF, HT, P)
-            if not data or not data.get("bookingIds"):
-                break
-
-            bookings = data.get("entities", {}).get("bookings", {})
-            if not bookings:
-                break
+        pipeline = DetailPipeline(limited_detail_call)   # detail calls start as pages arrive
+        pending_pages = []   # per listing page, processed in page order after pagination
+        pages = BookingPages(session, P, HF, HT)   # next pages fetched ahead
 
-            tasks = []
-            mapping = []
+        try:
+            while True:
+                data = await pages.get(offset)
+                if not data or not data.get("bookingIds"):
+                    break
 
-            for b in bookings.values():
-                status = (b.get("status") or "").strip()
-                if status not in ["Checked In", "Checked Out"]:
-                    continue
+                bookings = data.get("entities", {}).get("bookings", {})
+                if not bookings:
+                    break
 
-                booking_no = b.get("booking_no")
-                if not booking_no:
-                    continue
+                tasks = []
+                mapping = []
 
-                tasks.append(limited_detail_call(booking_no))
-                mapping.append(b)
+                for b in bookings.values():
+                    status = (b.get("status") or "").strip()
+                    if status not in ["Checked In", "Checked Out"]:
+                        continue
 
-            results = await asyncio.gather(*tasks, return_exceptions=True)
+                    booking_no = b.get("booking_no")
+                    if not booking_no:
+                        continue
 
-            for res, b in zip(results, mapping):
-                if isinstance(res, Exception):
-                    continue
+                    tasks.append(await pipeline.submit(booking_no))
+                    mapping.append(b)
 
-                payment_events = res or []
-                booking_no = b.get("booking_no")
-                source = get_booking_source(b)
+                pending_pages.append((tasks, mapping))
 
-                for ev in payment_events:
-                    d = ev.get("date")
-                    if not d:
-                        continue
+                if len(data.get("bookingIds", [])) < 100:
+                    break
+                offset += 100
 
-                    try:
-                        d_dt = datetime.strptime(d, "%Y-%m-%d").date()
-                    except Exception:
-                        continue
+            # ================= DETAIL RESULTS (STARTED DURING PAGINATION) =================
+            for tasks, mapping in pending_pages:
+                results = await asyncio.gather(*tasks, return_exceptions=True)
 
-                    if not (tf_dt <= d_dt <= tt_dt):
+                for res, b in zip(results, mapping):
+                    if isinstance(res, Exception):
                         continue
 
-                    if d not in daily_collect:
-                        daily_collect[d] = {
-                            "cash": 0.0,
-                            "qr": 0.0,
-                            "online": 0.0,
-                            "discount": 0.0
-                        }
-
-                    if (d, booking_no) not in booking_date_mode_map:
-                        booking_date_mode_map[(d, booking_no)] = {
-                            "cash": 0.0,
-                            "qr": 0.0,
-                            "online": 0.0,
-                            "discount": 0.0,
-                            "times": set(),
-                            "b": b,
-                            "source": source
-                        }
-
-                    mode = ev.get("mode")
-                    amt = float(ev.get("amt", 0) or 0)
-                    ptime = ev.get("time")
-
-                    if ptime:
-                        booking_date_mode_map[(d, booking_no)]["times"].add(ptime)
-
-                    if mode == "cash":
-                        daily_collect[d]["cash"] += amt
-                        booking_date_mode_map[(d, booking_no)]["cash"] += amt
-                    elif mode == "qr":
-                        daily_collect[d]["qr"] += amt
-                        booking_date_mode_map[(d, booking_no)]["qr"] += amt
-                    elif mode == "discount":
-                        daily_collect[d]["discount"] += amt
-                        booking_date_mode_map[(d, booking_no)]["discount"] += amt
-                    else:
-                        daily_collect[d]["online"] += amt
-                        booking_date_mode_map[(d, booking_no)]["online"] += amt
-
-            if len(data.get("bookingIds", [])) < 100:
-                break
-            offset += 100
+                    payment_events = res or []
+                    booking_no = b.get("booking_no")
+                    source = get_booking_source(b)
+
+                    for ev in payment_events:
+                        d = ev.get("date")
+                        if not d:
+                            continue
+
+                        try:
+                            d_dt = datetime.strptime(d, "%Y-%m-%d").date()
+                        except Exception:
+                            continue
+
+                        if not (tf_dt <= d_dt <= tt_dt):
+                            continue
+
+                        if d not in daily_collect:
+                            daily_collect[d] = {
+                                "cash": 0.0,
+                                "qr": 0.0,
+                                "online": 0.0,
+                                "discount": 0.0
+                            }
+
+                        if (d, booking_no) not in booking_date_mode_map:
+                            booking_date_mode_map[(d, booking_no)] = {
+                                "cash": 0.0,
+                                "qr": 0.0,
+                                "online": 0.0,
+                                "discount": 0.0,
+                                "times": set(),
+                                "b": b,
+                                "source": source
+                            }
+
+                        mode = ev.get("mode")
+                        amt = float(ev.get("amt", 0) or 0)
+                        ptime = ev.get("time")
+
+                        if ptime:
+                            booking_date_mode_map[(d, booking_no)]["times"].add(ptime)
+
+                        if mode == "cash":
+                            daily_collect[d]["cash"] += amt
+                            booking_date_mode_map[(d, booking_no)]["cash"] += amt
+                        elif mode == "qr":
+                            daily_collect[d]["qr"] += amt
+                            booking_date_mode_map[(d, booking_no)]["qr"] += amt
+                        elif mode == "discount":
+                            daily_collect[d]["discount"] += amt
+                            booking_date_mode_map[(d, booking_no)]["discount"] += amt
+                        else:
+                            daily_collect[d]["online"] += amt
+                            booking_date_mode_map[(d, booking_no)]["online"] += amt
+
+            pipeline.record(label=P["name"])
+        finally:
+            # a page that raised (e.g. BOOKING ENTITY EMPTY) → nothing left running
+            pipeline.close()
+            pages.cancel()
 
         # ================= BUILD DATAFRAME =================
         all_rows = []
@@ -777,10 +552,6 @@ async def run_property_with_retry(P, TF, TT, HF, HT, retries=3):
             await asyncio.sleep(2 + attempt * 2)
     raise RuntimeError(f"PROPERTY FAILED → {P['name']}") from last_error
 
-async def run_property_limited(P, TF, TT, HF, HT):
-    async with prop_semaphore:
-        return await run_property_with_retry(P, TF, TT, HF, HT)
-
 # ================= MAIN =================
 async def main():
     print("========================================")
@@ -834,7 +605,7 @@ async def main():
             break
 
         print(f"\n🔁 PARTIAL RUN {run_attempt}/{MAX_FULL_RUN_RETRIES}")
-        tasks = [run_property_limited(P, TF, TT, HF, HT) for P in pending.values()]
+        tasks = [run_property_with_retry(P, TF, TT, HF, HT) for P in pending.values()]
         results = await asyncio.gather(*tasks, return_exceptions=True)
 
         new_pending = {}
@@ -864,12 +635,13 @@ async def main():
     # ================= EXCEL =================
     wb = Workbook()
     wb.remove(wb.active)
+    register_styles(wb)
 
-    all_dfs = []
     consolidated_daily_collect = {}
 
+    all_cubes = []
+
     for name, df, total_rooms, prop_details, daily_collect in valid_results:
-        all_dfs.append(df)
 
         # consolidate daily collection (INCLUDING DISCOUNT)
         for dkey, vals in (daily_collect or {}).items():
@@ -887,39 +659,30 @@ async def main():
             consolidated_daily_collect[dkey]["discount"] += float(vals.get("discount", 0) or 0)
 
         ws = wb.create_sheet(name)
+        cube = BookingCube(df)
+        all_cubes.append(cube)
 
         for r in dataframe_to_rows(df, index=False, header=True):
             ws.append(r)
 
-        beautify(ws)
+        beautify(ws, frame_widths(df))
 
         ws.append([])
         ws.append([])
-        add_payment_tables(ws, df, daily_collect, TF, TT)
+        add_payment_tables(ws, cube, daily_collect, TF, TT)
         add_property_details_box(ws, prop_details)
 
     # ================= CONSOLIDATED SHEET =================
-    big = pd.concat(all_dfs) if all_dfs else pd.DataFrame(columns=[
-        "Date", "Booking Id", "Guest Name", "Status", "Booking Source",
-        "Check In", "Check Out",
-        "Cash", "QR", "Online", "Discount", "Total Paid", "Time"
-    ])
-
+    big_cube = BookingCube.combine(all_cubes)
     ws = wb.create_sheet("CONSOLIDATED STATISTICS")
 
-    add_payment_tables(ws, big, consolidated_daily_collect, TF, TT, title_prefix="CONSOLIDATED — ")
+    add_payment_tables(ws, big_cube, consolidated_daily_collect, TF, TT, title_prefix="CONSOLIDATED — ")
     beautify(ws)
 
     # ================= SEND EXCEL =================
-    buffer = BytesIO()
-    wb.save(buffer)
-    buffer.seek(0)
-
-    await send_telegram_excel_buffer(
-        buffer,
-        filename=f"Collection_{MONTH_LABEL}.xlsx",
-        caption="📊 Date Wise Collection Report (Paid Only)"
-    )
+    with ReportSink(f"Collection_{MONTH_LABEL}.xlsx") as sink:
+        sink.write(wb)
+        await sink.send(send_telegram_excel_buffer, caption="📊 Date Wise Collection Report (Paid Only)")
 
     print("✅ EXCEL SENT TO TELEGRAM")
     return
@@ -928,7 +691,7 @@ async def main():
 # ================= RUN =================
 if __name__ == "__main__":
     try:
-        asyncio.run(main())
+        run(main())
     except Exception as e:
         print("SCRIPT CRASHED")
         print(e)
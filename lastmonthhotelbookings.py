@@ -14,8 +14,10 @@ from openpyxl import Workbook
 from openpyxl.styles import PatternFill, Font, Alignment, Border, Side
 from openpyxl.chart import BarChart, Reference
 from openpyxl.chart.series import DataPoint
-from io import BytesIO
+from report_sink import ReportSink
 import pytz
+from night_frames import nightly_totals
+from oyo_client import shared_session, run, BookingPages
 
 
 IST = pytz.timezone("Asia/Kolkata")
@@ -23,10 +25,6 @@ IST = pytz.timezone("Asia/Kolkata")
 MAX_FULL_RUN_RETRIES = 5
 FULL_RUN_RETRY_DELAY = 10
 
-PROP_PARALLEL_LIMIT = 4
-prop_semaphore = asyncio.Semaphore(PROP_PARALLEL_LIMIT)
-
-BATCH_TIMEOUT = 40
 
 
 # ================= TELEGRAM =================
@@ -57,7 +55,7 @@ async def send_telegram_excel_buffer(buffer, filename, caption=None):
         content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
     )
 
-    async with aiohttp.ClientSession() as session:
+    async with shared_session() as session:
         async with session.post(url, data=data, timeout=120) as resp:
             if resp.status != 200:
                 raise RuntimeError(await resp.text())
@@ -155,47 +153,6 @@ def get_booking_source(b):
     return "OBA"
 
 
-# ================= FETCH BOOKINGS =================
-
-async def fetch_bookings_batch(session, offset, f, t, P):
-
-    url = "https://www.oyoos.com/hms_ms/api/v1/get_booking_with_ids"
-
-    params = {
-        "qid": P["QID"],
-        "checkin_from": f,
-        "checkin_till": t,
-        "batch_count": 100,
-        "batch_offset": offset,
-        "visibility_required": "true",
-        "additionalParams": "payment_hold_transaction,guest,stay_details",
-        "decimal_price": "true",
-        "ascending": "true",
-        "sort_on": "checkin_date"
-    }
-
-    cookies = {"uif": P["UIF"], "uuid": P["UUID"]}
-
-    headers = {
-        "accept": "application/json",
-        "content-type": "application/json",
-        "x-qid": str(P["QID"]),
-        "x-source-client": "merchant"
-    }
-
-    async with session.get(
-        url, params=params, cookies=cookies,
-        headers=headers, timeout=BATCH_TIMEOUT
-    ) as r:
-
-        if r.status != 200:
-            raise RuntimeError("BATCH FAIL")
-
-        return await r.json()
-
-
-
-
 async def process_property(P, TF, TT, HF, HT):
 
     print(f"PROCESSING → {P['name']}")
@@ -217,17 +174,20 @@ async def process_property(P, TF, TT, HF, HT):
 
     # ================= SESSION =================
 
-    async with aiohttp.ClientSession() as session:
+    async with shared_session() as session:
 
         offset = 0
         seen_ids = set()
+        stays = []   # one entry per booking → nights expanded after pagination
 
         empty_retry = 0
         MAX_EMPTY_RETRY = 6
 
+        pages = BookingPages(session, P, HF, HT)   # next pages fetched ahead
+
         while True:
 
-            data = await fetch_bookings_batch(session, offset, HF, HT, P)
+            data = await pages.get(offset)
 
             if not data:
                 break
@@ -291,18 +251,8 @@ async def process_property(P, TF, TT, HF, HT):
                     or 1
                 )
 
-                # iterate stay nights (checkout excluded)
-                stay_day = ci
-
-                while stay_day < co:
-
-                    if tf_dt <= stay_day <= tt_dt:
-
-                        src_key = src if src in date_map[stay_day] else "OBA"
-                            
-                        date_map[stay_day][src_key] += rooms
-
-                    stay_day += timedelta(days=1)
+                # nights are expanded in one vectorized pass below
+                stays.append({"checkin": ci, "checkout": co, "source": src, "rooms": rooms})
 
             # ===== TERMINATION CONDITION =====
 
@@ -317,6 +267,18 @@ async def process_property(P, TF, TT, HF, HT):
                 print(f"⚠️ Offset safety stop → {P['name']}")
                 break
 
+    # ================= NIGHTS → DATE × SOURCE (VECTORIZED) =================
+    sources = list(date_map[tf_dt]) if date_map else []
+
+    for stay in stays:
+        if stay["source"] not in sources:
+            stay["source"] = "OBA"
+
+    pivot = nightly_totals(stays, tf_dt, tt_dt, ["rooms"], by="source", categories=sources)
+
+    for d, counts in pivot.iterrows():
+        date_map[d].update({src: int(v) for src, v in counts.items()})
+
     return (P["name"], date_map)
 
 
@@ -340,10 +302,6 @@ async def run_property_with_retry(P, TF, TT, HF, HT, retries=3):
     raise RuntimeError("PROPERTY FAILED")
 
 
-async def run_property_limited(P, TF, TT, HF, HT):
-    async with prop_semaphore:
-        return await run_property_with_retry(P, TF, TT, HF, HT)
-
 
 
 def autofit_columns(ws):
@@ -435,7 +393,7 @@ async def main():
         print(f"\n🔁 PARTIAL RUN ATTEMPT {run_attempt}/{MAX_FULL_RUN_RETRIES}")
         print(f"⏳ Pending Properties: {len(pending)}")
 
-        tasks = [run_property_limited(P, TF, TT, HF, HT) for P in pending.values()]
+        tasks = [run_property_with_retry(P, TF, TT, HF, HT) for P in pending.values()]
         results = await asyncio.gather(*tasks, return_exceptions=True)
 
         new_pending = {}
@@ -689,15 +647,9 @@ async def main():
 
     # ================= SAVE =================
 
-    buffer = BytesIO()
-    wb.save(buffer)
-    buffer.seek(0)
-
-    await send_telegram_excel_buffer(
-        buffer,
-        filename=f"Bookings_Monthly.xlsx",
-        caption="📊 Date-wise Booking Mode Report"
-    )
+    with ReportSink(f"Bookings_Monthly.xlsx") as sink:
+        sink.write(wb)
+        await sink.send(send_telegram_excel_buffer, caption="📊 Date-wise Booking Mode Report")
 
 
 # ================= RUN =================
@@ -705,7 +657,7 @@ async def main():
 if __name__ == "__main__":
 
     try:
-        asyncio.run(main())
+        run(main())
 
     except Exception:
 
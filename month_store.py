@@ -0,0 +1,215 @@
+# ==============================
+# MONTH STORE (SQLite) FOR THE INCREMENTAL MONTHLY WORKBOOKS
+# BOOKING ROWS OF Bookings_<Month>.xlsx / Collection_<Month>.xlsx KEPT ON DISK
+# ==============================
+#
+# The monthly report used to be its own database: every run parsed the whole
+# workbook back (load_workbook + ws.values per sheet) before appending a day.
+# The store keeps those rows keyed by (report, sheet, Booking Id, Date), so a
+# run reads them back with one indexed SELECT and writes only the new rows.
+#
+#   month_store.load(report, numeric)   → last_date, {sheet: df}  (None if never seeded)
+#   month_store.seed(report, data)      → import an existing workbook once
+#   month_store.append(report, sheet, df)
+#   month_store.commit()                → call after the .xlsx is written
+#   month_store.merge_rows(old, new)    → stored + fetched rows, one sheet
+#
+# OYO_MONTH_UPSERT=1 → a re-fetched (Booking Id, Date) replaces the stored
+# row (late payments / discounts) instead of being dropped as a duplicate
+
+import os
+import json
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+MONTH_STORE_PATH = os.getenv(
+    "OYO_MONTH_STORE", os.path.join(".cache", "month_reports.sqlite")
+)
+UPSERT = os.getenv("OYO_MONTH_UPSERT", "0") == "1"
+
+_conn = None
+
+
+# ================= DB =================
+def _db():
+    global _conn
+
+    if _conn is None:
+        folder = os.path.dirname(MONTH_STORE_PATH)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+
+        _conn = sqlite3.connect(MONTH_STORE_PATH, timeout=30)
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.execute("PRAGMA synchronous=NORMAL")
+        _conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS sheets (
+                report  TEXT NOT NULL,
+                sheet   TEXT NOT NULL,
+                columns TEXT NOT NULL,
+                PRIMARY KEY (report, sheet)
+            );
+
+            CREATE TABLE IF NOT EXISTS rows (
+                report     TEXT NOT NULL,
+                sheet      TEXT NOT NULL,
+                booking_id TEXT NOT NULL,
+                day        TEXT NOT NULL,
+                payload    TEXT NOT NULL,
+                PRIMARY KEY (report, sheet, booking_id, day)
+            );
+            """
+        )
+        _conn.commit()
+
+    return _conn
+
+
+def commit():
+    """publish this run's rows (only once the workbook itself is on disk)"""
+    if _conn is not None:
+        _conn.commit()
+
+
+def close():
+    global _conn
+
+    if _conn is not None:
+        _conn.close()
+        _conn = None
+
+
+def report_key(report_file):
+    """Bookings_October 2026.xlsx → Bookings_October 2026"""
+    return os.path.splitext(os.path.basename(report_file))[0]
+
+
+# ================= READ =================
+def load(report_file, numeric=()):
+    """
+    Same shape as load_existing_report():
+    last_date, {sheet: df} with Date as date objects and numeric columns filled
+    → None when this month was never stored
+    """
+    report = report_key(report_file)
+    db = _db()
+
+    sheets = db.execute(
+        "SELECT sheet, columns FROM sheets WHERE report = ?", (report,)
+    ).fetchall()
+
+    if not sheets:
+        return None
+
+    existing_data = {}
+    last_date = None
+
+    for sheet, columns in sheets:
+        columns = json.loads(columns)
+
+        # rowid = insertion order → same row order the workbook had
+        records = [
+            json.loads(payload)
+            for (payload,) in db.execute(
+                "SELECT payload FROM rows WHERE report = ? AND sheet = ? ORDER BY rowid",
+                (report, sheet),
+            )
+        ]
+
+        if not records:
+            continue
+
+        df = pd.DataFrame(records, columns=columns)
+        df["Date"] = pd.to_datetime(df["Date"], errors="coerce").dt.date
+
+        sheet_last = df["Date"].max()
+        if last_date is None or sheet_last > last_date:
+            last_date = sheet_last
+
+        for col in numeric:
+            if col in df.columns:
+                df[col] = pd.to_numeric(df[col], errors="coerce").fillna(0)
+
+        existing_data[sheet] = df
+
+    print(f"📦 MONTH STORE → {report} :: {sum(len(d) for d in existing_data.values())} rows, last day {last_date}")
+    return last_date, existing_data
+
+
+# ================= WRITE =================
+def append(report_file, sheet, df, upsert=UPSERT):
+    """
+    Add a sheet's booking rows; a (Booking Id, Date) already stored is kept
+    as is, or replaced with upsert (same rule as merge_rows).
+    Uncommitted until commit().
+    """
+    if df is None or df.empty or "Booking Id" not in df.columns or "Date" not in df.columns:
+        return 0
+
+    report = report_key(report_file)
+    db = _db()
+
+    db.execute(
+        "INSERT OR IGNORE INTO sheets (report, sheet, columns) VALUES (?, ?, ?)",
+        (report, sheet, json.dumps([str(c) for c in df.columns])),
+    )
+
+    days = pd.to_datetime(df["Date"], errors="coerce")
+    df = df[days.notna()]
+    days = days[days.notna()].dt.strftime("%Y-%m-%d")
+
+    payloads = json.loads(df.assign(Date=days).to_json(orient="values"))
+
+    before = db.total_changes
+    db.executemany(
+        f"INSERT OR {'REPLACE' if upsert else 'IGNORE'} INTO rows "
+        "(report, sheet, booking_id, day, payload) VALUES (?, ?, ?, ?, ?)",
+        [
+            (report, sheet, str(bid), day, json.dumps(values))
+            for bid, day, values in zip(df["Booking Id"], days, payloads)
+        ],
+    )
+    return db.total_changes - before
+
+
+def seed(report_file, existing_data):
+    """one-time import of the rows parsed from an existing workbook"""
+    added = sum(append(report_file, sheet, df, upsert=False) for sheet, df in existing_data.items())
+    print(f"📦 MONTH STORE → seeded {report_key(report_file)} with {added} rows")
+
+
+# ================= MERGE =================
+def _key_codes(old_df, df):
+    """
+    (Booking Id, Date) → one int64 per row, factorized over both frames
+    together so equal keys get equal codes
+    """
+    ids, _ = pd.factorize(pd.concat([old_df["Booking Id"], df["Booking Id"]], ignore_index=True))
+    days, _ = pd.factorize(pd.concat([old_df["Date"], df["Date"]], ignore_index=True))
+
+    codes = ids.astype(np.int64) * (int(days.max()) + 2) + days
+    return codes[:len(old_df)], codes[len(old_df):]
+
+
+def merge_rows(old_df, df, upsert=UPSERT):
+    """
+    stored rows + fetched rows as one anti-join on (Booking Id, Date):
+    default keeps the stored row, upsert keeps the fetched one
+    (replaced rows move to the end, the same order the store reads back)
+    """
+    if old_df is None or old_df.empty:
+        return df
+    if df.empty:
+        return old_df
+
+    old_keys, new_keys = _key_codes(old_df, df)
+
+    if upsert:
+        old_df = old_df[~np.isin(old_keys, new_keys)]
+    else:
+        df = df[~np.isin(new_keys, old_keys)]
+
+    return pd.concat([old_df, df], ignore_index=True)
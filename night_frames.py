@@ -0,0 +1,84 @@
+# ==============================
+# VECTORIZED STAY-NIGHT EXPANSION
+# BOOKINGS FRAME → PER-NIGHT FRAME → DATE TOTALS / DATE × SOURCE PIVOT
+# ==============================
+#
+# Same night rule as the old loops: ci <= night < co, clipped to start..end.
+
+import numpy as np
+import pandas as pd
+
+ONE_DAY = np.timedelta64(1, "D")
+
+
+def _days(values):
+    return pd.to_datetime(pd.Series(values)).values.astype("datetime64[D]")
+
+
+def expand_nights(bookings, start, end, ci="checkin", co="checkout"):
+    """
+    One row per (booking, night) inside start..end (index arithmetic, no loop).
+    Adds:
+      night     = the stay night (datetime64)
+      stay_days = full stay length (>= 1), for per-night splits
+    """
+    if bookings.empty:
+        return bookings.assign(
+            night=pd.Series(dtype="datetime64[ns]"),
+            stay_days=pd.Series(dtype="int64"),
+        )
+
+    ci_d = _days(bookings[ci])
+    co_d = _days(bookings[co])
+    start = np.datetime64(pd.Timestamp(start).date(), "D")
+    end = np.datetime64(pd.Timestamp(end).date(), "D")
+
+    first = np.maximum(ci_d, start)
+    last = np.minimum(co_d - ONE_DAY, end)
+    counts = np.clip((last - first).astype(np.int64) + 1, 0, None)
+
+    rows = np.repeat(np.arange(len(bookings)), counts)
+    # position of each night inside its own booking: 0, 1, 2 ...
+    step = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+
+    out = bookings.iloc[rows].reset_index(drop=True)
+    out["night"] = pd.to_datetime(np.repeat(first, counts) + step.astype("timedelta64[D]"))
+    out["stay_days"] = np.maximum((co_d - ci_d).astype(np.int64), 1)[rows]
+    return out
+
+
+def nightly_totals(bookings, start, end, columns, split=(), by=None, categories=None):
+    """
+    Per-date totals over every date in start..end (missing dates = 0).
+
+      bookings   = DataFrame or list of dicts with checkin, checkout (+ columns, by)
+      columns    = value columns to sum per night
+      split      = subset of columns that are whole-stay amounts (÷ stay_days)
+      by         = optional category column → date × category pivot of columns[0]
+      categories = fixed pivot columns (anything else is dropped)
+
+    Index is python `date` objects, ready for the scripts' date_map keys.
+    """
+    columns = list(columns)
+    if not isinstance(bookings, pd.DataFrame):
+        keep = ["checkin", "checkout"] + columns + ([by] if by else [])
+        bookings = pd.DataFrame(bookings, columns=keep)
+
+    dates = pd.date_range(pd.Timestamp(start).normalize(), pd.Timestamp(end).normalize(), freq="D")
+    nights = expand_nights(bookings, start, end)
+
+    for col in split:
+        nights[col] = nights[col] / nights["stay_days"]
+
+    if by is None:
+        out = nights.groupby("night")[columns].sum()
+    else:
+        out = nights.pivot_table(
+            index="night", columns=by, values=columns[0], aggfunc="sum", fill_value=0
+        )
+        if categories is not None:
+            out = out.reindex(columns=categories, fill_value=0)
+
+    out = out.reindex(dates, fill_value=0)
+    out.index = out.index.date
+    return out
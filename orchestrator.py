@@ -0,0 +1,236 @@
+# ==============================
+# SINGLE FETCH, MANY REPORTS
+# ONE API SWEEP PER PROPERTY → EVERY CHOSEN REPORT SCRIPT
+# ==============================
+#
+#   python orchestrator.py 6am 7am cqot collection
+#   python orchestrator.py --days 125 hourly revenue bookings
+#
+# Each report script runs unchanged (its own Excel / Telegram output).
+# oyo_client serves every listing / detail / rooms / property call from
+# the in-memory dataset, so the second report onwards costs no API calls.
+
+import os
+import sys
+import json
+import asyncio
+import importlib
+from datetime import datetime, timedelta
+
+import pytz
+
+import oyo_client
+from oyo_client import (
+    BATCH_SIZE,
+    shared_session,
+    run,
+    fetch_bookings_window,
+    fetch_booking_details_live,
+    fetch_property_details_live,
+    fetch_total_rooms_live,
+)
+
+IST = pytz.timezone("Asia/Kolkata")
+
+REPORTS = [
+    "1am", "6am", "7am", "6pm", "7pm", "hourly",
+    "collection", "cqot", "cash", "revenue", "bookings",
+]
+
+# widest window any report asks for (6pm / 7pm / revenue: target_date - 120)
+PREFETCH_DAYS = 125
+PREFETCH_PARALLEL_LIMIT = 3
+
+
+# ================= IN-MEMORY DATASET =================
+class Dataset:
+    """
+    Per QID:
+      windows  = check-in ranges fully listed so far [(f, t)]
+      bookings = {booking_id: booking}
+      details  = {booking_no: booking_details_with_entities payload}
+    """
+
+    def __init__(self):
+        self.windows = {}
+        self.bookings = {}
+        self.details = {}
+        self.rooms = {}
+        self.props = {}
+        self.locks = {}
+        self.api_calls = 0
+        self.replayed = 0
+
+    def _lock(self, key):
+        if key not in self.locks:
+            self.locks[key] = asyncio.Lock()
+        return self.locks[key]
+
+    def _covered(self, qid, f, t):
+        return any(wf <= f and t <= wt for wf, wt in self.windows.get(qid, []))
+
+    # ---------- listings ----------
+    async def load_window(self, session, P, f, t):
+        qid = str(P["QID"])
+
+        async with self._lock(("window", qid)):
+            if self._covered(qid, f, t):
+                return
+
+            live = await fetch_bookings_window(session, P, f, t, live=True)
+            self.api_calls += 1
+
+            self.bookings.setdefault(qid, {}).update(live)
+            self.windows.setdefault(qid, []).append((f, t))
+
+    async def bookings_batch(self, session, offset, f, t, P):
+        """same page shape as get_booking_with_ids (ascending check-in)"""
+        qid = str(P["QID"])
+
+        if not self._covered(qid, f, t):
+            await self.load_window(session, P, f, t)
+        else:
+            self.replayed += 1
+
+        rows = sorted(
+            (
+                (str(b.get("checkin", "")), str(key), b)
+                for key, b in self.bookings.get(qid, {}).items()
+                if f <= str(b.get("checkin", "")) <= t
+            ),
+            key=lambda r: (r[0], r[1]),
+        )
+        page = rows[offset:offset + BATCH_SIZE]
+
+        return {
+            "bookingIds": [key for _, key, _ in page],
+            "entities": {"bookings": {key: b for _, key, b in page}},
+        }
+
+    # ---------- details ----------
+    async def booking_details(self, session, P, booking_no):
+        key = (str(P["QID"]), str(booking_no))
+
+        if key in self.details:
+            self.replayed += 1
+            return self.details[key]
+
+        async with self._lock(("detail",) + key):
+            if key not in self.details:
+                self.details[key] = await fetch_booking_details_live(session, P, booking_no)
+                self.api_calls += 1
+            else:
+                self.replayed += 1
+
+        return self.details[key]
+
+    # ---------- property level ----------
+    async def total_rooms(self, session, P):
+        qid = str(P["QID"])
+
+        async with self._lock(("rooms", qid)):
+            if self.rooms.get(qid):
+                self.replayed += 1
+            else:
+                self.rooms[qid] = await fetch_total_rooms_live(session, P)
+                self.api_calls += 1
+
+        return self.rooms[qid]
+
+    async def property_details(self, session, P):
+        qid = str(P["QID"])
+
+        async with self._lock(("props", qid)):
+            if self.props.get(qid, {}).get("name"):
+                self.replayed += 1
+            else:
+                self.props[qid] = await fetch_property_details_live(session, P)
+                self.api_calls += 1
+
+        return dict(self.props[qid])
+
+    def summary(self):
+        listed = sum(len(v) for v in self.bookings.values())
+        return (
+            f"🧺 DATASET → bookings={listed} details={len(self.details)} "
+            f"api_sweeps={self.api_calls} replayed={self.replayed}"
+        )
+
+
+# ================= PREFETCH =================
+async def prefetch(ds, days):
+    properties = json.loads(os.getenv("OYO_PROPERTIES", "{}"))
+
+    if not properties:
+        raise RuntimeError("❌ OYO_PROPERTIES secret missing or empty")
+
+    today = datetime.now(IST).date()
+    f = (today - timedelta(days=days)).strftime("%Y-%m-%d")
+    t = today.strftime("%Y-%m-%d")
+
+    sem = asyncio.Semaphore(PREFETCH_PARALLEL_LIMIT)
+
+    async def one(P):
+        async with sem:
+            async with shared_session() as session:
+                await ds.load_window(session, P, f, t)
+                await ds.total_rooms(session, P)
+                await ds.property_details(session, P)
+            print(f"📥 PREFETCHED → {P['name']} ({f} → {t})")
+
+    await asyncio.gather(*(one(P) for P in properties.values()))
+
+
+# ================= RUN REPORTS =================
+async def run_reports(names, days):
+    ds = Dataset()
+    oyo_client.use_dataset(ds)
+
+    failed = []
+
+    try:
+        await prefetch(ds, days)
+
+        for name in names:
+            print("\n========================================")
+            print(f" ▶ REPORT: {name}")
+            print("========================================")
+
+            try:
+                module = importlib.import_module(name)
+                await module.main()
+            except Exception as e:
+                print(f"❌ REPORT FAILED → {name} :: {e}")
+                failed.append(name)
+
+        print(ds.summary())
+    finally:
+        oyo_client.use_dataset(None)
+
+    if failed:
+        raise RuntimeError(f"REPORTS FAILED: {failed}")
+
+
+def parse_args(argv):
+    days = PREFETCH_DAYS
+    names = []
+
+    args = iter(argv)
+    for a in args:
+        if a == "--days":
+            days = int(next(args))
+        else:
+            names.append(a[:-3] if a.endswith(".py") else a)
+
+    unknown = [n for n in names if n not in REPORTS]
+    if not names or unknown:
+        print("usage: python orchestrator.py [--days N] REPORT [REPORT ...]")
+        print(f"reports: {' '.join(REPORTS)}")
+        sys.exit(1)
+
+    return names, days
+
+
+if __name__ == "__main__":
+    names, days = parse_args(sys.argv[1:])
+    run(run_reports(names, days))
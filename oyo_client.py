@@ -0,0 +1,417 @@
+# ==============================
+# SHARED OYO API CLIENT
+# ONE POOLED aiohttp SESSION PER RUN
+# ==============================
+
+import os
+import asyncio
+import aiohttp
+from contextlib import asynccontextmanager
+
+import detail_cache
+import rate_control
+from rate_control import backoff, limiter_for
+
+OYO_API = "https://www.oyoos.com/hms_ms/api/v1"
+
+# ================= TIMEOUTS =================
+DETAIL_TIMEOUT = 25
+ROOMS_TIMEOUT = 25
+BATCH_TIMEOUT = 35
+PROPERTY_TIMEOUT = 20
+
+BATCH_SIZE = 100
+
+# listing pages requested ahead of the one being processed
+PAGE_PREFETCH = int(os.getenv("OYO_PAGE_PREFETCH", "4"))
+
+# ================= CONNECTION POOL =================
+CONN_LIMIT = 100            # total open sockets (OYO + Telegram)
+CONN_LIMIT_PER_HOST = 30    # per host (oyoos.com / api.telegram.org)
+DNS_CACHE_TTL = 600         # seconds
+KEEPALIVE_TIMEOUT = 60      # keep idle TLS connections for reuse
+
+_session = None
+
+
+def get_session():
+    """
+    Returns the run-wide pooled session (created on first use, inside the loop).
+    Cookies are sent per request, so the jar is disabled to keep
+    property logins (uif/uuid) from leaking between properties.
+    """
+    global _session
+
+    if _session is None or _session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=CONN_LIMIT,
+            limit_per_host=CONN_LIMIT_PER_HOST,
+            ttl_dns_cache=DNS_CACHE_TTL,
+            use_dns_cache=True,
+            keepalive_timeout=KEEPALIVE_TIMEOUT,
+            enable_cleanup_closed=True,
+        )
+        _session = aiohttp.ClientSession(
+            connector=connector,
+            cookie_jar=aiohttp.DummyCookieJar(),
+        )
+
+    return _session
+
+
+@asynccontextmanager
+async def shared_session():
+    """
+    Drop-in for `async with aiohttp.ClientSession() as session:`
+    (the session is NOT closed on exit — it lives for the whole run)
+    """
+    yield get_session()
+
+
+async def close_session():
+    global _session
+
+    if _session is not None and not _session.closed:
+        await _session.close()
+        # let the connector finish closing TLS transports
+        await asyncio.sleep(0.25)
+
+    _session = None
+
+
+def run(coro):
+    """asyncio.run(...) that always closes the pooled session at the end"""
+
+    async def _runner():
+        try:
+            return await coro
+        finally:
+            await close_session()
+            detail_cache.close()
+            for line in rate_control.summaries():
+                print(line)
+
+    return asyncio.run(_runner())
+
+
+# ================= REPLAY SEAM =================
+# orchestrator.py installs an in-memory dataset here: every fetch_* below
+# is then served from it (filled on first use) instead of hitting the API
+_dataset = None
+
+
+def use_dataset(ds):
+    global _dataset
+    _dataset = ds
+
+
+# ================= AUTH =================
+def oyo_auth(P, json_body=True):
+    cookies = {"uif": P["UIF"], "uuid": P["UUID"]}
+    headers = {
+        "accept": "application/json",
+        "x-qid": str(P["QID"]),
+        "x-source-client": "merchant"
+    }
+    if json_body:
+        headers["content-type"] = "application/json"
+    return headers, cookies
+
+
+async def oyo_get_json(session, P, url, params, timeout, error="OYO API FAILED", json_body=True):
+    """
+    single GET (no retry) → parsed JSON, raises on non-200
+    every OYO call takes a slot from the run-wide per-host scheduler,
+    queued fairly per property (QID)
+    """
+    headers, cookies = oyo_auth(P, json_body=json_body)
+
+    async with limiter_for(url).slot(flow=str(P["QID"])) as slot:
+        async with session.get(
+            url, params=params, headers=headers, cookies=cookies, timeout=timeout
+        ) as r:
+            if r.status != 200:
+                if r.status == 429 or r.status >= 500:
+                    slot.throttled()
+                raise RuntimeError(f"{error} ({r.status})")
+            return await r.json()
+
+
+# ================= FETCH DETAILS =================
+async def fetch_booking_details_raw(session, P, booking_no):
+    """booking_details_with_entities payload"""
+    if _dataset is not None:
+        return await _dataset.booking_details(session, P, booking_no)
+
+    return await fetch_booking_details_live(session, P, booking_no)
+
+
+async def fetch_booking_details_live(session, P, booking_no):
+    """persistent cache, then 3 attempts"""
+    cached = detail_cache.get(P, booking_no)
+    if cached is not None:
+        return cached
+
+    url = f"{OYO_API}/visibility/booking_details_with_entities"
+    params = {
+        "qid": P["QID"],
+        "booking_id": booking_no,
+        "role": 0,
+        "platform": "OYOOS",
+        "country_code": 1
+    }
+
+    for attempt in range(1, 4):
+        try:
+            data = await oyo_get_json(
+                session, P, url, params, DETAIL_TIMEOUT, error="DETAIL API FAILED"
+            )
+        except Exception:
+            await backoff(attempt)
+            continue
+
+        detail_cache.put(P, booking_no, data)
+        return data
+
+    raise RuntimeError("DETAIL FETCH FAILED")
+
+
+def parse_booking_details(data):
+    """→ rooms, cash, qr, online, discount, balance"""
+    rooms = []
+    stay = data.get("entities", {}).get("stayDetails", {})
+    for s in stay.values():
+        rn = s.get("room_number")
+        if rn:
+            rooms.append(rn)
+
+    booking = next(iter(data.get("entities", {}).get("bookings", {}).values()), {})
+    payments = booking.get("payments", [])
+
+    cash = qr = online = discount = 0
+    for p in payments:
+        mode = p.get("mode", "")
+        amt = float(p.get("amount", 0))
+        if mode == "oyo_wizard_discount":
+            discount += amt
+        elif mode == "Cash at Hotel":
+            cash += amt
+        elif mode == "UPI QR":
+            qr += amt
+        else:
+            online += amt
+
+    balance = booking.get("payable_amount", 0)
+    return rooms, cash, qr, online, discount, balance
+
+
+async def fetch_booking_details(session, P, booking_no):
+    data = await fetch_booking_details_raw(session, P, booking_no)
+    return parse_booking_details(data)
+
+
+# ================= BATCH FETCH =================
+async def fetch_bookings_batch(session, offset, f, t, P, timeout=BATCH_TIMEOUT):
+    if _dataset is not None:
+        return await _dataset.bookings_batch(session, offset, f, t, P)
+
+    return await fetch_bookings_batch_live(session, offset, f, t, P, timeout=timeout)
+
+
+async def fetch_bookings_batch_live(session, offset, f, t, P, timeout=BATCH_TIMEOUT):
+    url = f"{OYO_API}/get_booking_with_ids"
+    params = {
+        "qid": P["QID"],
+        "checkin_from": f,
+        "checkin_till": t,
+        "batch_count": BATCH_SIZE,
+        "batch_offset": offset,
+        "visibility_required": "true",
+        "additionalParams": "payment_hold_transaction,guest,stay_details",
+        "decimal_price": "true",
+        "ascending": "true",
+        "sort_on": "checkin_date"
+    }
+
+    data = await oyo_get_json(session, P, url, params, timeout, error="BATCH API FAILED")
+
+    if data:
+        # current status / amounts decide which cached details are still valid
+        detail_cache.note_listing(P, data.get("entities", {}).get("bookings", {}))
+
+    return data
+
+
+# ================= CONCURRENT PAGINATION =================
+def _consume(task):
+    # prefetched page nobody awaited (loop broke early) → no "never retrieved" noise
+    if not task.cancelled():
+        task.exception()
+
+
+class BookingPages:
+    """
+    get_booking_with_ids pages for one window, `depth` offsets requested ahead
+
+        pages = BookingPages(session, P, HF, HT)
+        data = await pages.get(offset)      # offset = 0, 100, 200 ...
+
+    Prefetch starts only after a full page (small windows cost one call)
+    and stops at the first short / empty page.
+    """
+
+    def __init__(self, session, P, f, t, depth=PAGE_PREFETCH, timeout=BATCH_TIMEOUT, live=False):
+        self.session = session
+        self.P = P
+        self.f = f
+        self.t = t
+        self.depth = max(0, depth)
+        self.timeout = timeout
+        self.fetch_batch = fetch_bookings_batch_live if live else fetch_bookings_batch
+        self.tasks = {}
+        self.end = None   # offset of the last (short) page once known
+
+    def _schedule(self, offset):
+        if offset in self.tasks or (self.end is not None and offset > self.end):
+            return
+
+        task = asyncio.ensure_future(
+            self.fetch_batch(self.session, offset, self.f, self.t, self.P, timeout=self.timeout)
+        )
+        task.add_done_callback(_consume)
+        self.tasks[offset] = task
+
+    def cancel(self):
+        for task in self.tasks.values():
+            task.cancel()
+        self.tasks.clear()
+
+    async def get(self, offset):
+        self._schedule(offset)
+
+        try:
+            data = await self.tasks.pop(offset)
+        except BaseException:
+            self.cancel()
+            raise
+
+        if not data or len(data.get("bookingIds") or []) < BATCH_SIZE:
+            self.end = offset
+            self.cancel()
+        else:
+            for k in range(1, self.depth + 1):
+                self._schedule(offset + k * BATCH_SIZE)
+
+        return data
+
+
+# ================= FULL WINDOW LISTING =================
+async def fetch_bookings_window(session, P, f, t, timeout=BATCH_TIMEOUT, live=False):
+    """
+    Pages get_booking_with_ids over check-ins f..t
+    → {booking_id: booking} (deduplicated across pages)
+    """
+    pages = BookingPages(session, P, f, t, timeout=timeout, live=live)
+    bookings = {}
+    offset = 0
+
+    while True:
+        data = await pages.get(offset)
+
+        if not data or not data.get("bookingIds"):
+            break
+
+        page = data.get("entities", {}).get("bookings", {})
+
+        if not page:
+            pages.cancel()
+            raise RuntimeError("BOOKING ENTITY EMPTY")
+
+        bookings.update(page)
+
+        if len(data["bookingIds"]) < BATCH_SIZE:
+            break
+
+        offset += BATCH_SIZE
+
+    return bookings
+
+
+# ================= PROPERTY DETAILS API =================
+EMPTY_PROPERTY_DETAILS = {
+    "name": "",
+    "alternate_name": "",
+    "plot_number": "",
+    "street": "",
+    "pincode": "",
+    "city": "",
+    "country": "",
+    "map_link": "",
+    "latitude": None,
+    "longitude": None,
+}
+
+
+async def fetch_property_details(session, P):
+    """
+    Fetches:
+    name, alternate_name, address fields, map_link
+    """
+    if _dataset is not None:
+        return await _dataset.property_details(session, P)
+
+    return await fetch_property_details_live(session, P)
+
+
+async def fetch_property_details_live(session, P):
+    url = f"{OYO_API}/location/property-details"
+    params = {"qid": P["QID"]}
+
+    for attempt in range(1, 4):
+        try:
+            data = await oyo_get_json(
+                session, P, url, params, PROPERTY_TIMEOUT,
+                error="PROPERTY DETAILS API FAILED", json_body=False
+            )
+            return {
+                "name": str(data.get("name", "") or "").strip(),
+                "alternate_name": str(data.get("alternate_name", "") or "").strip(),
+                "plot_number": str(data.get("plot_number", "") or "").strip(),
+                "street": str(data.get("street", "") or "").strip(),
+                "pincode": str(data.get("pincode", "") or "").strip(),
+                "city": str(data.get("city", "") or "").strip(),
+                "country": str(data.get("country", "") or "").strip(),
+                "map_link": str(data.get("map_link", "") or "").strip(),
+                "latitude": data.get("latitude", None),
+                "longitude": data.get("longitude", None),
+            }
+        except Exception:
+            await backoff(attempt)
+
+    # fallback safe empty
+    return dict(EMPTY_PROPERTY_DETAILS)
+
+
+# ================= FETCH TOTAL ROOMS =================
+async def fetch_total_rooms(session, P):
+    if _dataset is not None:
+        return await _dataset.total_rooms(session, P)
+
+    return await fetch_total_rooms_live(session, P)
+
+
+async def fetch_total_rooms_live(session, P):
+    url = f"{OYO_API}/hotels/roomsNew"
+    params = {"qid": P["QID"]}
+
+    for attempt in range(1, 4):
+        try:
+            data = await oyo_get_json(
+                session, P, url, params, ROOMS_TIMEOUT, error="ROOM API FAILED", json_body=False
+            )
+            rooms = data.get("rooms", {})
+            return len(rooms)
+        except Exception:
+            await backoff(attempt)
+
+    return 0
@@ -0,0 +1,73 @@
+# ==============================
+# STREAMED PARTIAL-RETRY RUNS
+# YIELD EACH PROPERTY THE MOMENT IT SUCCEEDS, RETRY ONLY THE FAILED ONES
+# ==============================
+#
+#   async for key, result in stream_properties(PROPERTIES, lambda P: run_property_with_retry(P, ...)):
+#       await send_telegram_message(build(result))     → out while others still fetch
+#
+# Same rounds as the scripts' SMART RETRY loop (MAX_FULL_RUN_RETRIES rounds,
+# FULL_RUN_RETRY_DELAY between them, FINAL FAILURE after the last), but a
+# round is read with as_completed instead of one gather over every property,
+# so a fast property is not held back by the slowest one or by retry rounds.
+# Results come in completion order; callers index them by key for the
+# PROPERTIES-ordered consolidated report.
+
+import asyncio
+
+
+async def _keyed(key, runner, P):
+    """(key, result, None) or (key, None, error) → one failure never ends the round"""
+    try:
+        return key, await runner(P), None
+    except Exception as e:
+        return key, None, e
+
+
+async def stream_properties(properties, runner, retries=5, delay=10, check=None):
+    """
+    runner(P)     → awaitable result of one property
+    check(result) → error text when a finished result is unusable (retried like a failure)
+    raises RuntimeError once properties are still failing after the last round
+    """
+    pending = dict(properties)
+
+    for run_attempt in range(1, retries + 1):
+        if not pending:
+            break
+
+        print(f"\n🔁 PARTIAL RUN ATTEMPT {run_attempt}/{retries}")
+        print(f"⏳ Pending Properties: {len(pending)}")
+
+        tasks = [asyncio.ensure_future(_keyed(key, runner, P)) for key, P in pending.items()]
+        failed = {}
+
+        try:
+            for done in asyncio.as_completed(tasks):
+                key, result, error = await done
+                P = pending[key]
+
+                if error is None and check is not None:
+                    error = check(result)
+
+                if error is not None:
+                    print(f"❌ FAILED → {P['name']} :: {error}")
+                    failed[key] = P
+                    continue
+
+                print(f"✅ OK → {P['name']}")
+                yield key, result
+        finally:
+            # consumer stopped early (error / break) → no orphaned fetches
+            for t in tasks:
+                t.cancel()
+
+        pending = failed
+
+        if pending:
+            if run_attempt == retries:
+                failed_names = [p["name"] for p in pending.values()]
+                raise RuntimeError(f"FINAL FAILURE: Properties failed after retries: {failed_names}")
+
+            print(f"🔁 RETRYING ONLY FAILED PROPERTIES after {delay}s...")
+            await asyncio.sleep(delay)
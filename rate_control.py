@@ -0,0 +1,158 @@
+# ==============================
+# ADAPTIVE OYO CONCURRENCY (AIMD) + FAIR SCHEDULING + JITTERED BACKOFF
+# ONE CONTROLLER PER HOST, SHARED BY EVERY PROPERTY IN A RUN
+# ==============================
+#
+# fair queuing        → waiting requests are queued per flow (property QID)
+#                       and free slots are handed out round-robin, so a
+#                       3-booking property is never stuck behind an 800-booking one
+# additive increase   → +1 slot per `limit` fast responses
+# hold                → responses slower than SLOW_AFTER do not grow the limit
+# multiplicative cut  → limit halves on 429 / 5xx / timeout / connection error
+#                       (at most once per COOLDOWN, so one burst = one cut)
+
+import os
+import time
+import random
+import asyncio
+from collections import OrderedDict, deque
+from urllib.parse import urlsplit
+from contextlib import asynccontextmanager
+
+import aiohttp
+
+INITIAL_LIMIT = int(os.getenv("OYO_INITIAL_CONCURRENCY", "10"))
+MIN_LIMIT = int(os.getenv("OYO_MIN_CONCURRENCY", "2"))
+MAX_LIMIT = int(os.getenv("OYO_MAX_CONCURRENCY", "48"))
+SLOW_AFTER = float(os.getenv("OYO_SLOW_AFTER", "3.0"))   # seconds
+COOLDOWN = 2.0                                           # seconds between cuts
+
+BACKOFF_BASE = 1.0
+BACKOFF_CAP = 30.0
+
+
+class _Slot:
+    def __init__(self):
+        self.congested = False
+
+    def throttled(self):
+        """mark this request as a congestion signal (429 / 5xx)"""
+        self.congested = True
+
+
+class AdaptiveLimiter:
+    def __init__(self, initial=INITIAL_LIMIT, min_limit=MIN_LIMIT, max_limit=MAX_LIMIT):
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.in_flight = 0
+        self.queues = OrderedDict()   # flow → deque of waiting futures (round-robin order)
+        self.waiting = 0
+        self.last_cut = 0.0
+
+        self.requests = 0
+        self.throttles = 0
+        self.cuts = 0
+        self.peak = int(initial)
+
+    def _dispatch(self):
+        """hand free slots to waiting flows, one request per flow per turn"""
+        while self.queues and self.in_flight < int(self.limit):
+            flow, q = next(iter(self.queues.items()))
+            fut = q.popleft()
+            self.waiting -= 1
+
+            if q:
+                self.queues.move_to_end(flow)
+            else:
+                del self.queues[flow]
+
+            if fut.done():   # waiter was cancelled
+                continue
+
+            self.in_flight += 1
+            fut.set_result(None)
+
+    async def acquire(self, flow=None):
+        if self.in_flight < int(self.limit) and not self.waiting:
+            self.in_flight += 1
+            return
+
+        fut = asyncio.get_running_loop().create_future()
+        self.queues.setdefault(flow, deque()).append(fut)
+        self.waiting += 1
+
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                # slot granted right before the cancel → hand it on
+                self.in_flight -= 1
+                self._dispatch()
+            else:
+                q = self.queues.get(flow)
+                if q and fut in q:
+                    q.remove(fut)
+                    self.waiting -= 1
+                    if not q:
+                        del self.queues[flow]
+            raise
+
+    def release(self, congested, latency):
+        self.requests += 1
+        now = time.monotonic()
+
+        if congested:
+            self.throttles += 1
+            if now - self.last_cut >= COOLDOWN:
+                self.limit = max(self.min_limit, self.limit / 2)
+                self.last_cut = now
+                self.cuts += 1
+        elif latency <= SLOW_AFTER:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self.peak = max(self.peak, int(self.limit))
+
+        self.in_flight -= 1
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, flow=None):
+        await self.acquire(flow)
+        slot = _Slot()
+        start = time.monotonic()
+
+        try:
+            yield slot
+        except (asyncio.TimeoutError, aiohttp.ClientError):
+            slot.congested = True
+            raise
+        finally:
+            self.release(slot.congested, time.monotonic() - start)
+
+    def summary(self, host="OYO"):
+        return (
+            f"🚦 {host} CONCURRENCY → limit={int(self.limit)} peak={self.peak} "
+            f"requests={self.requests} throttled={self.throttles} cuts={self.cuts}"
+        )
+
+
+# one controller per host per process (= per run), shared by all properties
+LIMITERS = {}
+
+
+def limiter_for(url):
+    host = urlsplit(url).netloc
+    if host not in LIMITERS:
+        LIMITERS[host] = AdaptiveLimiter()
+    return LIMITERS[host]
+
+
+def summaries():
+    return [lim.summary(host) for host, lim in LIMITERS.items() if lim.requests]
+
+
+# ================= RETRY BACKOFF =================
+async def backoff(attempt, base=BACKOFF_BASE, cap=BACKOFF_CAP):
+    """exponential with jitter: attempt 1 → 1-2s, 2 → 2-4s, 3 → 4-8s ..."""
+    ceiling = min(cap, base * (2 ** attempt))
+    await asyncio.sleep(random.uniform(ceiling / 2, ceiling))
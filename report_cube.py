@@ -0,0 +1,114 @@
+# ==============================
+# BOOKING AGGREGATE CUBE
+# ONE GROUPBY PER FRAME → EVERY STATS BLOCK AND PAYMENT TABLE
+# ==============================
+#
+# cube = (Date, Booking Source) rows × one column per metric
+#        (Rooms, Amount, Cash, QR, Online, Discount, Balance — whichever the frame has)
+#
+# count() / amt() / sum() and the payment tables read slices of the cube
+# instead of filtering the booking rows again per source and per date.
+# BookingCube.combine() sums property cubes into the consolidated one.
+#
+# count_upcoming() / count_cancelled() → status-window counters as one
+# vectorized predicate over the parsed Date column (no iterrows / strptime)
+
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+SOURCES = ["OYO", "Walk-in", "MMT", "BDC", "Agoda", "CB", "TA", "OBA"]
+KEYS = ["Date", "Booking Source"]
+METRICS = ["Rooms", "Amount", "Cash", "QR", "Online", "Discount", "Balance"]
+
+
+class BookingCube:
+    def __init__(self, df):
+        if df.empty or any(k not in df.columns for k in KEYS):
+            self._load(pd.DataFrame(index=pd.MultiIndex.from_arrays([[], []], names=KEYS)))
+        else:
+            # coerce so an object column (empty frame in a concat, "" cells) still sums
+            values = df[[m for m in METRICS if m in df.columns]].apply(pd.to_numeric, errors="coerce")
+            self._load(values.groupby([df[k] for k in KEYS], dropna=False).sum())
+
+    def _load(self, cube):
+        self.cube = cube
+        self.empty = cube.empty
+        self._sources = None
+        self._dates = None
+
+    @classmethod
+    def combine(cls, cubes):
+        """
+        consolidated cube = per-property cubes summed cell by cell
+        (a few hundred (Date, Source) rows each → no concat of booking rows)
+        """
+        parts = [c.cube for c in cubes if not c.empty]
+        if not parts:
+            return cls(pd.DataFrame())
+
+        total = cls.__new__(cls)
+        total._load(pd.concat(parts).groupby(level=KEYS, dropna=False).sum())
+        return total
+
+    # ---------- slices (built on first use) ----------
+    def by_source(self):
+        """Booking Source × metric, every source in SOURCES (missing = 0)"""
+        if self._sources is None:
+            self._sources = (
+                self.cube.groupby(level="Booking Source").sum()
+                .reindex(SOURCES, fill_value=0)
+            )
+        return self._sources
+
+    def by_date(self):
+        """Date × metric, only dates that have bookings (sorted)"""
+        if self._dates is None:
+            self._dates = self.cube.groupby(level="Date").sum()
+        return self._dates
+
+    def rooms_by_date(self):
+        """Date × SOURCES room counts (DATE WISE BOOKINGS table)"""
+        if self.empty or "Rooms" not in self.cube.columns:
+            return pd.DataFrame(columns=SOURCES)
+        return (
+            self.cube["Rooms"].unstack("Booking Source", fill_value=0)
+            .reindex(columns=SOURCES, fill_value=0)
+        )
+
+    # ---------- stats ----------
+    def sum(self, metric, src=None):
+        if self.empty or metric not in self.cube.columns:
+            return 0
+        if src is None:
+            return self.cube[metric].sum()
+        return self.by_source().at[src, metric] if src in SOURCES else 0
+
+    def count(self, src=None):
+        return int(self.sum("Rooms", src))
+
+    def amt(self, src=None):
+        return round(self.sum("Amount", src), 2)
+
+
+# ================= STATUS WINDOWS =================
+def _status_days(df, status):
+    """parsed Date of the rows with this Status (one to_datetime per frame)"""
+    if df.empty or "Status" not in df.columns:
+        return pd.Series(dtype="datetime64[ns]")
+    return pd.to_datetime(df.loc[df["Status"] == status, "Date"], format="%Y-%m-%d")
+
+
+def count_upcoming(df, tf, now):
+    """Confirm Booking on TF (from noon) or on TF + 1 (before noon)"""
+    day = datetime.strptime(tf, "%Y-%m-%d")
+    if now.hour < 12:
+        day += timedelta(days=1)
+    return int((_status_days(df, "Confirm Booking") == day).sum())
+
+
+def count_cancelled(df, tf):
+    """Cancelled Booking dated TF or TF + 1"""
+    day = datetime.strptime(tf, "%Y-%m-%d")
+    days = _status_days(df, "Cancelled Booking")
+    return int(days.isin([day, day + timedelta(days=1)]).sum())
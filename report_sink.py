@@ -0,0 +1,90 @@
+# ==============================
+# REPORT SINK
+# SERIALIZE A WORKBOOK ONCE → FAN THE BYTES OUT (TELEGRAM / LOCAL FILE / ARCHIVE)
+# ==============================
+#
+#   with ReportSink(f"Bookings_{TF_FMT}.xlsx") as sink:
+#       sink.write(wb)                                        → the only wb.save
+#       await sink.send(send_telegram_excel_buffer, caption="📊 ...")
+#       sink.save_as(REPORT_FILE)                             → optional local copy
+#
+# wb.save goes to a spool file on disk; every destination reads that file.
+# Uploads hand aiohttp an open file, which it streams in chunks, so no
+# BytesIO copy of the workbook is held in memory.
+#
+# OYO_REPORT_ARCHIVE=<dir> → every report written also lands in <dir>/<YYYY-MM-DD>/
+
+import os
+import shutil
+import itertools
+from datetime import datetime
+
+REPORT_SPOOL_DIR = os.getenv("OYO_REPORT_SPOOL", os.path.join(".cache", "reports"))
+REPORT_ARCHIVE_DIR = os.getenv("OYO_REPORT_ARCHIVE", "")
+
+_spool_seq = itertools.count(1)
+
+
+def _place(src, dest):
+    """dest ← src bytes, atomically (hard link when possible, else copy)"""
+    folder = os.path.dirname(os.path.abspath(dest))
+    os.makedirs(folder, exist_ok=True)
+
+    tmp = f"{dest}.part"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+
+    try:
+        os.link(src, tmp)
+    except OSError:
+        shutil.copyfile(src, tmp)
+
+    # readers of dest never see a half-written report
+    os.replace(tmp, dest)
+
+
+class ReportSink:
+    def __init__(self, filename):
+        self.filename = filename     # name the report is delivered under
+        self.path = None             # spool file once written
+
+    def write(self, wb):
+        os.makedirs(REPORT_SPOOL_DIR, exist_ok=True)
+
+        # pid + sequence → parallel scripts never share a spool file
+        self.path = os.path.join(
+            REPORT_SPOOL_DIR, f"{os.getpid()}-{next(_spool_seq)}-{self.filename}"
+        )
+        wb.save(self.path)
+        print(f"🧾 REPORT → {self.filename} ({os.path.getsize(self.path) / 1024:.0f} KB)")
+
+        if REPORT_ARCHIVE_DIR:
+            self.archive(REPORT_ARCHIVE_DIR)
+
+        return self.path
+
+    # ---------- destinations ----------
+    def save_as(self, dest):
+        _place(self.path, dest)
+        return dest
+
+    def archive(self, folder):
+        day = datetime.now().strftime("%Y-%m-%d")
+        return self.save_as(os.path.join(folder, day, self.filename))
+
+    async def send(self, sender, **kwargs):
+        """sender(file, filename=..., **kwargs) → e.g. send_telegram_excel_buffer"""
+        with open(self.path, "rb") as fh:
+            return await sender(fh, filename=self.filename, **kwargs)
+
+    # ---------- spool cleanup ----------
+    def close(self):
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+        self.path = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
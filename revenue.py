@@ -7,7 +7,6 @@
 import os
 import json
 import asyncio
-import aiohttp
 import pandas as pd
 from datetime import datetime, timedelta
 import traceback
@@ -17,6 +16,17 @@ from openpyxl.styles import PatternFill, Font, Alignment, Border, Side
 from openpyxl.utils import get_column_letter
 from io import BytesIO
 import pytz
+from report_cube import BookingCube
+from detail_resolver import DETAIL_STATS, DetailPipeline, listing_order, stay_nights
+from telegram_outbox import OUTBOX, TELEGRAM_STREAM
+from property_runs import stream_properties
+from oyo_client import (
+    shared_session,
+    run,
+    BookingPages,
+    fetch_booking_details,
+    fetch_total_rooms,
+)
 IST = pytz.timezone("Asia/Kolkata")
 
 now = datetime.now(IST)
@@ -25,17 +35,6 @@ now = datetime.now(IST)
 MAX_FULL_RUN_RETRIES = 5
 FULL_RUN_RETRY_DELAY = 10  # seconds
 
-# ================= NEW: GLOBAL THROTTLES (NO FEATURE REMOVED) =================
-PROP_PARALLEL_LIMIT = 3      # max properties running in parallel
-DETAIL_PARALLEL_LIMIT = 10   # max detail calls in parallel per property
-
-prop_semaphore = asyncio.Semaphore(PROP_PARALLEL_LIMIT)
-
-# ================= NEW: TIMEOUTS (MORE STABLE MONTHLY) =================
-DETAIL_TIMEOUT = 25
-ROOMS_TIMEOUT = 25
-BATCH_TIMEOUT = 35
-
 # ================= TELEGRAM =================
 
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
@@ -67,46 +66,10 @@ if not PROPERTIES:
 
 
 # ================= TELEGRAM =================
-# NEW FEATURE: REUSE SESSION (but keeps same capability)
+# queued on the run's outbox (ordered, paced, 429-aware) → no fixed sleeps
 async def send_telegram_message(text, retries=3, session=None):
-    url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
-    payload = {"chat_id": TELEGRAM_CHAT_ID, "text": text, "parse_mode": "HTML"}
-
-    async def _post(sess):
-        async with sess.post(url, json=payload, timeout=25) as resp:
-            if resp.status == 200:
-                return True
-            raise RuntimeError(f"Telegram HTTP {resp.status}")
-
-    # if session not provided, keep old behavior (no feature removed)
-    if session is None:
-        for attempt in range(1, retries + 1):
-            try:
-                async with aiohttp.ClientSession() as s:
-                    if await _post(s):
-                        return
-            except Exception as e:
-                if attempt == retries:
-                    print("❌ TELEGRAM FAILED AFTER RETRIES")
-                    print(e)
-                await asyncio.sleep(2)
-        async with aiohttp.ClientSession() as s:
-            if not await _post(s):
-                raise RuntimeError("Telegram send failed")
-        return
-
-    # session provided (stable + fast)
-    for attempt in range(1, retries + 1):
-        try:
-            if await _post(session):
-                return
-        except Exception as e:
-            if attempt == retries:
-                print("❌ TELEGRAM FAILED AFTER RETRIES")
-                print(e)
-            await asyncio.sleep(2)
-
-    raise RuntimeError("Telegram send failed")
+    """Queues text on the Telegram outbox → future, returns at once."""
+    return OUTBOX.post(TELEGRAM_CHAT_ID, text, retries=retries)
 
 # ================= BEAUTIFY EXCEL =================
 def beautify(ws):
@@ -209,169 +172,47 @@ def get_booking_source(b):
     return "OBA"
 
 
-# ================= FETCH DETAILS =================
-async def fetch_booking_details(session, P, booking_no):
-    url = "https://www.oyoos.com/hms_ms/api/v1/visibility/booking_details_with_entities"
-    params = {
-        "qid": P["QID"],
-        "booking_id": booking_no,
-        "role": 0,
-        "platform": "OYOOS",
-        "country_code": 1
-    }
-    cookies = {"uif": P["UIF"], "uuid": P["UUID"]}
-    headers = {
-        "accept": "application/json",
-        "content-type": "application/json",
-        "x-qid": str(P["QID"]),
-        "x-source-client": "merchant"
-    }
-
-    for attempt in range(1, 4):
-        try:
-            async with session.get(
-                url, params=params, headers=headers, cookies=cookies, timeout=DETAIL_TIMEOUT
-            ) as r:
-                if r.status != 200:
-                    raise RuntimeError("DETAIL API FAILED")
-
-                data = await r.json()
-
-                rooms = []
-                stay = data.get("entities", {}).get("stayDetails", {})
-                for s in stay.values():
-                    rn = s.get("room_number")
-                    if rn:
-                        rooms.append(rn)
-
-                booking = next(iter(data.get("entities", {}).get("bookings", {}).values()), {})
-                payments = booking.get("payments", [])
-
-                cash = qr = online = discount = 0
-                for p in payments:
-                    mode = p.get("mode", "")
-                    amt = float(p.get("amount", 0))
-                    if mode == "oyo_wizard_discount":
-                        discount += amt
-                    elif mode == "Cash at Hotel":
-                        cash += amt
-                    elif mode == "UPI QR":
-                        qr += amt
-                    else:
-                        online += amt
-
-                balance = booking.get("payable_amount", 0)
-                return rooms, cash, qr, online, discount, balance
-
-        except Exception:
-            # NEW FEATURE: Better backoff (reduces rate limits)
-            await asyncio.sleep(2 + attempt)
-
-    raise RuntimeError("DETAIL FETCH FAILED")
-
-# ================= BATCH FETCH =================
-async def fetch_bookings_batch(session, offset, f, t, P):
-    url = "https://www.oyoos.com/hms_ms/api/v1/get_booking_with_ids"
-    params = {
-        "qid": P["QID"],
-        "checkin_from": f,
-        "checkin_till": t,
-        "batch_count": 100,
-        "batch_offset": offset,
-        "visibility_required": "true",
-        "additionalParams": "payment_hold_transaction,guest,stay_details",
-        "decimal_price": "true",
-        "ascending": "true",
-        "sort_on": "checkin_date"
-    }
-    cookies = {"uif": P["UIF"], "uuid": P["UUID"]}
-    headers = {
-        "accept": "application/json",
-        "content-type": "application/json",
-        "x-qid": str(P["QID"]),
-        "x-source-client": "merchant"
-    }
-
-    async with session.get(
-        url, params=params, cookies=cookies, headers=headers, timeout=BATCH_TIMEOUT
-    ) as r:
-        if r.status != 200:
-            raise RuntimeError("BATCH API FAILED")
-        return await r.json()
-
-# ================= FETCH TOTAL ROOMS =================
-async def fetch_total_rooms(session, P):
-    url = "https://www.oyoos.com/hms_ms/api/v1/hotels/roomsNew"
-    params = {"qid": P["QID"]}
-    cookies = {"uif": P["UIF"], "uuid": P["UUID"]}
-    headers = {
-        "accept": "application/json",
-        "x-qid": str(P["QID"]),
-        "x-source-client": "merchant"
-    }
-
-    for attempt in range(1, 4):
-        try:
-            async with session.get(
-                url, params=params, cookies=cookies, headers=headers, timeout=ROOMS_TIMEOUT
-            ) as r:
-                if r.status != 200:
-                    raise RuntimeError("ROOM API FAILED")
-
-                data = await r.json()
-                rooms = data.get("rooms", {})
-                return len(rooms)
-
-        except Exception:
-            await asyncio.sleep(2 + attempt)
-
-    return 0
-
 # ================= PROCESS PROPERTY =================
 async def process_property(P, TF, TT, HF, HT):
     print(f"PROCESSING FAST ASYNC → {P['name']}")
 
-    async with aiohttp.ClientSession() as session:
+    async with shared_session() as session:
         total_rooms = await fetch_total_rooms(session, P)
 
         if total_rooms == 0:
             raise RuntimeError("TOTAL ROOMS FETCH FAILED")
 
-        detail_semaphore = asyncio.Semaphore(DETAIL_PARALLEL_LIMIT)
-
+        # concurrency comes from the run-wide adaptive OYO limiter (rate_control)
         async def limited_detail_call(booking_no):
-            async with detail_semaphore:
-                return await fetch_booking_details(session, P, booking_no)
+            return await fetch_booking_details(session, P, booking_no)
 
         all_rows = []
+        stay_rows = []   # (page, booking, night, ci, co) → details resolved once per booking below
+        pipeline = DetailPipeline(limited_detail_call)   # detail calls start as pages arrive
         offset = 0
         upcoming_count = cancelled_count = inhouse_count = checkedout_count = 0
 
-        while True:
-            data = await fetch_bookings_batch(session, offset, HF, HT, P)
+        tf_date = datetime.strptime(TF, "%Y-%m-%d")
+        end = datetime.strptime(TT, "%Y-%m-%d")
 
-            if not data or not data.get("bookingIds"):
-                break
+        pages = BookingPages(session, P, HF, HT)   # next pages fetched ahead
 
-            bookings = data.get("entities", {}).get("bookings", {})
-
-            if not bookings:
-                raise RuntimeError("BOOKING ENTITY EMPTY")
+        try:
+            while True:
+                data = await pages.get(offset)
 
-            curr = datetime.strptime(TF, "%Y-%m-%d")
-            end = datetime.strptime(TT, "%Y-%m-%d")
+                if not data or not data.get("bookingIds"):
+                    break
 
-            while curr <= end:
-                target = curr.strftime("%Y-%m-%d")
-                target_dt = curr
+                bookings = data.get("entities", {}).get("bookings", {})
 
-                tasks, mapping = [], []
+                if not bookings:
+                    raise RuntimeError("BOOKING ENTITY EMPTY")
 
                 for b in bookings.values():
                     status = (b.get("status") or "").strip()
                     ci = datetime.strptime(b["checkin"], "%Y-%m-%d")
                     co = datetime.strptime(b["checkout"], "%Y-%m-%d")
-                    tf_date = datetime.strptime(TF, "%Y-%m-%d")
 
                     # ---- STATUS COUNTS ----
                     if status == "Checked In":
@@ -396,51 +237,50 @@ async def process_property(P, TF, TT, HF, HT):
                     if status not in ["Checked In", "Checked Out"]:
                         continue
 
-                    if not (target_dt >= ci and target_dt < co):
-                        continue
+                    for night in stay_nights(ci, co, tf_date, end):
+                        stay_rows.append((offset, b, night.strftime("%Y-%m-%d"), ci, co))
+                        await pipeline.submit(b["booking_no"])
 
-                    tasks.append(limited_detail_call(b["booking_no"]))
-                    mapping.append((b, target, ci, co))
+                if len(data["bookingIds"]) < 100:
+                    break
 
-                if tasks:
-                    results = await asyncio.gather(*tasks, return_exceptions=True)
-                else:
-                    results = []
+                offset += 100
 
-                for res, (b, target, ci, co) in zip(results, mapping):
-                    if isinstance(res, Exception):
-                        continue
+            # ================= DETAIL RESULTS (STARTED DURING PAGINATION) =================
+            details = await pipeline.results(label=P["name"])
+        finally:
+            # a page that raised (e.g. BOOKING ENTITY EMPTY) → nothing left running
+            pipeline.close()
+            pages.cancel()
 
-                    rooms, cash, qr, online, discount, balance = res
-
-                    stay = max((co - ci).days, 1)
-                    paid = float(b.get("get_amount_paid") or 0)
-                    total_amt = paid + float(balance or 0)
-
-                    all_rows.append({
-                        "Date": target,
-                        "Booking Id": b["booking_no"],
-                        "Guest Name": b["guest_name"],
-                        "Status": b.get("status"),
-                        "Booking Source": get_booking_source(b),
-                        "Check In": b["checkin"],
-                        "Check Out": b["checkout"],
-                        "Rooms": b.get("no_of_rooms", 1),
-                        "Room Numbers": ", ".join(rooms),
-                        "Amount": round(total_amt / stay, 2),
-                        "Cash": round(cash / stay, 2),
-                        "QR": round(qr / stay, 2),
-                        "Online": round(online / stay, 2),
-                        "Discount": round(discount / stay, 2),
-                        "Balance": round(balance / stay, 2),
-                    })
-
-                curr += timedelta(days=1)
-
-            if len(data["bookingIds"]) < 100:
-                break
-
-            offset += 100
+        for b, target, ci, co in listing_order(stay_rows):
+            res = details[b["booking_no"]]
+            if isinstance(res, Exception):
+                continue
+
+            rooms, cash, qr, online, discount, balance = res
+
+            stay = max((co - ci).days, 1)
+            paid = float(b.get("get_amount_paid") or 0)
+            total_amt = paid + float(balance or 0)
+
+            all_rows.append({
+                "Date": target,
+                "Booking Id": b["booking_no"],
+                "Guest Name": b["guest_name"],
+                "Status": b.get("status"),
+                "Booking Source": get_booking_source(b),
+                "Check In": b["checkin"],
+                "Check Out": b["checkout"],
+                "Rooms": b.get("no_of_rooms", 1),
+                "Room Numbers": ", ".join(rooms),
+                "Amount": round(total_amt / stay, 2),
+                "Cash": round(cash / stay, 2),
+                "QR": round(qr / stay, 2),
+                "Online": round(online / stay, 2),
+                "Discount": round(discount / stay, 2),
+                "Balance": round(balance / stay, 2),
+            })
 
         df = pd.DataFrame(all_rows)
 
@@ -477,56 +317,6 @@ async def run_property_with_retry(P, TF, TT, HF, HT, retries=3):
             await asyncio.sleep(2 + attempt * 2)
     raise RuntimeError(f"PROPERTY FAILED → {P['name']}") from last_error
 
-# NEW FEATURE: PROPERTY PARALLEL LIMITER (reduces failures)
-async def run_property_limited(P, TF, TT, HF, HT):
-    async with prop_semaphore:
-        return await run_property_with_retry(P, TF, TT, HF, HT)
-
-# ================= COUNT / AMOUNT =================
-def count(df, src):
-    if df.empty:
-        return 0
-    return int(df[df["Booking Source"] == src]["Rooms"].sum())
-
-def amt(df, src):
-    if df.empty:
-        return 0
-    return round(df[df["Booking Source"] == src]["Amount"].sum(), 2)
-
-def count_upcoming(df, tf):
-    tf_date = datetime.strptime(tf, "%Y-%m-%d")
-    next_date = tf_date + timedelta(days=1)
-
-    c = 0
-    for _, r in df.iterrows():
-        if r.get("Status") != "Confirm Booking":
-            continue
-
-        d = datetime.strptime(r["Date"], "%Y-%m-%d")
-
-        if d == tf_date and now.hour >= 12:
-            c += 1
-        elif d == next_date and now.hour < 12:
-            c += 1
-
-    return c
-
-def count_cancelled(df, tf):
-    tf_date = datetime.strptime(tf, "%Y-%m-%d")
-    next_date = tf_date + timedelta(days=1)
-
-    c = 0
-    for _, r in df.iterrows():
-        if r.get("Status") != "Cancelled Booking":
-            continue
-
-        d = datetime.strptime(r["Date"], "%Y-%m-%d")
-
-        if d == tf_date or d == next_date:
-            c += 1
-
-    return c
-
 def build_daily_revenue_message(
     prop,
     report_date,
@@ -571,6 +361,73 @@ DAILY REVENUE REPORT : {prop}
 </pre>
 """.strip()
 
+# ================= PER-PROPERTY TELEGRAM =================
+def empty_result(result):
+    """property finished without a booking frame → retried like a failure"""
+    name, df, *_ = result
+    return "EMPTY DATA" if df is None else None
+
+
+async def send_property_report(result, TF, tg_session):
+    """daily revenue message of one property → outbox"""
+    name, df, total_rooms, inhouse, checkedout, upcoming, cancelled = result
+
+    cube = BookingCube(df)
+
+    booked_rooms = int(df["Rooms"].sum()) if not df.empty else 0
+
+    booked_rooms = int(df["Rooms"].sum())
+    available_rooms = total_rooms - booked_rooms
+    occupancy = round((booked_rooms / total_rooms) * 100) if total_rooms else 0
+
+    total_amount = float(df["Amount"].sum()) if not df.empty else 0.0
+    arr = round(total_amount / booked_rooms, 2) if booked_rooms else 0
+
+    oyo_rooms = cube.count("OYO")
+    oyo_amount = float(cube.sum("Amount", "OYO"))
+    app_arr = round(oyo_amount / oyo_rooms, 2) if oyo_rooms else 0
+
+    counts = {
+        "Walk-in": cube.count("Walk-in"),
+        "OYO": cube.count("OYO"),
+        "MMT": cube.count("MMT"),
+        "Agoda": cube.count("Agoda"),
+        "CB": cube.count("CB"),
+        "BDC": cube.count("BDC"),
+        "TA": cube.count("TA"),
+        "OBA": cube.count("OBA")
+    }
+
+    amounts = {
+        "Total": int(total_amount),
+        "Cash": int(df["Cash"].sum()) if not df.empty else 0,
+        "QR": int(df["QR"].sum()) if not df.empty else 0,
+        "Online": int(df["Online"].sum()) if not df.empty else 0,
+        "Discount": int(df["Discount"].sum()) if not df.empty else 0,
+        "Balance": int(df["Balance"].sum()) if not df.empty else 0
+    }
+
+    revenue_message = build_daily_revenue_message(
+        prop=name,
+        report_date=datetime.strptime(TF, "%Y-%m-%d").strftime("%d/%m/%Y"),
+        total_rooms=total_rooms,
+        booked_rooms=booked_rooms,
+        available_rooms=available_rooms,
+        occupancy=occupancy,
+        total_amount=amounts["Total"],
+        cash=amounts["Cash"],
+        qr=amounts["QR"],
+        online=amounts["Online"],
+        discount=amounts["Discount"],
+        balance=amounts["Balance"],
+        amounts=amounts,
+        arr=arr,
+        app_arr=app_arr
+    )
+
+    await send_telegram_message(revenue_message, session=tg_session)
+
+
 # ================= MAIN =================
 # ================= MAIN =================
 async def main():
@@ -592,118 +449,47 @@ async def main():
     HT = now.strftime("%Y-%m-%d")
 
     # ================= SMART RETRY (ONLY FAILED PROPERTIES) =================
-    pending = {k: v for k, v in PROPERTIES.items()}
+    # a property's message is posted the moment it succeeds (TELEGRAM_STREAM),
+    # the consolidated report only once every property is in
     success_results = {}
 
-    for run_attempt in range(1, MAX_FULL_RUN_RETRIES + 1):
-        if not pending:
-            break
-
-        print(f"\n🔁 PARTIAL RUN ATTEMPT {run_attempt}/{MAX_FULL_RUN_RETRIES}")
-        print(f"⏳ Pending Properties: {len(pending)}")
-
-        tasks = [run_property_limited(P, TF, TT, HF, HT) for P in pending.values()]
-        results = await asyncio.gather(*tasks, return_exceptions=True)
-
-        new_pending = {}
-        for key, (P, result) in zip(list(pending.keys()), zip(pending.values(), results)):
-
-            if isinstance(result, Exception):
-                print(f"❌ FAILED → {P['name']} :: {result}")
-                new_pending[key] = P
-                continue
-
-            name, df, *_ = result
-
-            if df is None:
-                print(f"❌ EMPTY DATA → {name}")
-                new_pending[key] = P
-                continue
-
-            success_results[key] = result
-            print(f"✅ OK → {name} rows={len(df)}")
-
-        pending = new_pending
+    async with shared_session() as tg_session:
 
-        if pending:
-            if run_attempt == MAX_FULL_RUN_RETRIES:
-                failed_names = [p["name"] for p in pending.values()]
-                raise RuntimeError(f"FINAL FAILURE: Properties failed after retries: {failed_names}")
-
-            print(f"🔁 RETRYING ONLY FAILED PROPERTIES after {FULL_RUN_RETRY_DELAY}s...")
-            await asyncio.sleep(FULL_RUN_RETRY_DELAY)
-
-    # ================= FINAL VERIFICATION =================
-    valid_results = [success_results[k] for k in PROPERTIES.keys() if k in success_results]
+        try:
+            async for key, result in stream_properties(
+                PROPERTIES,
+                lambda P: run_property_with_retry(P, TF, TT, HF, HT),
+                retries=MAX_FULL_RUN_RETRIES,
+                delay=FULL_RUN_RETRY_DELAY,
+                check=empty_result,
+            ):
+                success_results[key] = result
+
+                if TELEGRAM_STREAM:
+                    await send_property_report(result, TF, tg_session)
+        except Exception:
+            # FINAL FAILURE → messages already posted still reach the chat
+            await OUTBOX.drain()
+            raise
 
-    if len(valid_results) != len(PROPERTIES):
-        missing = [PROPERTIES[k]["name"] for k in PROPERTIES.keys() if k not in success_results]
-        raise RuntimeError(f"DATA INCOMPLETE: Missing properties: {missing}")
+        # ================= FINAL VERIFICATION =================
+        valid_results = [success_results[k] for k in PROPERTIES.keys() if k in success_results]
 
-    print("✅ DATA VERIFIED — ALL PROPERTIES PRESENT")
+        if len(valid_results) != len(PROPERTIES):
+            missing = [PROPERTIES[k]["name"] for k in PROPERTIES.keys() if k not in success_results]
+            raise RuntimeError(f"DATA INCOMPLETE: Missing properties: {missing}")
 
-    async with aiohttp.ClientSession() as tg_session:
+        print("✅ DATA VERIFIED — ALL PROPERTIES PRESENT")
+        print(DETAIL_STATS.summary())
 
         # ================= PER-PROPERTY REPORTS =================
-        for name, df, total_rooms, inhouse, checkedout, upcoming, cancelled in valid_results:
-
-            booked_rooms = int(df["Rooms"].sum()) if not df.empty else 0
-
-            booked_rooms = int(df["Rooms"].sum())
-            available_rooms = total_rooms - booked_rooms
-            occupancy = round((booked_rooms / total_rooms) * 100) if total_rooms else 0
-
-            total_amount = float(df["Amount"].sum()) if not df.empty else 0.0
-            arr = round(total_amount / booked_rooms, 2) if booked_rooms else 0
-
-            oyo_df = df[df["Booking Source"] == "OYO"] if not df.empty else df
-            oyo_rooms = int(oyo_df["Rooms"].sum()) if not oyo_df.empty else 0
-            oyo_amount = float(oyo_df["Amount"].sum()) if not oyo_df.empty else 0.0
-            app_arr = round(oyo_amount / oyo_rooms, 2) if oyo_rooms else 0
-
-            counts = {
-                "Walk-in": count(df, "Walk-in"),
-                "OYO": count(df, "OYO"),
-                "MMT": count(df, "MMT"),
-                "Agoda": count(df, "Agoda"),
-                "CB": count(df, "CB"),
-                "BDC": count(df, "BDC"),
-                "TA": count(df, "TA"),
-                "OBA": count(df, "OBA")
-            }
-
-            amounts = {
-                "Total": int(total_amount),
-                "Cash": int(df["Cash"].sum()) if not df.empty else 0,
-                "QR": int(df["QR"].sum()) if not df.empty else 0,
-                "Online": int(df["Online"].sum()) if not df.empty else 0,
-                "Discount": int(df["Discount"].sum()) if not df.empty else 0,
-                "Balance": int(df["Balance"].sum()) if not df.empty else 0
-            }
-
-            revenue_message = build_daily_revenue_message(
-                prop=name,
-                report_date=datetime.strptime(TF, "%Y-%m-%d").strftime("%d/%m/%Y"),
-                total_rooms=total_rooms,
-                booked_rooms=booked_rooms,
-                available_rooms=available_rooms,
-                occupancy=occupancy,
-                total_amount=amounts["Total"],
-                cash=amounts["Cash"],
-                qr=amounts["QR"],
-                online=amounts["Online"],
-                discount=amounts["Discount"],
-                balance=amounts["Balance"],
-                amounts=amounts,
-                arr=arr,
-                app_arr=app_arr
-            )
-
-            await send_telegram_message(revenue_message, session=tg_session)
-            await asyncio.sleep(1.5)
+        if not TELEGRAM_STREAM:
+            for result in valid_results:
+                await send_property_report(result, TF, tg_session)
 
         # ================= CONSOLIDATED REPORT =================
         all_df = pd.concat([r[1] for r in valid_results], ignore_index=True)
+        all_cube = BookingCube(all_df)
 
         total_rooms_all = sum(r[2] for r in valid_results)
         inhouse_all = sum(r[3] for r in valid_results)
@@ -720,12 +506,11 @@ async def main():
         total_amount_all = float(all_df["Amount"].sum()) if not all_df.empty else 0.0
         arr_all = round(total_amount_all / booked_rooms_all, 2) if booked_rooms_all else 0
 
-        oyo_df_all = all_df[all_df["Booking Source"] == "OYO"] if not all_df.empty else all_df
-        oyo_rooms_all = int(oyo_df_all["Rooms"].sum()) if not oyo_df_all.empty else 0
-        oyo_amount_all = float(oyo_df_all["Amount"].sum()) if not oyo_df_all.empty else 0.0
+        oyo_rooms_all = all_cube.count("OYO")
+        oyo_amount_all = float(all_cube.sum("Amount", "OYO"))
         app_arr_all = round(oyo_amount_all / oyo_rooms_all, 2) if oyo_rooms_all else 0
 
-        counts_all = {k: count(all_df, k) for k in ["Walk-in","OYO","MMT","Agoda","CB","BDC","TA","OBA"]}
+        counts_all = {k: all_cube.count(k) for k in ["Walk-in","OYO","MMT","Agoda","CB","BDC","TA","OBA"]}
 
         amounts_all = {
             "Total": int(total_amount_all),
@@ -755,6 +540,7 @@ async def main():
         )
 
         await send_telegram_message(consolidated_revenue, session=tg_session)
+        await OUTBOX.flush()
 
     print("✅ ALL MONTHLY TELEGRAM REVENUE REPORTS SENT — GUARANTEED")
     return
@@ -764,7 +550,7 @@ async def main():
 # ================= RUN =================
 if __name__ == "__main__":
     try:
-        asyncio.run(main())
+        run(main())
     except Exception as e:
         print("SCRIPT CRASHED")
         print(e)
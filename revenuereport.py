@@ -13,8 +13,11 @@ from openpyxl import Workbook
 from openpyxl.styles import PatternFill, Font, Alignment, Border, Side
 from openpyxl.chart import BarChart, Reference
 from openpyxl.chart.series import DataPoint
-from io import BytesIO
+from report_sink import ReportSink
 import pytz
+from night_frames import nightly_totals
+from detail_resolver import DetailPipeline
+from oyo_client import shared_session, run, BookingPages, fetch_booking_details_raw
 
 
 IST = pytz.timezone("Asia/Kolkata")
@@ -23,13 +26,6 @@ now = datetime.now(IST)
 MAX_FULL_RUN_RETRIES = 5
 FULL_RUN_RETRY_DELAY = 10
 
-PROP_PARALLEL_LIMIT = 3
-DETAIL_PARALLEL_LIMIT = 10
-
-prop_semaphore = asyncio.Semaphore(PROP_PARALLEL_LIMIT)
-
-DETAIL_TIMEOUT = 25
-BATCH_TIMEOUT = 35
 
 
 # ================= TELEGRAM =================
@@ -60,7 +56,7 @@ async def send_telegram_excel_buffer(buffer, filename, caption=None):
         content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
     )
 
-    async with aiohttp.ClientSession() as session:
+    async with shared_session() as session:
         async with session.post(url, data=data, timeout=120) as resp:
             if resp.status != 200:
                 raise RuntimeError(await resp.text())
@@ -112,117 +108,36 @@ def get_hour_color(day_index: int, total_days: int = 31):
 # ================= FETCH DETAILS =================
 
 async def fetch_booking_details(session, P, booking_no):
+    data = await fetch_booking_details_raw(session, P, booking_no)
 
-    url = "https://www.oyoos.com/hms_ms/api/v1/visibility/booking_details_with_entities"
-
-    params = {
-        "qid": P["QID"],
-        "booking_id": booking_no,
-        "role": 0,
-        "platform": "OYOOS",
-        "country_code": 1
-    }
-
-    cookies = {"uif": P["UIF"], "uuid": P["UUID"]}
-
-    headers = {
-        "accept": "application/json",
-        "content-type": "application/json",
-        "x-qid": str(P["QID"]),
-        "x-source-client": "merchant"
-    }
-
-    for attempt in range(1, 4):
-
-        try:
-            async with session.get(
-                url,
-                params=params,
-                headers=headers,
-                cookies=cookies,
-                timeout=DETAIL_TIMEOUT
-            ) as r:
-
-                if r.status != 200:
-                    raise RuntimeError("DETAIL API FAILED")
-
-                data = await r.json()
-
-                booking = next(
-                    iter(data.get("entities", {}).get("bookings", {}).values()),
-                    {}
-                )
-
-                payments = booking.get("payments", [])
-
-                cash = qr = online = discount = 0.0
-
-                for p in payments:
-
-                    amt = float(p.get("amount", 0) or 0)
-                    mode = p.get("mode", "")
-
-                    if mode == "oyo_wizard_discount":
-                        discount += amt
-                    elif mode == "Cash at Hotel":
-                        cash += amt
-                    elif mode == "UPI QR":
-                        qr += amt
-                    else:
-                        online += amt
-
-                # ✅ CORRECT BALANCE LOGIC
-                paid = float(booking.get("get_amount_paid") or 0)
-                balance = float(booking.get("payable_amount") or 0)
-
-                return cash, qr, online, discount, balance, paid
-
-        except Exception:
-            await asyncio.sleep(2 + attempt)
-
-    raise RuntimeError("DETAIL FETCH FAILED")
-
-
-# ================= FETCH BOOKINGS =================
-
-async def fetch_bookings_batch(session, offset, f, t, P):
+    booking = next(
+        iter(data.get("entities", {}).get("bookings", {}).values()),
+        {}
+    )
 
-    url = "https://www.oyoos.com/hms_ms/api/v1/get_booking_with_ids"
+    payments = booking.get("payments", [])
 
-    params = {
-        "qid": P["QID"],
-        "checkin_from": f,
-        "checkin_till": t,
-        "batch_count": 100,
-        "batch_offset": offset,
-        "visibility_required": "true",
-        "additionalParams": "payment_hold_transaction,guest,stay_details",
-        "decimal_price": "true",
-        "ascending": "true",
-        "sort_on": "checkin_date"
-    }
+    cash = qr = online = discount = 0.0
 
-    cookies = {"uif": P["UIF"], "uuid": P["UUID"]}
+    for p in payments:
 
-    headers = {
-        "accept": "application/json",
-        "content-type": "application/json",
-        "x-qid": str(P["QID"]),
-        "x-source-client": "merchant"
-    }
+        amt = float(p.get("amount", 0) or 0)
+        mode = p.get("mode", "")
 
-    async with session.get(
-        url,
-        params=params,
-        cookies=cookies,
-        headers=headers,
-        timeout=BATCH_TIMEOUT
-    ) as r:
+        if mode == "oyo_wizard_discount":
+            discount += amt
+        elif mode == "Cash at Hotel":
+            cash += amt
+        elif mode == "UPI QR":
+            qr += amt
+        else:
+            online += amt
 
-        if r.status != 200:
-            raise RuntimeError("BATCH API FAILED")
+    # ✅ CORRECT BALANCE LOGIC
+    paid = float(booking.get("get_amount_paid") or 0)
+    balance = float(booking.get("payable_amount") or 0)
 
-        return await r.json()
+    return cash, qr, online, discount, balance, paid
 
 
 # ================= PROCESS PROPERTY =================
@@ -234,13 +149,11 @@ async def process_property(P, TF, TT, HF, HT):
     tf_dt = datetime.strptime(TF, "%Y-%m-%d").date()
     tt_dt = datetime.strptime(TT, "%Y-%m-%d").date()
 
-    async with aiohttp.ClientSession() as session:
-
-        detail_semaphore = asyncio.Semaphore(DETAIL_PARALLEL_LIMIT)
+    async with shared_session() as session:
 
+        # concurrency comes from the run-wide adaptive OYO limiter (rate_control)
         async def limited_detail_call(booking_no):
-            async with detail_semaphore:
-                return await fetch_booking_details(session, P, booking_no)
+            return await fetch_booking_details(session, P, booking_no)
 
         # DATE MAP
         date_map = {}
@@ -258,79 +171,82 @@ async def process_property(P, TF, TT, HF, HT):
 
         offset = 0
 
-        while True:
-
-            data = await fetch_bookings_batch(session, offset, HF, HT, P)
+        pipeline = DetailPipeline(limited_detail_call)   # detail calls start as pages arrive
+        stays = []   # one entry per booking → nights expanded after the details
+        pending_pages = []   # per listing page, processed in page order after pagination
+        pages = BookingPages(session, P, HF, HT)   # next pages fetched ahead
 
-            if not data or not data.get("bookingIds"):
-                break
-
-            bookings = data.get("entities", {}).get("bookings", {})
-            if not bookings:
-                break
+        try:
+            while True:
 
-            tasks = []
-            mapping = []
+                data = await pages.get(offset)
 
-            for b in bookings.values():
+                if not data or not data.get("bookingIds"):
+                    break
 
-                status = (b.get("status") or "").strip()
-                if status not in ["Checked In", "Checked Out"]:
-                    continue
+                bookings = data.get("entities", {}).get("bookings", {})
+                if not bookings:
+                    break
 
-                booking_no = b.get("booking_no")
-                if not booking_no:
-                    continue
+                tasks = []
+                mapping = []
 
-                ci = datetime.strptime(b["checkin"], "%Y-%m-%d").date()
-                co = datetime.strptime(b["checkout"], "%Y-%m-%d").date()
+                for b in bookings.values():
 
-                if co <= ci:
-                    continue
+                    status = (b.get("status") or "").strip()
+                    if status not in ["Checked In", "Checked Out"]:
+                        continue
 
-                tasks.append(limited_detail_call(booking_no))
-                mapping.append((ci, co))
+                    booking_no = b.get("booking_no")
+                    if not booking_no:
+                        continue
 
-            results = await asyncio.gather(*tasks, return_exceptions=True)
+                    ci = datetime.strptime(b["checkin"], "%Y-%m-%d").date()
+                    co = datetime.strptime(b["checkout"], "%Y-%m-%d").date()
 
-            for res, (ci, co) in zip(results, mapping):
+                    if co <= ci:
+                        continue
 
-                if isinstance(res, Exception):
-                    continue
+                    tasks.append(await pipeline.submit(booking_no))
+                    mapping.append((ci, co))
 
-                cash, qr, online, discount, balance, paid = res
+                pending_pages.append((tasks, mapping))
 
-                stay_days = max((co - ci).days, 1)
+                if len(data.get("bookingIds", [])) < 100:
+                    break
 
-                cash_d = cash / stay_days
-                qr_d = qr / stay_days
-                online_d = online / stay_days
-                disc_d = discount / stay_days
-                bal_d = balance / stay_days
+                offset += 100
 
-                stay_day = ci
+            # ================= DETAIL RESULTS (STARTED DURING PAGINATION) =================
+            for tasks, mapping in pending_pages:
+                results = await asyncio.gather(*tasks, return_exceptions=True)
 
-                while stay_day < co:
+                for res, (ci, co) in zip(results, mapping):
 
-                    if tf_dt <= stay_day <= tt_dt:
+                    if isinstance(res, Exception):
+                        continue
 
-                        row = date_map[stay_day]
+                    cash, qr, online, discount, balance, paid = res
 
-                        row["cash"] += cash_d
-                        row["qr"] += qr_d
-                        row["online"] += online_d
-                        row["discount"] += disc_d
-                        row["balance"] += bal_d
-                        row["total"] += (
-                            cash_d + qr_d + online_d + disc_d + bal_d
-                        )
+                    stays.append({
+                        "checkin": ci, "checkout": co,
+                        "cash": cash, "qr": qr, "online": online,
+                        "discount": discount, "balance": balance,
+                    })
 
-                    stay_day += timedelta(days=1)
+            pipeline.record(label=P["name"])
+        finally:
+            # a page that raised (e.g. BOOKING ENTITY EMPTY) → nothing left running
+            pipeline.close()
+            pages.cancel()
 
-            if len(data.get("bookingIds", [])) < 100:
-                break
+        # ================= NIGHTS → DATE TOTALS (VECTORIZED) =================
+        amounts = ["cash", "qr", "online", "discount", "balance"]
+        totals = nightly_totals(stays, tf_dt, tt_dt, amounts, split=amounts)
+        totals["total"] = totals[amounts].sum(axis=1)
 
-            offset += 100
+        for d, vals in totals.iterrows():
+            date_map[d].update({k: float(v) for k, v in vals.items()})
 
         return (P["name"], date_map)
 
@@ -352,10 +268,6 @@ async def run_property_with_retry(P, TF, TT, HF, HT, retries=5):
     raise RuntimeError(f"PROPERTY FAILED → {P['name']}")
 
 
-async def run_property_limited(P, TF, TT, HF, HT):
-    async with prop_semaphore:
-        return await run_property_with_retry(P, TF, TT, HF, HT)
-
 
 
 
@@ -432,7 +344,7 @@ async def main():
         if not pending:
             break
 
-        tasks = [run_property_limited(P, TF, TT, HF, HT) for P in pending.values()]
+        tasks = [run_property_with_retry(P, TF, TT, HF, HT) for P in pending.values()]
         results = await asyncio.gather(*tasks, return_exceptions=True)
 
         new_pending = {}
@@ -651,20 +563,14 @@ async def main():
         rnk+=1
     autofit_columns(ws)
 
-    buffer=BytesIO()
-    wb.save(buffer)
-    buffer.seek(0)
-
-    await send_telegram_excel_buffer(
-        buffer,
-        filename=f"Revenue_Monthly.xlsx",
-        caption="📊 Per-Day Stay Collection Report"
-    )
+    with ReportSink(f"Revenue_Monthly.xlsx") as sink:
+        sink.write(wb)
+        await sink.send(send_telegram_excel_buffer, caption="📊 Per-Day Stay Collection Report")
 
 
 if __name__ == "__main__":
 
     try:
-        asyncio.run(main())
+        run(main())
     except Exception:
         traceback.print_exc()
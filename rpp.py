@@ -1,11 +1,12 @@
 import os
 import json
 import asyncio
-import aiohttp
 from datetime import datetime, timedelta
 import traceback
 import random
 import pytz
+from oyo_client import shared_session, run
+from telegram_outbox import OUTBOX, TELEGRAM_STREAM
 IST = pytz.timezone("Asia/Kolkata")
 
 now = datetime.now(IST)
@@ -15,7 +16,7 @@ now = datetime.now(IST)
 # ==========================================================
 
 # ------------------- GLOBAL SETTINGS -------------------
-PROP_PARALLEL_LIMIT = 4
+PROP_PARALLEL_LIMIT = 4   # own cap: these calls skip the shared rate_control limiter
 API_TIMEOUT = 25
 prop_semaphore = asyncio.Semaphore(PROP_PARALLEL_LIMIT)
 
@@ -51,7 +52,6 @@ if not PROPERTIES:
 
 
 
-TELEGRAM_SEND_LOCK = asyncio.Lock()
 
 # ------------------- UTILS -------------------
 def fmt_date(d): return d.strftime("%Y-%m-%d")
@@ -94,90 +94,11 @@ def wrap_rooms(prefix, rooms, per_line=12):
 
 # ------------------- TELEGRAM SENDER -------------------
 async def send_telegram_message(text, retries=15, session=None):
-    def extract_property_code(msg: str):
-        msg = str(msg or "")
-        marker = "Room and Price Details :"
-        idx = msg.find(marker)
-        if idx != -1:
-            rest = msg[idx + len(marker):].strip()
-            prop = rest.split()[0].strip()
-            return prop
-        marker2 = "CONSOLIDATED :"
-        idx2 = msg.find(marker2)
-        if idx2 != -1:
-            rest = msg[idx2 + len(marker2):].strip()
-            prop = rest.split()[0].strip()
-            return prop
-        return None
-
-    bot_token = TELEGRAM_BOT_TOKEN
-    chat_id = TELEGRAM_CHAT_ID
-
-    url = f"https://api.telegram.org/bot{bot_token}/sendMessage"
-
-
-    async def _post(sess, msg_part):
-        payload = {"chat_id": chat_id, "text": msg_part, "parse_mode": "HTML"}
-        async with sess.post(url, json=payload, timeout=API_TIMEOUT) as resp:
-            if resp.status == 429:
-                retry_after = 5
-                try:
-                    data = await resp.json()
-                    retry_after = int(data.get("parameters", {}).get("retry_after", 5))
-                except Exception:
-                    retry_after = 5
-                print(f"⚠️ TELEGRAM 429 → sleeping {retry_after}s (chat_id={chat_id})")
-                await asyncio.sleep(retry_after + 1)
-                return False
-
-            if resp.status != 200:
-                err = ""
-                try: err = await resp.text()
-                except: pass
-                raise RuntimeError(f"Telegram HTTP {resp.status} {err}")
-
-            data = await resp.json()
-            if data.get("ok") is True:
-                return True
-            raise RuntimeError(f"Telegram ok:false → {data.get('description','Unknown error')}")
-
-    parts = split_message(text)
-
-    async with TELEGRAM_SEND_LOCK:
-        if session is None:
-            async with aiohttp.ClientSession() as s:
-                for part in parts:
-                    last_err = None
-                    for attempt in range(1, retries + 1):
-                        try:
-                            ok = await _post(s, part)
-                            if ok:
-                                await asyncio.sleep(0.3)
-                                break
-                        except Exception as e:
-                            last_err = e
-                            wait = min(60, 2 * attempt)
-                            print(f"⚠️ Telegram retry {attempt}/{retries} → {wait}s :: {e}")
-                            await asyncio.sleep(wait)
-                    else:
-                        raise RuntimeError(f"Telegram send failed after retries: {last_err}")
-            return
-
-        for part in parts:
-            last_err = None
-            for attempt in range(1, retries + 1):
-                try:
-                    ok = await _post(session, part)
-                    if ok:
-                        await asyncio.sleep(0.3)
-                        break
-                except Exception as e:
-                    last_err = e
-                    wait = min(60, 2 * attempt)
-                    print(f"⚠️ Telegram retry {attempt}/{retries} → {wait}s :: {e}")
-                    await asyncio.sleep(wait)
-            else:
-                raise RuntimeError(f"Telegram send failed after retries: {last_err}")
+    """
+    Queues text on the run's Telegram outbox → future, returns at once.
+    Ordering, pacing, 429 retry_after and ok:true checks live in telegram_outbox.
+    """
+    return OUTBOX.post(TELEGRAM_CHAT_ID, text, retries=retries, splitter=split_message)
 
 # ------------------- AUTH HELPERS -------------------
 def build_auth(P: dict, qid: int):
@@ -312,7 +233,7 @@ async def compute_property_range_availability(prop_key: int, checkin, checkout):
     floor_all = {}
     floor_booked = {}
 
-    async with aiohttp.ClientSession() as session:
+    async with shared_session() as session:
         curr = checkin
         last_night = checkout - timedelta(days=1)
 
@@ -591,12 +512,30 @@ async def process_property(prop_key: int, checkin, checkout):
         result = await compute_property_range_availability(prop_key, checkin, checkout)
 
         # pricing + details
-        async with aiohttp.ClientSession() as session:
+        async with shared_session() as session:
             pricing_json = await fetch_property_pricing(session, P, fmt_date(checkin))
             details_json = await fetch_property_details(session, P, qid)
 
         return result, pricing_json, details_json
 
+# ------------------- PER-PROPERTY TELEGRAM -------------------
+async def send_property_report(res, checkin, checkout, stay_nights, tg_session):
+    """room + price message of one property → outbox"""
+    availability_result, pricing_json, details_json = res
+
+    p1, p2, p3 = build_price_section(pricing_json, stay_nights, fmt_date(checkin))
+    details_text = build_property_details_section(details_json)
+
+    msg = build_property_message(
+        availability_result,
+        checkin,
+        checkout,
+        stay_nights,
+        p1, p2, p3,
+        details_text
+    )
+    await send_telegram_message(msg, session=tg_session)
+
 # ------------------- MAIN -------------------
 async def main():
     print("========================================")
@@ -625,57 +564,56 @@ async def main():
     print(f"Properties: {len(selected)}")
     print("==============================================")
 
-    tasks = [process_property(p, checkin, checkout) for p in selected]
-    results = await asyncio.gather(*tasks, return_exceptions=True)
-
-    ok_results = []
+    ok_results = {}
     failures = []
 
-    for p, res in zip(selected, results):
-        if isinstance(res, Exception):
-            failures.append((p, res))
-            continue
-        ok_results.append((p, res))
-
-    if failures:
-        print("\n❌ FAILURES:")
-        for p, e in failures:
-            prop_name = PROPERTIES[p]["name"]
-            print(f"- {p} ({prop_name}): {e}")
-
-    prop_messages = []
-    for prop_key, (availability_result, pricing_json, details_json) in ok_results:
-        p1, p2, p3 = build_price_section(pricing_json, stay_nights, fmt_date(checkin))
-        details_text = build_property_details_section(details_json)
-
-        msg = build_property_message(
-            availability_result,
-            checkin,
-            checkout,
-            stay_nights,
-            p1, p2, p3,
-            details_text
-        )
-        prop_messages.append(msg)
+    async with shared_session() as tg_session:
 
-    consolidated_msg = build_consolidated_message(
-        [x[1][0] for x in ok_results],
-        checkin,
-        checkout
-    )
+        # each property's message is posted the moment it is ready (TELEGRAM_STREAM),
+        # the consolidated one only after every property finished
+        running = {asyncio.ensure_future(process_property(p, checkin, checkout)): p for p in selected}
+        pending = set(running)
+
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
 
-    async with aiohttp.ClientSession() as tg_session:
-        for m in prop_messages:
-            await send_telegram_message(m, session=tg_session)
-            await asyncio.sleep(1.2)
+            for task in sorted(done, key=lambda t: selected.index(running[t])):
+                p = running[task]
+
+                if task.exception() is not None:
+                    failures.append((p, task.exception()))
+                    continue
+
+                ok_results[p] = task.result()
+
+                if TELEGRAM_STREAM:
+                    await send_property_report(ok_results[p], checkin, checkout, stay_nights, tg_session)
+
+        if failures:
+            print("\n❌ FAILURES:")
+            for p, e in failures:
+                prop_name = PROPERTIES[p]["name"]
+                print(f"- {p} ({prop_name}): {e}")
+
+        if not TELEGRAM_STREAM:
+            for p in selected:
+                if p in ok_results:
+                    await send_property_report(ok_results[p], checkin, checkout, stay_nights, tg_session)
+
+        consolidated_msg = build_consolidated_message(
+            [ok_results[p][0] for p in selected if p in ok_results],
+            checkin,
+            checkout
+        )
 
         await send_telegram_message(consolidated_msg, session=tg_session)
+        await OUTBOX.flush()
 
     print("✅ TELEGRAM SENT DONE.")
 
 if __name__ == "__main__":
     try:
-        asyncio.run(main())
+        run(main())
     except Exception as e:
         print("SCRIPT CRASHED")
         print(e)
@@ -0,0 +1,212 @@
+# ==============================
+# PLAYWRIGHT SCREENSHOT WORKER POOL
+# A FEW REUSABLE PAGES PER BROWSER CONTEXT, FED BY A QUEUE
+# ==============================
+#
+#   pool = ScreenshotPool(context, capture_booking_screenshot)
+#   pool.submit(booking_no, b)              → inside the listing loop, never waits
+#   pool.fill(booking_no, row, "Screenshots", b)  → row gets the path when it lands
+#   await pool.close(label=P["name"])       → every capture done, pages closed
+#   await pool.abort()                      → property failed: drop what is queued
+#
+# capture(page, booking_id) → saved path ("" on failure) is the script's own
+# navigation + screenshot; the pool only owns pages and scheduling.
+# One capture per booking_no, however many stay nights reference it.
+# With the listing row b, captures go through screenshot_store: closed
+# bookings already on disk are never re-opened, new ones are stored as JPEG.
+#
+# capture_card() → fast capture for those scripts: pooled pages skip fonts,
+# images, media and analytics; the page is ready once the booking card
+# showing this booking_no is visible (no networkidle) and the shot is clipped
+# to that card. Until the selector has matched once, a capture waits only
+# CARD_PROBE_TIMEOUT for it; a miss then means the selector does not fit the
+# page and the process falls back to the old networkidle + whole-page
+# capture for the rest of the run. Once it has matched, a slow card gets
+# CARD_TIMEOUT and only that capture falls back.
+
+import os
+import asyncio
+import time
+
+from playwright.async_api import TimeoutError as PlaywrightTimeout
+
+import screenshot_store
+
+SCREENSHOT_PAGES = int(os.getenv("OYO_SCREENSHOT_PAGES", "4"))   # pages per context
+
+# ================= FAST CAPTURE =================
+SCREENSHOT_FAST = os.getenv("OYO_SCREENSHOT_FAST", "1") == "1"
+BOOKING_CARD_SELECTOR = os.getenv(
+    "OYO_SCREENSHOT_SELECTOR",
+    "[class*='booking-detail'], [class*='bookingDetail'], [class*='BookingDetail']",
+)
+CARD_TIMEOUT = int(os.getenv("OYO_SCREENSHOT_CARD_TIMEOUT", "15000"))   # ms
+CARD_PROBE_TIMEOUT = int(os.getenv("OYO_SCREENSHOT_CARD_PROBE", "3000"))   # ms, until the selector matched once
+
+BLOCKED_RESOURCES = ("image", "media", "font")
+BLOCKED_HOSTS = (
+    "google-analytics.com",
+    "googletagmanager.com",
+    "doubleclick.net",
+    "facebook.net",
+    "hotjar.com",
+    "clarity.ms",
+    "sentry.io",
+)
+
+_card_missing = False   # set once the selector never showed up → old capture path
+_card_seen = False      # set once the selector matched → full CARD_TIMEOUT from then on
+
+
+async def _route(route):
+    request = route.request
+
+    if request.resource_type in BLOCKED_RESOURCES or any(h in request.url for h in BLOCKED_HOSTS):
+        await route.abort()
+    else:
+        await route.continue_()
+
+
+async def _slow_capture(page, url, path, full_page):
+    """previous behaviour: full load to networkidle, whole body / page"""
+    if page.url.split("#")[0] == url.split("#")[0]:
+        # hash-only change on a pooled page → force a real load like a fresh page
+        await page.goto("about:blank")
+
+    await page.goto(url, wait_until="networkidle", timeout=60000)
+
+    if full_page:
+        await page.screenshot(path=path, full_page=True)
+    else:
+        await page.locator("body").screenshot(path=path)
+
+    return path
+
+
+async def capture_card(page, url, path, booking_id, warmup=None, full_page=False):
+    """
+    goto → booking card with this booking_id visible → element screenshot
+    warmup    = URL a fresh page must visit first (cookie / app bootstrap)
+    full_page = old capture was page.screenshot(full_page=True), not body
+    """
+    global _card_missing, _card_seen
+
+    if warmup and page.url == "about:blank":
+        await page.goto(warmup, wait_until="domcontentloaded", timeout=60000)
+
+    if not SCREENSHOT_FAST or _card_missing:
+        return await _slow_capture(page, url, path, full_page)
+
+    await page.goto(url, wait_until="domcontentloaded", timeout=60000)
+
+    # has_text → a pooled page never shoots the previous booking's card
+    card = page.locator(BOOKING_CARD_SELECTOR, has_text=str(booking_id)).first
+
+    try:
+        await card.wait_for(state="visible", timeout=CARD_TIMEOUT if _card_seen else CARD_PROBE_TIMEOUT)
+    except PlaywrightTimeout:
+        if not _card_seen and not _card_missing:
+            _card_missing = True
+            print(f"⚠️ SCREENSHOT CARD NOT FOUND ({BOOKING_CARD_SELECTOR}) → networkidle capture for this run")
+        return await _slow_capture(page, url, path, full_page)
+
+    _card_seen = True
+    await card.screenshot(path=path)
+    return path
+
+
+class ScreenshotPool:
+    def __init__(self, context, capture, pages=SCREENSHOT_PAGES):
+        self.context = context
+        self.capture = capture
+        self.queue = asyncio.Queue()
+        self.futures = {}
+        self.reused = 0
+        self.started = time.perf_counter()
+        self.workers = [asyncio.ensure_future(self._worker()) for _ in range(max(1, pages))]
+
+    # ---------- workers ----------
+    async def _worker(self):
+        page = None
+
+        try:
+            while True:
+                booking_id, booking, fut = await self.queue.get()
+
+                try:
+                    if page is None or page.is_closed():
+                        page = await self.context.new_page()
+                        if SCREENSHOT_FAST:
+                            await page.route("**/*", _route)
+
+                    path = await self.capture(page, booking_id)
+
+                    if booking is not None:
+                        # PIL resize / encode off the event loop
+                        path = await asyncio.to_thread(screenshot_store.save, booking, path)
+                except Exception as e:
+                    print(f"Screenshot failed for {booking_id}: {e}")
+                    path = ""
+
+                    # a page that threw may be stuck mid-navigation → start clean
+                    if page is not None:
+                        try:
+                            await page.close()
+                        except Exception:
+                            pass
+                        page = None
+
+                if not fut.done():
+                    fut.set_result(path)
+                self.queue.task_done()
+        finally:
+            if page is not None and not page.is_closed():
+                await page.close()
+
+    # ---------- producer side ----------
+    def submit(self, booking_id, booking=None):
+        """queue a capture (once per booking_id) → future of the saved path"""
+        if booking_id not in self.futures:
+            fut = asyncio.get_running_loop().create_future()
+            self.futures[booking_id] = fut
+
+            stored = screenshot_store.lookup(booking) if booking is not None else None
+            if stored:
+                self.reused += 1
+                fut.set_result(stored)
+            else:
+                self.queue.put_nowait((booking_id, booking, fut))
+
+        return self.futures[booking_id]
+
+    def fill(self, booking_id, row, column, booking=None):
+        """row[column] = screenshot path as soon as the capture finishes"""
+        row.setdefault(column, "")
+        self.submit(booking_id, booking).add_done_callback(
+            lambda fut: row.__setitem__(column, fut.result())
+        )
+
+    async def _stop(self):
+        for w in self.workers:
+            w.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+
+    async def close(self, label=None):
+        """wait for every queued capture, then stop the workers and their pages"""
+        await self.queue.join()
+        await self._stop()
+
+        if label:
+            ok = sum(1 for f in self.futures.values() if f.result())
+            print(
+                f"📸 SCREENSHOTS → {label} :: {ok}/{len(self.futures)} "
+                f"(reused={self.reused}) in {time.perf_counter() - self.started:.1f}s"
+            )
+
+    async def abort(self):
+        """stop without waiting; captures never taken resolve to an empty path"""
+        await self._stop()
+
+        for fut in self.futures.values():
+            if not fut.done():
+                fut.set_result("")
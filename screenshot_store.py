@@ -0,0 +1,117 @@
+# ==============================
+# CONTENT-ADDRESSED SCREENSHOT STORE
+# ONE COMPRESSED JPEG PER (booking_no, status, amount fingerprint), KEPT ACROSS RUNS
+# ==============================
+#
+# A closed booking (Checked Out / Cancelled) whose listing fields have not
+# changed since the last capture is served from disk without opening a page.
+# New captures are downscaled to SCREENSHOT_MAX_WIDTH and re-encoded as JPEG
+# before they reach the workbook (the sheet shows them at 120×200 anyway).
+#
+#   path = screenshot_store.lookup(b)          → stored path or None
+#   path = screenshot_store.save(b, raw_png)   → compressed copy, raw removed
+#   screenshot_store.prune()                   → end of run: drop captures unused
+#                                                for SCREENSHOT_KEEP_DAYS
+
+import os
+import time
+import shutil
+import hashlib
+
+from PIL import Image
+
+import detail_cache
+from booking_store import FINAL_STATUSES
+
+SCREENSHOT_STORE_DIR = os.getenv(
+    "OYO_SCREENSHOT_STORE", os.path.join(".cache", "screenshots")
+)
+SCREENSHOT_MAX_WIDTH = int(os.getenv("OYO_SCREENSHOT_MAX_WIDTH", "480"))
+SCREENSHOT_QUALITY = int(os.getenv("OYO_SCREENSHOT_QUALITY", "70"))
+# longest report window = last month + this month → older captures are never looked up
+SCREENSHOT_KEEP_DAYS = int(os.getenv("OYO_SCREENSHOT_KEEP_DAYS", "62"))
+
+# per-process scratch for the raw PNGs Playwright writes
+RAW_DIR = os.path.join(SCREENSHOT_STORE_DIR, f"raw-{os.getpid()}")
+
+
+def fingerprint(b):
+    """booking_no + the detail cache's status / amount fingerprint of the listing row"""
+    key = f"{b.get('booking_no')}:{detail_cache.listing_fingerprint(b)}"
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def path_for(b):
+    digest = fingerprint(b)
+    return os.path.join(SCREENSHOT_STORE_DIR, digest[:2], f"{digest}.jpg")
+
+
+def is_closed(b):
+    return (b.get("status") or "").strip() in FINAL_STATUSES
+
+
+# ================= READ =================
+def lookup(b):
+    """stored capture of a closed booking with the same fingerprint"""
+    if not is_closed(b):
+        return None
+
+    path = path_for(b)
+    if not os.path.exists(path):
+        return None
+
+    # still referenced by a report → survives prune()
+    os.utime(path)
+    return path
+
+
+# ================= WRITE =================
+def save(b, raw_path):
+    """downscale + JPEG the raw capture into the store → stored path"""
+    if not raw_path:
+        return ""
+
+    dest = path_for(b)
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+
+    with Image.open(raw_path) as img:
+        img = img.convert("RGB")
+
+        if img.width > SCREENSHOT_MAX_WIDTH:
+            height = round(img.height * SCREENSHOT_MAX_WIDTH / img.width)
+            img = img.resize((SCREENSHOT_MAX_WIDTH, height), Image.LANCZOS)
+
+        tmp = f"{dest}.{os.getpid()}.part"
+        img.save(tmp, "JPEG", quality=SCREENSHOT_QUALITY, optimize=True)
+
+    os.replace(tmp, dest)
+    os.remove(raw_path)
+
+    return dest
+
+
+def discard_raw():
+    """drop this run's scratch PNG folder (captures already live in the store)"""
+    shutil.rmtree(RAW_DIR, ignore_errors=True)
+
+
+# ================= EVICTION =================
+def prune(keep_days=SCREENSHOT_KEEP_DAYS):
+    """remove stored captures neither written nor reused for keep_days"""
+    cutoff = time.time() - keep_days * 86400
+    removed = freed = 0
+
+    for root, _, files in os.walk(SCREENSHOT_STORE_DIR):
+        for name in files:
+            if not name.endswith(".jpg"):
+                continue
+
+            path = os.path.join(root, name)
+            stat = os.stat(path)
+            if stat.st_mtime < cutoff:
+                os.remove(path)
+                removed += 1
+                freed += stat.st_size
+
+    print(f"🧹 SCREENSHOT STORE → removed={removed} freed={freed // 1024} KB (older than {keep_days}d)")
+    return removed
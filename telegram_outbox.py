@@ -0,0 +1,226 @@
+# ==============================
+# TELEGRAM OUTBOX
+# ORDERED PER CHAT, TOKEN-BUCKET PACED, retry_after HANDLED IN ONE PLACE
+# ==============================
+#
+#   OUTBOX.post(chat_id, text)   → queued at once (returns a future), the
+#                                  report loop goes on building the next message
+#   await OUTBOX.flush()         → everything queued is delivered
+#                                  (first strict failure is raised here)
+#
+# One worker per chat sends that chat's messages strictly in post() order.
+# Pacing = per-chat bucket (TELEGRAM_CHAT_RATE msg/s, TELEGRAM_CHAT_BURST)
+#        + one bot-wide bucket (TELEGRAM_GLOBAL_RATE msg/s).
+# A 429 pauses that chat's bucket for retry_after and the same part is sent
+# again until it is delivered, so scripts no longer sleep a fixed 1.2s / 1.5s
+# between messages. Any other 4xx fails the part at once (retrying a bad
+# request only stalls the chat); 5xx and network errors are retried.
+#
+# drain() = flush() without raising → used when a run fails part-way, so the
+# property messages already posted still reach the chat.
+
+import os
+import time
+import asyncio
+
+from oyo_client import get_session
+
+# every report posts to one group chat → Telegram allows ≈ 20 messages per minute there
+TELEGRAM_CHAT_RATE = float(os.getenv("TELEGRAM_CHAT_RATE", str(20 / 60)))   # msg/s per chat
+TELEGRAM_CHAT_BURST = int(os.getenv("TELEGRAM_CHAT_BURST", "3"))
+TELEGRAM_GLOBAL_RATE = float(os.getenv("TELEGRAM_GLOBAL_RATE", "25"))      # msg/s per bot (Telegram ≈ 30)
+
+# 1 → a property's message is posted as soon as that property finishes
+# 0 → old behaviour: nothing is sent until every property succeeded
+TELEGRAM_STREAM = os.getenv("TELEGRAM_STREAM", "1") == "1"
+
+MESSAGE_LIMIT = 3900
+
+
+def split_message(msg, limit=MESSAGE_LIMIT):
+    """Telegram caps a message at 4096 chars → cut on a newline where possible"""
+    msg = str(msg or "")
+    if len(msg) <= limit:
+        return [msg]
+
+    parts = []
+    while len(msg) > limit:
+        cut = msg.rfind("\n", 0, limit)
+        if cut == -1 or cut < 1000:
+            cut = limit
+        parts.append(msg[:cut].strip())
+        msg = msg[cut:].strip()
+    if msg:
+        parts.append(msg)
+    return parts
+
+
+# ================= TOKEN BUCKET =================
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def take(self):
+        while True:
+            now = time.monotonic()
+
+            if now < self.paused_until:
+                await asyncio.sleep(self.paused_until - now)
+                continue
+
+            self._refill(now)
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def pause(self, seconds):
+        """429 retry_after → nothing leaves this bucket until it has passed"""
+        now = time.monotonic()
+        self.paused_until = max(self.paused_until, now + seconds)
+        self.tokens = 0.0
+        self.updated = now
+
+
+class TelegramRejected(RuntimeError):
+    """4xx (not 429) / ok:false → the same part can never go through, not retried"""
+
+
+# ================= OUTBOX =================
+class TelegramOutbox:
+    def __init__(self, token=None, retries=15):
+        self.token = token
+        self.retries = retries
+        self.queues = {}
+        self.buckets = {}
+        self.workers = []
+        self.global_bucket = TokenBucket(TELEGRAM_GLOBAL_RATE, TELEGRAM_GLOBAL_RATE)
+        self.failures = []
+        self.sent = 0
+        self.throttled = 0
+
+    def _url(self):
+        token = self.token or os.getenv("TELEGRAM_BOT_TOKEN")
+        return f"https://api.telegram.org/bot{token}/sendMessage"
+
+    # ---------- producer side ----------
+    def post(self, chat_id, text, parse_mode="HTML", retries=None, strict=True, splitter=split_message):
+        """
+        queue text for chat_id → future (True once every part is delivered)
+        strict=False → a failure is only logged, flush() does not raise it
+        """
+        fut = asyncio.get_running_loop().create_future()
+
+        if chat_id not in self.queues:
+            self.queues[chat_id] = asyncio.Queue()
+            self.buckets[chat_id] = TokenBucket(TELEGRAM_CHAT_RATE, TELEGRAM_CHAT_BURST)
+            self.workers.append(asyncio.ensure_future(self._worker(chat_id)))
+
+        job = (splitter(text), parse_mode, retries or self.retries, strict, fut)
+        self.queues[chat_id].put_nowait(job)
+        return fut
+
+    async def drain(self):
+        """wait until every queued message is out (never raises)"""
+        for queue in list(self.queues.values()):
+            await queue.join()
+
+    async def flush(self):
+        """wait until every queued message is out; raise the first strict failure"""
+        await self.drain()
+
+        print(self.summary())
+
+        if self.failures:
+            first = self.failures[0]
+            self.failures = []
+            raise first
+
+    def summary(self):
+        return (
+            f"📨 TELEGRAM OUTBOX → sent={self.sent} chats={len(self.queues)} "
+            f"throttled={self.throttled}"
+        )
+
+    # ---------- delivery ----------
+    async def _worker(self, chat_id):
+        queue = self.queues[chat_id]
+
+        while True:
+            parts, parse_mode, retries, strict, fut = await queue.get()
+
+            try:
+                for part in parts:
+                    await self._deliver(chat_id, part, parse_mode, retries)
+                fut.set_result(True)
+            except Exception as e:
+                print(f"❌ TELEGRAM FAILED → chat {chat_id} :: {e}")
+                fut.set_result(False)
+                if strict:
+                    self.failures.append(e)
+            finally:
+                queue.task_done()
+
+    async def _deliver(self, chat_id, part, parse_mode, retries):
+        payload = {"chat_id": chat_id, "text": part, "parse_mode": parse_mode}
+        bucket = self.buckets[chat_id]
+        attempt = 0
+
+        while True:
+            await bucket.take()
+            await self.global_bucket.take()
+
+            try:
+                async with get_session().post(self._url(), json=payload, timeout=25) as resp:
+                    data = {}
+                    try:
+                        data = await resp.json(content_type=None)
+                    except Exception:
+                        pass
+
+                    # flood control → wait exactly as long as Telegram asks, not an attempt
+                    if resp.status == 429:
+                        retry_after = int((data.get("parameters") or {}).get("retry_after", 5))
+                        self.throttled += 1
+                        print(f"⚠️ TELEGRAM 429 → chat {chat_id} paused {retry_after}s")
+                        bucket.pause(retry_after + 1)
+                        continue
+
+                    # bad request / chat not found / blocked → fail now, keep the chat moving
+                    if 400 <= resp.status < 500:
+                        raise TelegramRejected(f"Telegram HTTP {resp.status} {data.get('description', '')}")
+
+                    if resp.status != 200:
+                        raise RuntimeError(f"Telegram HTTP {resp.status} {data.get('description', '')}")
+
+                    # Telegram sometimes answers 200 with ok:false
+                    if data.get("ok") is not True:
+                        raise TelegramRejected(f"Telegram ok:false → {data.get('description', 'Unknown error')}")
+
+                    self.sent += 1
+                    return
+
+            except TelegramRejected:
+                raise
+
+            except Exception as e:
+                attempt += 1
+                if attempt >= retries:
+                    raise RuntimeError(f"Telegram send failed after retries: {e}") from e
+
+                wait = min(60, 2 * attempt)
+                print(f"⚠️ Telegram retry {attempt}/{retries} → {wait}s :: {e}")
+                await asyncio.sleep(wait)
+
+
+# one outbox per process (= per run), shared by every report loop
+OUTBOX = TelegramOutbox()